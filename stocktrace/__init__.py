@@ -1,12 +1,17 @@
 from stocktrace.algorithm import Algorithm, AlgorithmManager
-from stocktrace.asset import Asset, AssetManager
+from stocktrace.asset import Asset, AssetManager, AssetWindow
 from stocktrace.backtest import Backtest
-from stocktrace.file import CSV, TIME_CSV
+from stocktrace.file import CSV, TIME_CSV, Store, CSVStore, NPYStore, MemoryStore, migrate_csv
 from stocktrace.gui.graphs import AssetWidget, CandlestickItem, EquityWidget, BacktestAssetWidget
 from stocktrace.gui.backtest_page import BacktestPanel
-from stocktrace.history import AssetHistory
-from stocktrace.indicator import IndicatorManager, Indicator
+from stocktrace.history import AssetHistory, ResampledHistory, update_many
+from stocktrace.indicator import IndicatorManager, Indicator, IndicatorCache, OnlineIndicator, verify_online
 from stocktrace.logger import Logger, FileLog, CircularLog, LOG_LEVEL
+from stocktrace.provider import Provider, YFinanceProvider, FileProvider
 from stocktrace.statistics import generate_statistics
+from stocktrace.sweep import Sweep
 from stocktrace.trade_system import Order, Trade, Broker, Position
-from stocktrace.utils import TIMEZONE
\ No newline at end of file
+from stocktrace.trading_calendar import TradingCalendar
+from stocktrace.utils import TIMEZONE
+from stocktrace.vectorized import VectorizedBacktest
+from stocktrace.walkforward import WalkForward
\ No newline at end of file
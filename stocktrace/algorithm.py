@@ -1,11 +1,13 @@
 from abc import ABC, abstractmethod
 import datetime as dt
+import pandas as pd
 from typing import Optional
 
 from stocktrace.asset import AssetManager
 from stocktrace.indicator import IndicatorManager, Indicator
 from stocktrace.logger import Logger as logger
 from stocktrace.trade_system import Broker, Order
+from stocktrace.trading_calendar import TradingCalendar
 from stocktrace.utils import TIMEZONE, requires_init
 
 class Algorithm(ABC):
@@ -14,14 +16,43 @@ class Algorithm(ABC):
         self.__name = name
         self.__indicators: list[Indicator] = []
         self.__latest_start = dt.datetime.min.replace(tzinfo=TIMEZONE)
+        self.__calendar: Optional[TradingCalendar] = None
+        self.__bar = -1
     
     def indicator(self, name: str, ticker_symbol: str, *args, **kwargs) -> Indicator:
         logger.info(f'Algorithm.indicator() adding Indicator {name} for {ticker_symbol} to Algorithm {self}')
         ind = IndicatorManager.get_indicator(name)(name=name,*args, **kwargs)
         ind.init(ticker_symbol)
-        self.__indicators.append(ind)
+        self.__add_indicators([ind])
         return ind
     
+    def indicators_many(self, name: str, ticker_symbol: str, params_list: list[dict]) -> list[Indicator]:
+        '''indicator() for every parameter set, computed in one shared pass when the family supports it'''
+        logger.info(f'Algorithm.indicators_many() adding {len(params_list)} {name} indicators for {ticker_symbol} to Algorithm {self}')
+        indicators = IndicatorManager.init_many(name, ticker_symbol, params_list)
+        self.__add_indicators(indicators)
+        return indicators
+    
+    def indicators_batch(self, requests: list[tuple], max_workers: Optional[int]=None) -> list[Indicator]:
+        '''indicator() for every (name, ticker) or (name, ticker, params) request, computed on a process pool for large batches'''
+        logger.info(f'Algorithm.indicators_batch() adding {len(requests)} indicators to Algorithm {self}')
+        indicators = IndicatorManager.compute_many(requests, max_workers=max_workers)
+        self.__add_indicators(indicators)
+        return indicators
+    
+    def __add_indicators(self, indicators: list[Indicator]) -> None:
+        self.__indicators.extend(indicators)
+        if self.__calendar is not None:
+            for ind in indicators:
+                ind.align(self.__calendar)
+
+    def set_calendar(self, calendar) -> None:
+        '''Master TradingCalendar or DatetimeIndex of the run, aligns every indicator to it so next() reads them by bar, see bar'''
+        logger.info(f'Algorithm.set_calendar() aligning {len(self.__indicators)} indicators of {self} to {len(calendar)} bars')
+        self.__calendar = calendar if isinstance(calendar, TradingCalendar) else TradingCalendar.from_index(calendar)
+        for ind in self.__indicators:
+            ind.align(self.__calendar)
+
     @abstractmethod
     def init(self) -> None:
         pass
@@ -44,6 +75,19 @@ class Algorithm(ABC):
     def name(self, new_name) -> None:
         self.__name = new_name
     
+    @property
+    def calendar(self) -> Optional[TradingCalendar]:
+        return self.__calendar
+
+    @property
+    def bar(self) -> int:
+        '''Position of the current time in calendar while next() runs, indicator[bar] is its current value'''
+        return self.__bar
+
+    @bar.setter
+    def bar(self, i: int) -> None:
+        self.__bar = i
+
     @property
     def indicators(self) -> list[Indicator]:
         return self.__indicators
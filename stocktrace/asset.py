@@ -1,20 +1,44 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 import datetime as dt
+from functools import partial
+import threading
+import time
 from typing import Optional
+import numpy as np
 import pandas as pd
 
-from stocktrace.file import CSV, TIME_CSV
+from stocktrace.file import CSV, TIME_CSV, Store
 from stocktrace.logger import Logger as logger
-from stocktrace.history import AssetHistory
-from stocktrace.utils import requires_init, DATA_PATH
+from stocktrace.history import AssetHistory, ResampledHistory
+from stocktrace.provider import Provider
+from stocktrace.utils import requires_init, datetime_to_ns, interval_to_timedelta, delta_to_seconds, DATA_PATH, DATA_FORMAT
+
+DEFAULT_WARM_UP_WORKERS = 8
+# Interval of the histories downloaded and stored, coarser intervals are resampled from it
+BASE_INTERVAL = '1d'
+
+def _asset_by_reference(ticker_symbol: str, interval: str) -> 'Asset':
+	return AssetManager.get(ticker_symbol, interval)
 
 class Asset:
-	def __init__(self, ticker_symbol: str, interval: str='1d', auto_save = False) -> None:
+	def __init__(self, ticker_symbol: str, interval: str='1d', auto_save = False, provider: Optional[Provider]=None, update: bool=True, store: Optional[Store]=None) -> None:
 		logger.debug(f'Asset.__init__ Creating Asset with ticker symbol {ticker_symbol}, interval {interval}')
 		self.__ticker_symbol = ticker_symbol
 		self.__interval = interval
-		file_path = DATA_PATH + self.ticker_symbol + interval + '.csv'
+		file_path = DATA_PATH + self.ticker_symbol + interval + '.' + DATA_FORMAT
 		
-		self.__history = AssetHistory(self.ticker_symbol, file_path, self.interval, auto_save=auto_save)
+		self.__history = AssetHistory(self.ticker_symbol, file_path, self.interval, auto_save=auto_save, provider=provider, update=update, store=store)
+
+	@classmethod
+	def resampled(cls, base: 'Asset', interval: str) -> 'Asset':
+		'''Asset of a coarser interval whose bars are resampled from base as it grows, nothing is downloaded or stored'''
+		asset = cls.__new__(cls)
+		asset.__ticker_symbol = base.ticker_symbol
+		asset.__interval = interval
+		asset.__history = ResampledHistory(base.history, interval)
+		return asset
 	
 	def add_listener(self, func) -> None:
 		self.history.add_listener(func)
@@ -27,12 +51,34 @@ class Asset:
 	
 	def save_data(self) -> None:
 		self.history.save_data()
+
+	def unload_data(self) -> None:
+		self.history.unload_data()
+
+	def memory_usage(self) -> int:
+		return self.history.memory_usage()
 	
+	def resample(self, interval: str) -> pd.DataFrame:
+		return self.__history.resample(interval)
+
+	def window(self, start: Optional[dt.datetime]=None, end: Optional[dt.datetime]=None) -> 'AssetWindow':
+		'''Zero-copy view of the rows between start and end inclusive'''
+		return AssetWindow(self, start, end)
+
 	def latest_cents(self, col: str = 'Close') -> Optional[int]:
 		return self.__history.latest_cents(col)
 
 	def get_cents(self, time: dt.datetime, col: str = 'Close') -> Optional[int]:
 		return self.__history.get_cents(time, col)
+
+	def get_cents_at(self, i: int, col: str = 'Close') -> Optional[int]:
+		return self.__history.get_cents_at(i, col)
+
+	def get_cents_many(self, times, col: str = 'Close') -> np.ndarray:
+		return self.__history.get_cents_many(times, col)
+
+	def cents(self, col: str = 'Close') -> np.ndarray:
+		return self.__history.cents(col)
 	
 	def latest_date(self) -> dt.datetime:
 		return self.__history.latest_date()
@@ -43,6 +89,21 @@ class Asset:
 	def prev_or_equal_date(self, time: dt.datetime) -> dt.datetime:
 		return self.__history.prev_or_equal_date(time)
 
+	def prev_dates(self, times) -> pd.DatetimeIndex:
+		return self.__history.prev_dates(times)
+
+	def prev_or_equal_dates(self, times) -> pd.DatetimeIndex:
+		return self.__history.prev_or_equal_dates(times)
+
+	def prev_index(self, time: dt.datetime) -> int:
+		return self.__history.prev_index(time)
+
+	def prev_or_equal_index(self, time: dt.datetime) -> int:
+		return self.__history.prev_or_equal_index(time)
+
+	def latest_index(self) -> int:
+		return self.__history.latest_index()
+
 	@property
 	def history(self) -> AssetHistory:
 		return self.__history
@@ -71,27 +132,138 @@ class Asset:
 	def ticker_found(self) -> bool:
 		return self.__history.ticker_found
 
+	def __reduce__(self):
+		# Pickled by reference, unpickling looks the asset up again instead of copying its history
+		return (_asset_by_reference, (self.__ticker_symbol, self.__interval))
+
 	def __repr__(self) -> str:
 		return f'Asset({self.ticker_symbol}, {self.interval})'
 
+class AssetWindow:
+	'''
+	Read-only view of the rows of an Asset between start and end inclusive, bounded by binary search on its index.
+	Column arrays are slices of the underlying data, nothing is copied unless frame is used
+	'''
+	def __init__(self, asset: Asset, start: Optional[dt.datetime]=None, end: Optional[dt.datetime]=None) -> None:
+		self.__asset = asset
+		self.__data = asset.data
+		index_ns = asset.csv.index_ns
+		self.__start = 0 if start is None else int(np.searchsorted(index_ns, datetime_to_ns(start), side='left'))
+		self.__stop = len(index_ns) if end is None else int(np.searchsorted(index_ns, datetime_to_ns(end), side='right'))
+		self.__stop = max(self.__start, self.__stop)
+		self.__index_ns = index_ns[self.__start:self.__stop]
+		self.__columns = {}
+
+	def column(self, col: str) -> np.ndarray:
+		values = self.__columns.get(col)
+		if values is None:
+			values = self.__data[col].to_numpy()[self.__start:self.__stop]
+			self.__columns[col] = values
+		return values
+
+	def cents(self, col: str = 'Close') -> np.ndarray:
+		return self.__asset.cents(col)[self.__start:self.__stop]
+
+	@property
+	def open(self) -> np.ndarray:
+		return self.column('Open')
+
+	@property
+	def high(self) -> np.ndarray:
+		return self.column('High')
+
+	@property
+	def low(self) -> np.ndarray:
+		return self.column('Low')
+
+	@property
+	def close(self) -> np.ndarray:
+		return self.column('Close')
+
+	@property
+	def index(self) -> pd.DatetimeIndex:
+		return self.__data.index[self.__start:self.__stop]
+
+	@property
+	def index_ns(self) -> np.ndarray:
+		return self.__index_ns
+
+	@property
+	def timestamps(self) -> np.ndarray:
+		'''POSIX seconds of each row, as used for plotting'''
+		return self.__index_ns / 1e9
+
+	@property
+	def frame(self) -> pd.DataFrame:
+		return self.__data.iloc[self.__start:self.__stop]
+
+	@property
+	def start(self) -> int:
+		'''Row position of the first row in the asset data'''
+		return self.__start
+
+	@property
+	def stop(self) -> int:
+		'''Row position one past the last row in the asset data'''
+		return self.__stop
+
+	@property
+	def asset(self) -> Asset:
+		return self.__asset
+
+	@property
+	def empty(self) -> bool:
+		return self.__stop == self.__start
+
+	def __len__(self) -> int:
+		return self.__stop - self.__start
+
+	def __repr__(self) -> str:
+		return f'AssetWindow({self.__asset}, {self.__start}:{self.__stop})'
+
 class AssetManager():
 	_initialized = False
 	@classmethod
-	def init(cls, auto_save: bool=True) -> None:
+	def init(cls, auto_save: bool=True, lazy: bool=False, warm_up: bool=False, max_workers: int=DEFAULT_WARM_UP_WORKERS, memory_budget: Optional[int]=None) -> None:
+		'''
+		lazy only registers the loaded tickers, each Asset is created on its first get,
+		warm_up loads and updates them concurrently on a pool of max_workers threads,
+		memory_budget caps the bytes of asset data kept in memory, None for no limit
+		'''
 		cls._initialized = True
 
 		cls.__auto_save = auto_save
 		cls.__assets = {}
+		# Assets of other intervals than BASE_INTERVAL by (ticker, interval)
+		cls.__intervals = {}
+		cls.__lock = threading.RLock()
+		cls.__memory_budget = memory_budget
+		# Tickers whose data is in memory, least recently used first, mapped to their size in bytes
+		cls.__resident = OrderedDict()
+		cls.__resident_bytes = 0
+		cls.__pins = {}
+		# Each thread keeps its own stack of pinning() scopes
+		cls.__pin_scopes = threading.local()
+		cls.__remeasure_listeners = {}
+		cls.__hits = 0
+		cls.__misses = 0
+		cls.__evictions = 0
 		cls.__ticker_csv = CSV(f'{DATA_PATH}loaded_tickers.csv')
+		cls.__tickers = set()
 		if not cls.__ticker_csv.data.empty:
-			logger.info('Initializing existing loaded tickers...')
-			for name in cls.__ticker_csv.data['Tickers'].to_numpy():
-				logger.info(f'{name}')
-				asset = cls.get(name)
-				if asset is None:
-					logger.warning(f'Asset with ticker {name} not found...')
-					continue
-				cls.__assets[name] = cls.get(name)
+			tickers = list(cls.__ticker_csv.data['Tickers'].to_numpy())
+			cls.__tickers.update(tickers)
+			if warm_up:
+				cls.warm_up(tickers, max_workers=max_workers)
+			elif lazy:
+				logger.info(f'AssetManager.init() Registered {len(tickers)} loaded tickers, deferring loading to first access')
+			else:
+				logger.info('Initializing existing loaded tickers...')
+				for name in tickers:
+					logger.info(f'{name}')
+					asset = cls.get(name)
+					if asset is None:
+						logger.warning(f'Asset with ticker {name} not found...')
 		else:
 			cls.__ticker_csv.data['Tickers'] = pd.Series(dtype=str)
 
@@ -104,22 +276,226 @@ class AssetManager():
 	
 	@classmethod
 	@requires_init
-	def get(cls, ticker_symbol: str, interval: str='1d') -> Asset:
-		if ticker_symbol not in cls.__assets:
-			asset = Asset(ticker_symbol, interval)
-			if asset.ticker_found:
-				cls.__assets[ticker_symbol] = asset
-				if ticker_symbol not in cls.__ticker_csv.data['Tickers'].values:
-					new_df = pd.DataFrame(columns=['Tickers'])
-					new_df.loc[0] = ticker_symbol
-					cls.__ticker_csv.append(new_df)
-				if cls.__auto_save:
-					cls.__ticker_csv.save()
+	def get(cls, ticker_symbol: str, interval: str=BASE_INTERVAL) -> Asset:
+		'''Asset of ticker_symbol at interval, coarser intervals than BASE_INTERVAL are resampled from the base asset'''
+		if interval != BASE_INTERVAL:
+			return cls.__get_interval(ticker_symbol, interval)
+		with cls.__lock:
+			asset = cls.__assets.get(ticker_symbol)
+			if asset is None:
+				asset = Asset(ticker_symbol, interval)
+				if not asset.ticker_found:
+					return None
+				cls.__register(asset)
+			elif ticker_symbol in cls.__resident:
+				cls.__hits += 1
+				cls.__resident.move_to_end(ticker_symbol)
+			else:
+				cls.__load(asset)
+			scopes = cls.__thread_pin_scopes()
+			if scopes and ticker_symbol not in scopes[-1]:
+				scopes[-1].add(ticker_symbol)
+				cls.pin(ticker_symbol)
+			return asset
+
+	@classmethod
+	def __get_interval(cls, ticker_symbol: str, interval: str) -> Optional[Asset]:
+		with cls.__lock:
+			coarser = delta_to_seconds(interval_to_timedelta(interval)) > delta_to_seconds(interval_to_timedelta(BASE_INTERVAL))
+			# The base asset is looked up either way, so it counts as used and is pinned along with its resampled asset
+			base = cls.get(ticker_symbol) if coarser else None
+			asset = cls.__intervals.get((ticker_symbol, interval))
+			if asset is not None:
 				return asset
-			return None
-		return cls.__assets[ticker_symbol]
+			if coarser:
+				if base is None:
+					return None
+				logger.info(f'AssetManager.get() Resampling {ticker_symbol} from {BASE_INTERVAL} to {interval}')
+				asset = Asset.resampled(base, interval)
+			else:
+				asset = Asset(ticker_symbol, interval)
+				if not asset.ticker_found:
+					return None
+			cls.__intervals[(ticker_symbol, interval)] = asset
+			return asset
+
+	@classmethod
+	@requires_init
+	def register(cls, asset: Asset) -> None:
+		'''Registers an Asset built elsewhere, replacing any asset of the same ticker'''
+		with cls.__lock:
+			logger.info(f'AssetManager.register() Registering {asset.ticker_symbol}')
+			cls.__register(asset)
+
+	@classmethod
+	@requires_init
+	def warm_up(cls, tickers: Optional[list[str]]=None, interval: str='1d', max_workers: int=DEFAULT_WARM_UP_WORKERS) -> dict[str, float]:
+		'''Loads and updates tickers (default every registered one) concurrently, returns the seconds each took'''
+		tickers = sorted(cls.__tickers) if tickers is None else tickers
+		tickers = [name for name in dict.fromkeys(tickers) if name not in cls.__assets]
+		logger.info(f'AssetManager.warm_up() Loading {len(tickers)} tickers with {max_workers} workers')
+
+		def load(name: str) -> tuple[str, Optional[Asset], float]:
+			start = time.perf_counter()
+			try:
+				asset = Asset(name, interval)
+			except Exception as e:
+				logger.warning(f'AssetManager.warm_up() Failed to load {name}: {e!r}')
+				asset = None
+			return name, asset, time.perf_counter() - start
+
+		timings = {}
+		start = time.perf_counter()
+		with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+			for name, asset, elapsed in pool.map(load, tickers):
+				timings[name] = elapsed
+				if asset is None or not asset.ticker_found:
+					logger.warning(f'Asset with ticker {name} not found...')
+					continue
+				with cls.__lock:
+					if name not in cls.__assets:
+						cls.__register(asset)
+
+		logger.info(f'AssetManager.warm_up() Loaded {len(timings)} tickers in {time.perf_counter() - start:.2f}s')
+		for name, elapsed in sorted(timings.items(), key=lambda item: item[1], reverse=True):
+			logger.info(f'    {name}: {elapsed:.3f}s')
+		return timings
+
+	@classmethod
+	@requires_init
+	def pin(cls, ticker_symbol: str) -> None:
+		'''Keeps the data of ticker_symbol in memory until a matching unpin'''
+		with cls.__lock:
+			cls.__pins[ticker_symbol] = cls.__pins.get(ticker_symbol, 0) + 1
+
+	@classmethod
+	@requires_init
+	def unpin(cls, ticker_symbol: str) -> None:
+		with cls.__lock:
+			count = cls.__pins.get(ticker_symbol, 0)
+			if count <= 1:
+				cls.__pins.pop(ticker_symbol, None)
+			else:
+				cls.__pins[ticker_symbol] = count - 1
+			cls.__enforce_budget()
+
+	@classmethod
+	@requires_init
+	@contextmanager
+	def pinning(cls):
+		'''Pins every asset returned by get in this thread inside the with block until it exits'''
+		scopes = cls.__thread_pin_scopes()
+		scope = set()
+		scopes.append(scope)
+		try:
+			yield scope
+		finally:
+			# Scopes nest, and two scopes holding the same tickers are equal sets, so pop by position rather than remove
+			assert scopes[-1] is scope
+			scopes.pop()
+			with cls.__lock:
+				for ticker_symbol in scope:
+					cls.unpin(ticker_symbol)
+
+	@classmethod
+	@requires_init
+	def set_memory_budget(cls, memory_budget: Optional[int]) -> None:
+		with cls.__lock:
+			cls.__memory_budget = memory_budget
+			cls.__enforce_budget()
+
+	@classmethod
+	@requires_init
+	def get_stats(cls) -> dict:
+		with cls.__lock:
+			return {
+				'hits': cls.__hits,
+				'misses': cls.__misses,
+				'evictions': cls.__evictions,
+				'resident': len(cls.__resident),
+				'resident_bytes': cls.__resident_bytes,
+				'memory_budget': cls.__memory_budget,
+				'pinned': len(cls.__pins),
+			}
+
+	@classmethod
+	def __load(cls, asset: Asset) -> None:
+		'''Counts a miss, reads the asset data back in if it was evicted and evicts others to stay within budget'''
+		cls.__misses += 1
+		ticker_symbol = asset.ticker_symbol
+		asset.csv.row_count
+		size = asset.memory_usage()
+		cls.__resident_bytes += size - cls.__resident.get(ticker_symbol, 0)
+		cls.__resident[ticker_symbol] = size
+		cls.__resident.move_to_end(ticker_symbol)
+		cls.__enforce_budget()
+
+	@classmethod
+	def __remeasure(cls, ticker_symbol: str) -> None:
+		'''Listener of every registered asset, recounts its size after rows are appended to it'''
+		with cls.__lock:
+			asset = cls.__assets.get(ticker_symbol)
+			if asset is None or ticker_symbol not in cls.__resident:
+				return
+			size = asset.memory_usage()
+			cls.__resident_bytes += size - cls.__resident[ticker_symbol]
+			cls.__resident[ticker_symbol] = size
+			# The asset being appended to is in use, evict others first
+			cls.__resident.move_to_end(ticker_symbol)
+			cls.__enforce_budget()
+
+	@classmethod
+	def __thread_pin_scopes(cls) -> list[set]:
+		scopes = getattr(cls.__pin_scopes, 'scopes', None)
+		if scopes is None:
+			scopes = cls.__pin_scopes.scopes = []
+		return scopes
+
+	@classmethod
+	def __enforce_budget(cls) -> None:
+		if cls.__memory_budget is None or cls.__resident_bytes <= cls.__memory_budget:
+			return
+		# The most recently used asset is never evicted, it was just requested
+		candidates = [name for name in list(cls.__resident)[:-1] if name not in cls.__pins]
+		for name in candidates:
+			if cls.__resident_bytes <= cls.__memory_budget:
+				break
+			logger.info(f'AssetManager.__enforce_budget() Evicting {name}, {cls.__resident_bytes} bytes resident of {cls.__memory_budget}')
+			cls.__assets[name].unload_data()
+			cls.__resident_bytes -= cls.__resident.pop(name)
+			cls.__evictions += 1
+
+	@classmethod
+	def __register(cls, asset: Asset) -> None:
+		ticker_symbol = asset.ticker_symbol
+		previous = cls.__assets.get(ticker_symbol)
+		listener = cls.__remeasure_listeners.get(ticker_symbol)
+		if previous is not None and listener is not None and listener in previous.history.listeners:
+			previous.remove_listener(listener)
+		# Resampled assets follow the replaced base history, they are rebuilt from the new one on their next get
+		for key in [key for key in cls.__intervals if key[0] == ticker_symbol]:
+			del cls.__intervals[key]
+		listener = partial(cls.__remeasure, ticker_symbol)
+		cls.__remeasure_listeners[ticker_symbol] = listener
+		asset.add_listener(listener)
+		cls.__assets[ticker_symbol] = asset
+		cls.__load(asset)
+		if ticker_symbol not in cls.__tickers:
+			cls.__tickers.add(ticker_symbol)
+			new_df = pd.DataFrame(columns=['Tickers'])
+			new_df.loc[0] = ticker_symbol
+			cls.__ticker_csv.append(new_df)
+		if cls.__auto_save:
+			cls.__ticker_csv.save()
 
 	@classmethod
 	@requires_init
 	def get_assets(cls) -> dict:
-		return cls.__assets
\ No newline at end of file
+		'''Assets created so far, in lazy mode registered tickers may not be created yet and evicted assets reload on access'''
+		return cls.__assets
+
+	@classmethod
+	@requires_init
+	def get_tickers(cls) -> list[str]:
+		'''Every registered ticker, loaded or not'''
+		return sorted(cls.__tickers)
@@ -1,4 +1,8 @@
 import datetime as dt
+import os
+import pickle
+from time import perf_counter
+import numpy as np
 import pandas as pd
 from typing import Optional
 
@@ -6,44 +10,100 @@ from stocktrace.algorithm import Algorithm
 from stocktrace.asset import AssetManager
 from stocktrace.logger import Logger as logger
 from stocktrace.trade_system import Broker
+from stocktrace.trading_calendar import TradingCalendar
 from stocktrace.utils import TIMEZONE
 
+# Seconds between checkpoints of a run, see Backtest.run()
+DEFAULT_CHECKPOINT_INTERVAL = 60.0
+CHECKPOINT_VERSION = 2
+
 class Backtest:
     def __init__(self,
                  algorithm, 
                  broker: Broker, 
                  start_date: Optional[dt.datetime]=dt.datetime.min.replace(tzinfo=TIMEZONE), 
-                 end_date: Optional[dt.datetime]=None) -> None:
-        logger.debug(f'Backtest.__init__ Creating Backtest with algorithm {algorithm.name}, start date {start_date}, end date {end_date}')
-        self.__algorithm = algorithm()
+                 end_date: Optional[dt.datetime]=None,
+                 params: Optional[dict]=None,
+                 calendar: Optional[TradingCalendar]=None,
+                 benchmark: str='^GSPC') -> None:
+        '''params are passed to the algorithm constructor. The run steps through the bars of calendar, the bars of benchmark if it is None'''
+        logger.debug(f'Backtest.__init__ Creating Backtest with algorithm {algorithm.__name__}, start date {start_date}, end date {end_date}, params {params}')
+        self.__algorithm = algorithm(**(params if params else {}))
         self.__broker = broker
         self.__start_date = start_date
         self.__end_date = end_date
+        self.__calendar = calendar
+        self.__benchmark = benchmark
         self.__completed = False
         self.__equity = pd.Series(dtype=float)
     
-    def run(self, trace=False) -> None:
+    def run(self, trace=False, checkpoint_path: Optional[str]=None, checkpoint_interval: float=DEFAULT_CHECKPOINT_INTERVAL) -> None:
+        '''Writes a checkpoint to checkpoint_path every checkpoint_interval seconds, see resume()'''
         logger.info(f'Backtest.run() Running backtest {self}')
-        self.__algorithm.init()
-        snp = AssetManager.get('^GSPC')
-        self.__start_date = snp.prev_or_equal_date(max(self.__start_date, self.__algorithm.get_latest_start()))
-        time = self.__start_date
-        self.__end_date = snp.prev_or_equal_date(self.__end_date if self.__end_date else dt.datetime.now(tz=TIMEZONE))
+        # Every asset the run touches stays in memory until it completes
+        with AssetManager.pinning():
+            self.__algorithm.init()
+            if self.__calendar is None:
+                self.__calendar = TradingCalendar([self.__benchmark])
+            self.__start_date = self.__calendar.prev_or_equal_date(max(self.__start_date, self.__algorithm.get_latest_start()))
+            self.__end_date = self.__calendar.prev_or_equal_date(self.__end_date if self.__end_date else dt.datetime.now(tz=TIMEZONE))
+            self.__run(0, np.empty(0, dtype=np.int64), trace, checkpoint_path, checkpoint_interval)
+
+    @classmethod
+    def resume(cls, path: str, trace=False, checkpoint_interval: float=DEFAULT_CHECKPOINT_INTERVAL) -> 'Backtest':
+        '''Continues the run saved in the checkpoint at path to completion, checkpointing to path again, and returns it'''
+        with open(path, 'rb') as f:
+            checkpoint = pickle.load(f)
+        if checkpoint.get('version') != CHECKPOINT_VERSION:
+            raise ValueError(f'Backtest.resume() {path} is a version {checkpoint.get("version")} checkpoint, expected {CHECKPOINT_VERSION}')
+        backtest: Backtest = checkpoint['backtest']
+        logger.info(f'Backtest.resume() Resuming backtest {backtest} at bar {checkpoint["bar"]}')
+        with AssetManager.pinning():
+            backtest.__run(checkpoint['bar'], checkpoint['equity'], trace, path, checkpoint_interval, checkpoint['time'])
+        return backtest
+
+    def __run(self, bar: int, done: np.ndarray, trace: bool, checkpoint_path: Optional[str], checkpoint_interval: float,
+              last_time: Optional[dt.datetime]=None) -> None:
+        '''Runs the bars from position bar of the run on, done holds the equity of the bars before it'''
+        calendar = self.__calendar.index
+        self.__algorithm.set_calendar(self.__calendar)
+        self.__broker.calendar = self.__calendar
+        first = int(calendar.searchsorted(self.__start_date, side='left'))
+        times = calendar[first:int(calendar.searchsorted(self.__end_date, side='right'))]
+        if bar and (bar > len(times) or times[bar-1] != last_time):
+            raise ValueError(f'Backtest.resume() checkpoint bar {bar} at {last_time} is not in {self.__calendar}')
+        # Equity in cents, written in place per bar and wrapped in a float64 Series once the run completes
+        equity = np.empty(len(times), dtype=np.int64)
+        equity[:bar] = done
         last_percent = 0
-        while (time <= self.__end_date):
-            self.__broker.process_orders(time)
+        next_checkpoint = perf_counter() + checkpoint_interval
+        for i in range(bar, len(times)):
+            time = times[i]
+            self.__algorithm.bar = first+i
+            self.__broker.process_orders(time, first+i)
             self.__algorithm.next(time, self.__broker)
-            self.__equity.loc[time] = self.__broker.equity(time)
-            i = snp.data.index.get_loc(time)
+            equity[i] = self.__broker.equity_at(first+i)
+            if checkpoint_path and perf_counter() >= next_checkpoint:
+                self.__checkpoint(checkpoint_path, i+1, time, equity[:i+1])
+                next_checkpoint = perf_counter() + checkpoint_interval
             if trace:
                 percent = (pd.Timestamp(time)-pd.Timestamp(self.__start_date))/(pd.Timestamp(self.__end_date)-pd.Timestamp(self.__start_date))*100
                 if percent >= last_percent+10:
                     last_percent = percent
                     print(percent)
-            time = snp.data.index[i+1] if i+1 < len(snp.data.index) else (self.__end_date+dt.timedelta(seconds=1))
+        self.__equity = pd.Series(equity.astype(np.float64), index=times.rename(None))
         if trace:
             print('Complete!')
         self.__completed = True
+
+    def __checkpoint(self, path: str, bar: int, time: dt.datetime, equity: np.ndarray) -> None:
+        '''Pickles the broker, algorithm and equity so far, replacing path only once the new checkpoint is fully written'''
+        checkpoint = {'version': CHECKPOINT_VERSION, 'backtest': self, 'bar': bar, 'time': time, 'equity': equity}
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            pickle.dump(checkpoint, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+        logger.info(f'Backtest.__checkpoint() Saved bar {bar} at {time} to {path}')
     
     def get_traded_tickers(self) -> list[str]:
         return self.__broker.get_traded_tickers()
@@ -60,6 +120,14 @@ class Backtest:
             raise RuntimeError('Backtest has not been completed yet')
         return self.__end_date
     
+    @property
+    def calendar(self) -> Optional[TradingCalendar]:
+        return self.__calendar
+
+    @property
+    def benchmark(self) -> str:
+        return self.__benchmark
+
     @property
     def algorithm(self) -> Algorithm:
         return self.__algorithm
@@ -8,24 +8,36 @@ from stocktrace.indicator import IndicatorManager
 from stocktrace.trade_system import Order, Broker
 
 class SMACrossOver(Algorithm):
+    def __init__(self, name: str=None, ticker_symbol: str='GOOG', fast: int=10, slow: int=20) -> None:
+        super().__init__(name)
+        self.__ticker_symbol = ticker_symbol
+        self.__fast = fast
+        self.__slow = slow
+
     def init(self) -> None:
         self.name = 'SMACrossOver'
-        self.sma1 = self.indicator('SMA_TEN', 'GOOG')
-        self.sma2 = self.indicator('SMA_TWENTY', 'GOOG')
+        self.sma1 = self.indicator('SMA', self.__ticker_symbol, window=self.__fast)
+        self.sma2 = self.indicator('SMA', self.__ticker_symbol, window=self.__slow)
         self.__latest_start = self.sma2.data.index[1]
+
+    def set_calendar(self, calendar) -> None:
+        super().set_calendar(calendar)
+        # First bar whose previous bar is at or after the latest start
+        self.__start_bar = int(self.calendar.index.searchsorted(self.__latest_start))+1
     
     def next(self, time: dt.datetime, broker: Broker) -> None:
-        prev_time = AssetManager.get('^GSPC').prev_date(time)
-        if prev_time < self.__latest_start:
+        i = self.bar
+        if i < self.__start_bar:
             return
-        if self.sma1.data[time] > self.sma2.data[time] and self.sma1.data[prev_time] <= self.sma2.data[prev_time]:
-            close_order = Order(broker, 'GOOG', -broker.get_position('GOOG').shares, time_placed=time)
-            buy_order = Order(broker, 'GOOG', broker.cash//AssetManager.get('GOOG').get_cents(time), time_placed=time)
+        sma1, sma2 = self.sma1.aligned, self.sma2.aligned
+        if sma1[i] > sma2[i] and sma1[i-1] <= sma2[i-1]:
+            close_order = Order(broker, self.__ticker_symbol, -broker.get_position(self.__ticker_symbol).shares, time_placed=time)
+            buy_order = Order(broker, self.__ticker_symbol, broker.cash//AssetManager.get(self.__ticker_symbol).get_cents(time), time_placed=time)
             broker.place_order(close_order)
             broker.place_order(buy_order)
-        elif self.sma1.data[time] < self.sma2.data[time] and self.sma1.data[prev_time] >= self.sma2.data[prev_time]:
-            close_order = Order(broker, 'GOOG', -broker.get_position('GOOG').shares, time_placed=time)
-            buy_order = Order(broker, 'GOOG', -broker.cash//AssetManager.get('GOOG').get_cents(time), time_placed=time)
+        elif sma1[i] < sma2[i] and sma1[i-1] >= sma2[i-1]:
+            close_order = Order(broker, self.__ticker_symbol, -broker.get_position(self.__ticker_symbol).shares, time_placed=time)
+            buy_order = Order(broker, self.__ticker_symbol, -broker.cash//AssetManager.get(self.__ticker_symbol).get_cents(time), time_placed=time)
             broker.place_order(close_order)
             broker.place_order(buy_order)
 
@@ -37,28 +49,34 @@ class MultiSMACrossOver(Algorithm):
         self.sma1aapl = self.indicator('SMA_TEN', 'AAPL')
         self.sma2aapl = self.indicator('SMA_TWENTY', 'AAPL')
         self.__latest_start = max(self.sma2goog.data.index[1], self.sma2aapl.data.index[1])
+
+    def set_calendar(self, calendar) -> None:
+        super().set_calendar(calendar)
+        self.__start_bar = int(self.calendar.index.searchsorted(self.__latest_start))+1
     
     def next(self, time: dt.datetime, broker: Broker) -> None:
-        prev_time = AssetManager.get('^GSPC').prev_date(time)
-        if prev_time < self.__latest_start:
+        i = self.bar
+        if i < self.__start_bar:
             return
-        if self.sma1goog.data[time] > self.sma2goog.data[time] and self.sma1goog.data[prev_time] <= self.sma2goog.data[prev_time]:
+        sma1goog, sma2goog = self.sma1goog.aligned, self.sma2goog.aligned
+        sma1aapl, sma2aapl = self.sma1aapl.aligned, self.sma2aapl.aligned
+        if sma1goog[i] > sma2goog[i] and sma1goog[i-1] <= sma2goog[i-1]:
             close_order = Order(broker, 'GOOG', -broker.get_position('GOOG').shares, time_placed=time)
             buy_order = Order(broker, 'GOOG', broker.cash//AssetManager.get('GOOG').get_cents(time), time_placed=time)
             broker.place_order(close_order)
             broker.place_order(buy_order)
-        elif self.sma1goog.data[time] < self.sma2goog.data[time] and self.sma1goog.data[prev_time] >= self.sma2goog.data[prev_time]:
+        elif sma1goog[i] < sma2goog[i] and sma1goog[i-1] >= sma2goog[i-1]:
             close_order = Order(broker, 'GOOG', -broker.get_position('GOOG').shares, time_placed=time)
             buy_order = Order(broker, 'GOOG', -broker.cash//AssetManager.get('GOOG').get_cents(time), time_placed=time)
             broker.place_order(close_order)
             broker.place_order(buy_order)
 
-        if self.sma1aapl.data[time] > self.sma2aapl.data[time] and self.sma1aapl.data[prev_time] <= self.sma2aapl.data[prev_time]:
+        if sma1aapl[i] > sma2aapl[i] and sma1aapl[i-1] <= sma2aapl[i-1]:
             close_order = Order(broker, 'AAPL', -broker.get_position('AAPL').shares, time_placed=time)
             buy_order = Order(broker, 'AAPL', broker.cash//AssetManager.get('AAPL').get_cents(time), time_placed=time)
             broker.place_order(close_order)
             broker.place_order(buy_order)
-        elif self.sma1aapl.data[time] < self.sma2aapl.data[time] and self.sma1aapl.data[prev_time] >= self.sma2aapl.data[prev_time]:
+        elif sma1aapl[i] < sma2aapl[i] and sma1aapl[i-1] >= sma2aapl[i-1]:
             close_order = Order(broker, 'AAPL', -broker.get_position('AAPL').shares, time_placed=time)
             buy_order = Order(broker, 'AAPL', -broker.cash//AssetManager.get('AAPL').get_cents(time), time_placed=time)
             broker.place_order(close_order)
@@ -1,91 +1,471 @@
+from abc import ABC, abstractmethod
 import datetime as dt
-from math import ceil
+import json
+import os
+import shutil
+import numpy as np
 import pandas as pd
 
-from os.path import isfile
+from os.path import isdir, isfile
 from typing import Optional
 
 from stocktrace.logger import Logger as logger
-from stocktrace.utils import TIMEZONE
+from stocktrace.utils import TIMEZONE, DATA_PATH, datetime_to_ns, index_to_ns
 
-class CSV:
+NPY_EXTENSION = '.npy'
+NO_CENTS = -1
+NPY_MAX_SEGMENTS = 64
+DIGEST_MASK = (1 << 64)-1
+
+class Store(ABC):
+    '''
+    A Store is the on-disk backend of a CSV, it only ever rewrites everything or appends rows to the end
+    '''
     def __init__(self, file_path: str) -> None:
+        self.__file_path = file_path
+
+    @abstractmethod
+    def exists(self) -> bool:
+        pass
+
+    @abstractmethod
+    def read(self, parse_dates: bool=False) -> pd.DataFrame:
+        pass
+
+    @abstractmethod
+    def write(self, data: pd.DataFrame, append: bool=False) -> None:
+        pass
+
+    @property
+    def file_path(self) -> str:
+        return self.__file_path
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({self.file_path})'
+
+class CSVStore(Store):
+    def exists(self) -> bool:
+        return isfile(self.file_path)
+
+    def read(self, parse_dates: bool=False) -> pd.DataFrame:
+        if parse_dates:
+            return pd.read_csv(self.file_path, parse_dates=[0], index_col=0)
+        return pd.read_csv(self.file_path, index_col=0)
+
+    def write(self, data: pd.DataFrame, append: bool=False) -> None:
+        if append:
+            data.to_csv(self.file_path, mode='a', header=False)
+        else:
+            data.to_csv(self.file_path)
+
+class NPYStore(Store):
+    '''
+    Columnar binary Store, file_path is a directory holding a meta.json and numbered append-only segments,
+    each segment holding one .npy file for the index and one per column. Segments are memory mapped on read.
+    '''
+    def exists(self) -> bool:
+        return isfile(os.path.join(self.file_path, 'meta.json'))
+
+    def read(self, parse_dates: bool=False) -> pd.DataFrame:
+        meta = self._read_meta()
+        segments = self._segments()
+        index = self._concat([np.load(os.path.join(seg, 'index.npy'), mmap_mode='r') for seg in segments])
+        columns = {}
+        for i, col in enumerate(meta['columns']):
+            values = self._concat([np.load(os.path.join(seg, f'{i}.npy'), mmap_mode='r') for seg in segments])
+            columns[col] = values.astype(object) if values.dtype.kind == 'U' else values
+        return pd.DataFrame(columns, index=self._decode_index(index, meta['index']), columns=meta['columns'])
+
+    def write(self, data: pd.DataFrame, append: bool=False) -> None:
+        if not append or not self.exists():
+            if isdir(self.file_path):
+                shutil.rmtree(self.file_path)
+            os.makedirs(self.file_path)
+            meta = {'columns': [str(col) for col in data.columns], 'index': self._index_meta(data.index)}
+            with open(os.path.join(self.file_path, 'meta.json'), 'w') as file:
+                json.dump(meta, file)
+        else:
+            meta = self._read_meta()
+            if meta['columns'] != [str(col) for col in data.columns]:
+                raise ValueError(f'NPYStore.write() columns {list(data.columns)} do not match {meta["columns"]} in {self.file_path}')
+        segments = self._segments()
+        segment = os.path.join(self.file_path, f'{len(segments):05d}')
+        os.makedirs(segment)
+        np.save(os.path.join(segment, 'index.npy'), self._encode_index(data.index))
+        for i, col in enumerate(data.columns):
+            values = data[col].to_numpy()
+            np.save(os.path.join(segment, f'{i}.npy'), values.astype(str) if values.dtype == object else values)
+        if len(segments)+1 > NPY_MAX_SEGMENTS:
+            self.compact()
+
+    def compact(self) -> None:
+        '''Merges every segment into one'''
+        logger.info(f'NPYStore.compact() compacting {len(self._segments())} segments of {self.file_path}')
+        self.write(self.read())
+
+    def _segments(self) -> list[str]:
+        return sorted(entry.path for entry in os.scandir(self.file_path) if entry.is_dir())
+
+    def _read_meta(self) -> dict:
+        with open(os.path.join(self.file_path, 'meta.json')) as file:
+            return json.load(file)
+
+    def _concat(self, arrays: list[np.ndarray]) -> np.ndarray:
+        return arrays[0] if len(arrays) == 1 else np.concatenate(arrays)
+
+    def _index_meta(self, index: pd.Index) -> dict:
+        if not isinstance(index, pd.DatetimeIndex):
+            return {'name': index.name, 'kind': 'values'}
+        if index.tz is None:
+            return {'name': index.name, 'kind': 'datetime', 'tz': None}
+        offset = index.tz.utcoffset(None)
+        tz = offset.total_seconds() if offset is not None else str(index.tz)
+        return {'name': index.name, 'kind': 'datetime', 'tz': tz}
+
+    def _encode_index(self, index: pd.Index) -> np.ndarray:
+        if isinstance(index, pd.DatetimeIndex):
+            return index.asi8
+        values = index.to_numpy()
+        return values.astype(str) if values.dtype == object else values
+
+    def _decode_index(self, values: np.ndarray, meta: dict) -> pd.Index:
+        if meta['kind'] == 'values':
+            return pd.Index(values.astype(object) if values.dtype.kind == 'U' else values, name=meta['name'])
+        index = pd.DatetimeIndex(np.asarray(values, dtype='datetime64[ns]'), name=meta['name'])
+        if meta['tz'] is None:
+            return index
+        tz = dt.timezone(dt.timedelta(seconds=meta['tz'])) if isinstance(meta['tz'], (int, float)) else meta['tz']
+        return index.tz_localize('UTC').tz_convert(tz)
+
+class MemoryStore(Store):
+    '''
+    Store holding its data in memory only, file_path just names it. Used for histories built from
+    data that already lives elsewhere, such as the shared price arrays attached by worker processes
+    '''
+    def __init__(self, file_path: str, data: Optional[pd.DataFrame]=None) -> None:
+        super().__init__(file_path)
+        self.__data = data
+
+    def exists(self) -> bool:
+        return self.__data is not None
+
+    def read(self, parse_dates: bool=False) -> pd.DataFrame:
+        return self.__data
+
+    def write(self, data: pd.DataFrame, append: bool=False) -> None:
+        self.__data = pd.concat([self.__data, data]) if append and self.__data is not None else data
+
+def make_store(file_path: str) -> Store:
+    if file_path.endswith(NPY_EXTENSION):
+        return NPYStore(file_path)
+    return CSVStore(file_path)
+
+class GrowableArray:
+    '''
+    Append-only numpy buffer that doubles its capacity when full, so n appended rows cost O(n) copies in total
+    '''
+    def __init__(self, values: Optional[np.ndarray]=None, dtype=np.int64) -> None:
+        values = np.empty(0, dtype=dtype) if values is None else np.asarray(values, dtype=dtype)
+        self.__buffer = np.empty(max(len(values), 16), dtype=dtype)
+        self.__buffer[:len(values)] = values
+        self.__length = len(values)
+
+    def extend(self, values: np.ndarray) -> None:
+        length = self.__length + len(values)
+        if length > len(self.__buffer):
+            buffer = np.empty(max(length, 2*len(self.__buffer)), dtype=self.__buffer.dtype)
+            buffer[:self.__length] = self.__buffer[:self.__length]
+            self.__buffer = buffer
+        self.__buffer[self.__length:length] = values
+        self.__length = length
+
+    @property
+    def values(self) -> np.ndarray:
+        return self.__buffer[:self.__length]
+
+    @property
+    def nbytes(self) -> int:
+        return self.__buffer.nbytes
+
+    def __len__(self) -> int:
+        return self.__length
+
+class CSV:
+    def __init__(self, file_path: str, store: Optional[Store]=None) -> None:
         logger.debug(f'CSV.__init__ Creating CSV with file path {file_path}')
         self.__file_path = file_path
+        self.__store = store if store else make_store(file_path)
         self._data = pd.DataFrame()
+        self.__pending: list[pd.DataFrame] = []
+        self.__pending_length = 0
         self.__file_length = 0
         self.data
     
     def save(self) -> None:
-        if self._data.empty:
+        if self.data.empty:
             return
         logger.debug(f'CSV.save() saving data of {self.file_path}...')
         if self.__file_length == 0:
-            self._data.to_csv(self.__file_path)
+            self.store.write(self._data)
             self.__file_length = len(self._data.index)
         elif self.__file_length < len(self.data.index):
             append_data = self._data.iloc[self.__file_length:]
-            append_data.to_csv(self.__file_path, mode='a', header=False)
+            self.store.write(append_data, append=True)
             self.__file_length = len(self.data.index)
     
     def append(self, data: pd.DataFrame) -> None:
         logger.info(f'CSV.append() appending data to {self.file_path}')
-        if self._data.empty:
-            self._data = data
-        else:
-            self._data = pd.concat([self._data, data])
+        # Chunks are only concatenated once data is read, so repeated appends don't copy the frame each time
+        self.__pending.append(data)
+        self.__pending_length += len(data.index)
     
     def read_csv(self) -> None:
-        self._data = pd.read_csv(self.__file_path, index_col=0)
+        self._data = self.store.read()
+
+    def unload(self) -> None:
+        '''Saves any unsaved rows and drops the in-memory data, it is read back from the store on next access'''
+        if self._data.empty and not self.__pending:
+            return
+        if self.row_count > self.__file_length:
+            logger.info(f'CSV.unload() saving unsaved rows of {self.file_path} before unloading')
+            self.save()
+        self._data = pd.DataFrame()
+
+    def memory_usage(self) -> int:
+        '''Bytes held by the in-memory data, 0 if it is unloaded'''
+        frames = [self._data, *self.__pending]
+        return int(sum(frame.memory_usage(index=True).sum() for frame in frames if not frame.empty))
     
     @property
     def data(self) -> pd.DataFrame:
-        if self._data.empty and isfile(self.__file_path):
+        if self._data.empty and self.store.exists():
             self.read_csv()
             self.__file_length = len(self._data.index)
+        if self.__pending:
+            frames = [frame for frame in [self._data, *self.__pending] if not frame.empty]
+            if frames:
+                self._data = frames[0] if len(frames) == 1 else pd.concat(frames)
+            self.__pending.clear()
+            self.__pending_length = 0
         return self._data
 
+    def _index_at(self, i: int):
+        '''Index label of row i, read from the appended chunks directly if they haven't been concatenated yet'''
+        if i < len(self._data.index):
+            return self._data.index[i]
+        rows_from_end = self.row_count-i
+        for chunk in reversed(self.__pending):
+            if rows_from_end <= len(chunk.index):
+                return chunk.index[len(chunk.index)-rows_from_end]
+            rows_from_end -= len(chunk.index)
+        raise IndexError(f'CSV._index_at() row {i} out of range in {self.file_path}')
+
+    @property
+    def row_count(self) -> int:
+        '''Number of rows including appended chunks, without concatenating them'''
+        length = len(self._data.index)
+        if length == 0 and not self.__pending:
+            return len(self.data.index)
+        return length + self.__pending_length
+
     @property
     def file_path(self) -> str:
         return self.__file_path
 
+    @property
+    def store(self) -> Store:
+        return self.__store
+
 class TIME_CSV(CSV):
-    def __init__(self, file_path: str) -> None:
-        super().__init__(file_path)
+    def __init__(self, file_path: str, store: Optional[Store]=None) -> None:
+        self.__index_ns = GrowableArray()
+        self.__cents: dict[str, GrowableArray] = {}
+        # Data frame the caches were last checked against
+        self.__synced_data: Optional[pd.DataFrame] = None
+        # Sum of the row digests of every row, see version
+        self.__digest: Optional[int] = None
+        self.__rewrites = 0
+        super().__init__(file_path, store)
     
     def read_csv(self) -> None:
-        self._data = pd.read_csv(self.file_path, parse_dates=[0], index_col=0)
+        self._data = self.store.read(parse_dates=True)
+
+    def unload(self) -> None:
+        super().unload()
+        self.__reset_caches()
+
+    def reload(self) -> None:
+        '''unload() for a store whose rows changed underneath, the rows read back count as a rewrite'''
+        self.unload()
+        self.__rewrites += 1
+
+    def truncate(self, rows: int) -> None:
+        '''
+        Drops the rows from position rows onward so appended rows can replace them, counted as a rewrite.
+        The store is not rewritten, only for stores that are never written such as derived ones
+        '''
+        data = self.data
+        if 0 < rows < len(data.index):
+            data.drop(data.index[rows:], inplace=True)
+            self.__rewritten()
+
+    def memory_usage(self) -> int:
+        return super().memory_usage() + self.__index_ns.nbytes + sum(cents.nbytes for cents in self.__cents.values())
+
+    def append(self, data: pd.DataFrame) -> None:
+        in_sync = self.__in_sync()
+        super().append(data)
+        if in_sync:
+            index_ns = index_to_ns(data.index)
+            self.__index_ns.extend(index_ns)
+            for col, cents in self.__cents.items():
+                if len(cents) == len(self.__index_ns)-len(index_ns) and col in data.columns:
+                    cents.extend(to_cents(data[col].to_numpy()))
+            if self.__digest is not None:
+                columns = data if self._data.empty else data.reindex(columns=self._data.columns)
+                self.__digest = (self.__digest + int(row_digests(index_ns, columns).sum(dtype=np.uint64))) & DIGEST_MASK
+        else:
+            # Rows were dropped from data in place, the appended rows may reuse their count and timestamps
+            self.__rewritten()
 
     def get_cents(self, time: dt.datetime, col: str = 'Close') -> Optional[int]:
         # logger.info(f'CSV.get_cents() getting {col} at {time} from {self.file_path} ...')
-        time = self.prev_or_equal_date(time)
-        try:
-            result = ceil(self.data.loc[time][col]*100)
-            # logger.info(f'... {result}')
-            return result
-        except KeyError:
+        i = self.prev_or_equal_index(time)
+        if i < 0:
             logger.warning(f'CSV.get_cents() could not find date {time} in {self.file_path}')
             return None
+        return self.get_cents_at(i, col)
+
+    def get_cents_at(self, i: int, col: str = 'Close') -> Optional[int]:
+        '''get_cents() by row position, as returned by prev_index() and prev_or_equal_index()'''
+        if i < 0:
+            return None
+        cents = self.cents(col)[i]
+        return None if cents == NO_CENTS else int(cents)
+
+    def get_cents_many(self, times, col: str = 'Close') -> np.ndarray:
+        '''Batch get_cents(), NO_CENTS where there is no previous or equal date'''
+        indices = self.prev_or_equal_indices(times)
+        cents = self.cents(col)
+        if len(cents) == 0:
+            return np.full(len(indices), NO_CENTS, dtype=np.int64)
+        return np.where(indices >= 0, cents[np.maximum(indices, 0)], NO_CENTS)
+
+    def cents(self, col: str = 'Close') -> np.ndarray:
+        '''int64 array of ceil(col*100) for every row, extended incrementally as rows are appended'''
+        index_ns = self.index_ns
+        cents = self.__cents.get(col)
+        if cents is None or len(cents) != len(index_ns):
+            values = self.data[col].to_numpy() if col in self.data.columns else np.empty(0)
+            cents = GrowableArray(to_cents(values))
+            self.__cents[col] = cents
+        return cents.values
     
+    def prev_index(self, time: dt.datetime) -> int:
+        '''Position of the last row strictly before time, -1 if there is none'''
+        return int(np.searchsorted(self.index_ns, datetime_to_ns(time), side='left'))-1
+
+    def prev_or_equal_index(self, time: dt.datetime) -> int:
+        '''Position of the last row at or before time, -1 if there is none'''
+        return int(np.searchsorted(self.index_ns, datetime_to_ns(time), side='right'))-1
+
+    def prev_indices(self, times) -> np.ndarray:
+        return np.searchsorted(self.index_ns, index_to_ns(pd.DatetimeIndex(times)), side='left')-1
+
+    def prev_or_equal_indices(self, times) -> np.ndarray:
+        return np.searchsorted(self.index_ns, index_to_ns(pd.DatetimeIndex(times)), side='right')-1
+
+    def latest_index(self) -> int:
+        return len(self.index_ns)-1
+
+    @property
+    def version(self) -> str:
+        '''
+        Identifies the rows held by their count, last timestamp and a digest of their content, changes whenever
+        rows are appended or rewritten and is stable across sessions. The digest is extended in place on append
+        '''
+        index_ns = self.index_ns
+        if self.__digest is None:
+            self.__digest = int(row_digests(index_ns, self.data).sum(dtype=np.uint64))
+        return f'{len(index_ns)}-{index_ns[-1] if len(index_ns) else 0}-{self.__digest:016x}'
+
+    @property
+    def rewrites(self) -> int:
+        '''Times rows already held were found changed in place rather than appended to, 0 for an append-only history'''
+        return self.__rewrites
+
     def prev_date(self, time: dt.datetime) -> dt.datetime:
-        if self.data.empty:
+        if self.row_count == 0:
             logger.warning(f'CSV.prev_date() no data in {self.file_path}')
             return dt.datetime.min.replace(tzinfo=TIMEZONE)
-        try:
-            return self._data.index[self._data.index < time][-1]
-        except IndexError:
+        i = self.prev_index(time)
+        if i < 0:
             logger.warning(f'CSV.prev_date() could not find previous date to {time} in {self.file_path}')
             return dt.datetime.min.replace(tzinfo=TIMEZONE)
+        return self._index_at(i)
     
     def prev_or_equal_date(self, time: dt.datetime) -> dt.datetime:
-        if self.data.empty:
+        if self.row_count == 0:
             logger.warning(f'CSV.prev_or_equal_date() no data in {self.file_path}')
             return dt.datetime.min.replace(tzinfo=TIMEZONE)
-        try:
-            return self._data.index[self._data.index <= time][-1]
-        except IndexError:
+        i = self.prev_or_equal_index(time)
+        if i < 0:
             logger.warning(f'CSV.prev_or_equal_date() could not find previous or equal date to {time} in {self.file_path}')
             return dt.datetime.min.replace(tzinfo=TIMEZONE)
+        return self._index_at(i)
+
+    def prev_dates(self, times) -> pd.DatetimeIndex:
+        '''Batch prev_date(), NaT where there is no previous date'''
+        return self._dates_at(self.prev_indices(times))
+
+    def prev_or_equal_dates(self, times) -> pd.DatetimeIndex:
+        '''Batch prev_or_equal_date(), NaT where there is no previous or equal date'''
+        return self._dates_at(self.prev_or_equal_indices(times))
+
+    def _dates_at(self, indices: np.ndarray) -> pd.DatetimeIndex:
+        dates = self.data.index[np.maximum(indices, 0)] if len(self.data.index) else pd.DatetimeIndex([pd.NaT]*len(indices))
+        return dates.where(indices >= 0, pd.NaT)
+
+    @property
+    def index_ns(self) -> np.ndarray:
+        '''Sorted int64 nanosecond timestamps of the index, rebuilt along with the cents only when it falls out of sync'''
+        if not self.__in_sync():
+            index = self.data.index
+            if not index.is_monotonic_increasing:
+                logger.warning(f'TIME_CSV.index_ns index of {self.file_path} is not sorted, date lookups will be wrong')
+            if len(self.__index_ns):
+                self.__rewritten()
+            else:
+                self.__reset_caches()
+            self.__index_ns = GrowableArray(index_to_ns(index))
+            self.__synced_data = self._data
+        return self.__index_ns.values
+
+    def __in_sync(self) -> bool:
+        '''
+        True if the cached timestamps match the rows held, both in count and in the last timestamp.
+        The timestamp is only compared once per data frame, while the frame is unchanged the count is enough
+        '''
+        row_count = self.row_count
+        if len(self.__index_ns) != row_count:
+            return False
+        if row_count == 0 or self._data is self.__synced_data:
+            return True
+        if self.__index_ns.values[-1] != datetime_to_ns(self._index_at(row_count-1)):
+            return False
+        self.__synced_data = self._data
+        return True
+
+    def __reset_caches(self) -> None:
+        self.__index_ns = GrowableArray()
+        self.__cents.clear()
+        self.__synced_data = None
+        self.__digest = None
+
+    def __rewritten(self) -> None:
+        logger.info(f'TIME_CSV rows of {self.file_path} were changed in place, rebuilding cached arrays')
+        self.__rewrites += 1
+        self.__reset_caches()
         
     def latest_date(self) -> dt.datetime:
         if self.data.empty:
@@ -97,4 +477,48 @@ class TIME_CSV(CSV):
         if self.data.empty:
             logger.warning(f'CSV.latest_cents() no data in {self.file_path}')
             return None
-        return ceil(self.data[col][-1]*100)
\ No newline at end of file
+        return self.get_cents_at(self.latest_index(), col)
+
+def _mix(x: np.ndarray) -> np.ndarray:
+    '''splitmix64 finalizer, spreads every input bit over the whole uint64'''
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xbf58476d1ce4e5b9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94d049bb133111eb)
+    return x ^ (x >> np.uint64(31))
+
+def row_digests(index_ns: np.ndarray, data: pd.DataFrame) -> np.ndarray:
+    '''
+    uint64 digest of every row from its timestamp and the cents of its numeric columns. Rows are digested
+    independently so the sum over a history can be extended by the rows appended to it
+    '''
+    digests = _mix(np.asarray(index_ns, dtype=np.int64).view(np.uint64))
+    numeric = data.select_dtypes('number')
+    for col in sorted(numeric.columns, key=str):
+        digests = _mix(digests ^ to_cents(numeric[col].to_numpy()).view(np.uint64))
+    return digests
+
+def to_cents(values: np.ndarray) -> np.ndarray:
+    cents = np.ceil(np.asarray(values, dtype=np.float64)*100)
+    return np.where(np.isfinite(cents), cents, NO_CENTS).astype(np.int64)
+
+def migrate_csv(data_path: str=DATA_PATH, remove: bool=False) -> list[str]:
+    '''One-shot conversion of every .csv in data_path to an NPYStore next to it, returns the migrated paths'''
+    migrated = []
+    for entry in sorted(os.scandir(data_path), key=lambda entry: entry.name):
+        if not entry.is_file() or not entry.name.endswith('.csv'):
+            continue
+        target = NPYStore(entry.path[:-len('.csv')] + NPY_EXTENSION)
+        if target.exists():
+            logger.info(f'migrate_csv() {target.file_path} already exists, skipping')
+            continue
+        data = CSVStore(entry.path).read()
+        if data.index.dtype == object:
+            try:
+                data.index = pd.to_datetime(data.index)
+            except (ValueError, TypeError):
+                pass
+        logger.info(f'migrate_csv() migrating {entry.path} to {target.file_path}')
+        target.write(data)
+        migrated.append(target.file_path)
+        if remove:
+            os.remove(entry.path)
+    return migrated
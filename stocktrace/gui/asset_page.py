@@ -18,7 +18,7 @@ class AssetPage(QWidget):
 
         self.__display_widget = QWidget()
         self.__title_widget = QLabel('Nothing selected')
-        self.__asset_select = ListSelect(AssetManager.get_assets().keys(), search_active=True)
+        self.__asset_select = ListSelect(AssetManager.get_tickers(), search_active=True)
         self.__indicator_select = ListSelect(IndicatorManager.get_indicators().keys())
         self.__asset_select_button = QPushButton('Select an Asset')
         self.__indicator_select_button = QPushButton('Add Indicators')
@@ -92,10 +92,11 @@ class AssetPage(QWidget):
         if asset is None:
             self.__asset_select.info_box.setText('Asset not found')
         else:
-            self.__asset_select.set_list(AssetManager.get_assets())
+            self.__asset_select.set_list(AssetManager.get_tickers())
             self.__asset_select.search_entry.setText('')
 
-app = QApplication([])
-window = AssetPage()
-window.show()
-app.exec()
+if __name__ == '__main__':
+    app = QApplication([])
+    window = AssetPage()
+    window.show()
+    app.exec()
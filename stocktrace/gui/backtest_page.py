@@ -267,9 +267,10 @@ class BacktestPage(QWidget):
 
 logger.init(2)
 
-app = QApplication([])
-page = BacktestPage()
-page.show()
-app.exec()
+if __name__ == '__main__':
+    app = QApplication([])
+    page = BacktestPage()
+    page.show()
+    app.exec()
     
     
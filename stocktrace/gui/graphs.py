@@ -9,7 +9,7 @@ from stocktrace.backtest import Backtest
 from stocktrace.indicator import IndicatorManager, Indicator
 from stocktrace.utils import TIMEZONE, interval_to_timedelta, delta_to_seconds, BULLISH, BEARISH, DARK
 from stocktrace.logger import Logger as logger
-from stocktrace.asset import Asset, AssetManager
+from stocktrace.asset import Asset, AssetManager, AssetWindow
 
 class CandlestickItem(pg.GraphicsObject):
     def __init__(self, parent: 'AssetWidget', asset: Asset, hover: bool=True, interval: str='1d',*args, **kargs) -> None:
@@ -34,7 +34,7 @@ class CandlestickItem(pg.GraphicsObject):
             full_rect = QtCore.QRectF(rect.x(), max(line.y1(), line.y2()), rect.width(), -line.length())
             if full_rect.contains(pos):
                 self.setOpacity(self.hover_opacity)
-                logger.info(f'Hovering over candlestick with time {self.asset.data.index[i]}')
+                logger.info(f'Hovering over candlestick with time {self.__parent.filtered_window().index[i]}')
                 break
             else:
                 self.setOpacity(self.default_opacity)
@@ -47,26 +47,26 @@ class CandlestickItem(pg.GraphicsObject):
         logger.info(f'Updating/Generating picture for {self.__repr__()}')
         
         painter = QtGui.QPainter(self.picture)
-        df = self.__parent.filtered_data()
-        close_data = df['Close']
-        open_data = df['Open']
-        high_data = df['High']
-        low_data = df['Low']
-        times = df.index
+        window = self.__parent.filtered_window()
+        close_data = window.close
+        open_data = window.open
+        high_data = window.high
+        low_data = window.low
+        times = window.timestamps
         assert len(times) >= 2
         width = delta_to_seconds(interval_to_timedelta(self.__interval))/2
         assert len(times) == len(close_data)
         self.candlesticks.clear()
         for i in range(len(close_data)):
-            open = open_data.iloc[i]
-            close = close_data.iloc[i]
-            high = high_data.iloc[i]
-            low = low_data.iloc[i]
+            open = open_data[i]
+            close = close_data[i]
+            high = high_data[i]
+            low = low_data[i]
             assert open > 0
             assert close > 0
             assert high > 0
             assert low > 0
-            time = times[i].timestamp()
+            time = times[i]
             rect = QtCore.QRectF(time-width/2, open, width, close-open)
             line = QtCore.QLineF(time, low, time, high)
             top_line = QtCore.QLineF(time-width/2, high, time+width/2, high)
@@ -128,6 +128,12 @@ class _TimeframeWidget(QtWidgets.QWidget):
     def update_timeframe(self, text: str) -> None:
         self.parent.update_timeframe(text)
 
+def indicator_label(name: str, params: dict) -> str:
+    '''Plot label of indicator name created with params, e.g. SMA(window=10)'''
+    if not params:
+        return name
+    return f"{name}({', '.join(f'{key}={value}' for key, value in params.items())})"
+
 class AssetWidget(QtWidgets.QWidget):
     def __init__(self, asset: Asset, auto_update: bool = True, start_date: Optional[dt.datetime]=dt.datetime.min.replace(tzinfo=TIMEZONE), end_date: Optional[dt.datetime]=dt.datetime.now(tz=TIMEZONE), *args, **kwargs) -> None:
         logger.debug(f'AssetWidget.__init__ Making AssetWidget with {asset}')
@@ -143,6 +149,10 @@ class AssetWidget(QtWidgets.QWidget):
         self.__color_index = 0
 
         self.asset.add_listener(self._update_callback)
+        AssetManager.pin(self.asset.ticker_symbol)
+        self.__released = False
+        # Widgets removed from a layout are destroyed without being closed
+        self.destroyed.connect(lambda: self.release())
 
         self.__plot_widget = pg.PlotWidget()
         self.__plot_item = self.plot_widget.plotItem
@@ -157,9 +167,12 @@ class AssetWidget(QtWidgets.QWidget):
 
         self._init_graph()
     
-    def add_indicator(self, name: str, pen: Optional[pg.QtGui.QPen]=None) -> None:
-        if name in self.__indicators.keys():
-            logger.warning(f'AssetWidget.add_indicator() Indicator {name} already added! Ignoring...')
+    def add_indicator(self, name: str, pen: Optional[pg.QtGui.QPen]=None, params: Optional[dict]=None) -> None:
+        '''Plots indicator name created with params, it is listed and removed by its label, see indicator_label()'''
+        params = params if params else {}
+        label = indicator_label(name, params)
+        if label in self.__indicators.keys():
+            logger.warning(f'AssetWidget.add_indicator() Indicator {label} already added! Ignoring...')
             return
         if not pen:
             pen = pg.mkPen(self.__colors[self.__color_index])
@@ -167,16 +180,16 @@ class AssetWidget(QtWidgets.QWidget):
             if self.__color_index >= len(self.__colors):
                 self.__color_index = 0
 
-        self.__indicators[name] = IndicatorManager.get_indicator(name)(name)
-        ind = self.__indicators[name]
+        self.__indicators[label] = IndicatorManager.get_indicator(name)(name, **params)
+        ind = self.__indicators[label]
         ind.init(self.asset.ticker_symbol)
-        self.__indicator_items[name] = pg.PlotDataItem(pen=pen, name=name)
+        self.__indicator_items[label] = pg.PlotDataItem(pen=pen, name=label)
         logger.info(f'Adding indicator x: {np.array([x.timestamp() for x in ind.data.index])}')
         logger.info(f'Adding indicator y: {ind.data.values}')
-        self.__indicator_items[name].setData(np.array([x.timestamp() for x in ind.data.index]), ind.data.values)
-        self.plot_item.addItem(self.__indicator_items[name])
+        self.__indicator_items[label].setData(np.array([x.timestamp() for x in ind.data.index]), ind.data.values)
+        self.plot_item.addItem(self.__indicator_items[label])
 
-        logger.info(f'AssetWidget.add_indicator() Added and initialized indicator {self.__indicators[name]} to {self.__repr__()}')
+        logger.info(f'AssetWidget.add_indicator() Added and initialized indicator {self.__indicators[label]} to {self.__repr__()}')
 
     def remove_indicator(self, name: str) -> None:
         if name not in self.__indicators.keys():
@@ -188,11 +201,25 @@ class AssetWidget(QtWidgets.QWidget):
     
     def set_asset(self, new_asset: Asset) -> None:
         self.asset.remove_listener(self._update_callback)
+        AssetManager.unpin(self.asset.ticker_symbol)
         self.__asset = new_asset
         self.__asset.add_listener(self._update_callback) 
+        AssetManager.pin(self.__asset.ticker_symbol)
         self.__candlestick_item.set_asset(new_asset)
         self.update_data()
     
+    def release(self) -> None:
+        '''Stops following the asset and unpins it so the memory budget applies to it again, called once the widget is closed or destroyed'''
+        if self.__released:
+            return
+        self.__released = True
+        self.asset.remove_listener(self._update_callback)
+        AssetManager.unpin(self.asset.ticker_symbol)
+
+    def closeEvent(self, event: QtGui.QCloseEvent) -> None:
+        self.release()
+        super().closeEvent(event)
+    
     def update_indicators(self) -> None:
         for name in self.__indicators.keys():
             assert name in self.__indicator_items.keys()
@@ -203,9 +230,9 @@ class AssetWidget(QtWidgets.QWidget):
     
     def update_data(self) -> None:
         logger.info(f'Updating data of {self.__repr__()}')
-        data = self.filtered_data()
-        x = np.array([x.timestamp() for x in data.index.to_numpy()])
-        y = data['Close'].to_numpy() # plot CLOSE data
+        window = self.filtered_window()
+        x = window.timestamps
+        y = window.close # plot CLOSE data
         logger.info(f'Retrieved x data:\n{x}')
         logger.info(f'Retrieved y data:\n{y}')
         self.line_item.setData(x, y)
@@ -229,12 +256,12 @@ class AssetWidget(QtWidgets.QWidget):
         if not timeframe:
             timeframe = self.timeframe
         logger.info(f'Updating timeframe of {self.__repr__()} to {timeframe}')
-        data = self.filtered_data()
-        timestamps = np.array([x.timestamp() for x in data.index.to_numpy()])
+        window = self.filtered_window()
+        timestamps = window.timestamps
         delta_seconds = timestamps[-1]-timestamps[0] if timeframe == 'Max' else delta_to_seconds(interval_to_timedelta(timeframe))
         start_x = timestamps[-1] - delta_seconds
         end_x = timestamps[-1]
-        start_y, end_y = get_y_minmax(start_x, end_x, data['High'].to_numpy(), data['Low'].to_numpy(), timestamps)
+        start_y, end_y = get_y_minmax(start_x, end_x, window.high, window.low, timestamps)
 
         logger.info(f'Updating x range to {timeframe}: {start_x} to {end_x}')
         logger.info(f'Updating y range to {timeframe}: {start_y} to {end_y}')
@@ -242,8 +269,8 @@ class AssetWidget(QtWidgets.QWidget):
         self.plot_item.setYRange(start_y, end_y)
         self.timeframe = timeframe
 
-    def filtered_data(self) -> pd.DataFrame:
-        return self.asset.data.loc[(self.asset.data.index >= self.__start_date) & (self.asset.data.index <= self.__end_date)]
+    def filtered_window(self) -> AssetWindow:
+        return self.asset.window(self.__start_date, self.__end_date)
 
     @property
     def asset(self) -> Asset:
@@ -339,7 +366,7 @@ class BacktestAssetWidget(AssetWidget):
     
     def _plot_indicators(self) -> None:
         for indicator in self.__backtest.algorithm.indicators:
-            self.add_indicator(indicator.name)
+            self.add_indicator(indicator.name, params=indicator.params)
     
     def _plot_trades(self) -> None:
         self.__trade_items.clear()
@@ -3,25 +3,34 @@ import datetime as dt
 import os
 import numpy as np
 import pandas as pd
-import yfinance as yf
 from typing import Optional
 
-from stocktrace.file import TIME_CSV
+from stocktrace.file import Store, TIME_CSV
 from stocktrace.logger import Logger as logger
+from stocktrace.provider import Provider, YFinanceProvider
 
-from stocktrace.utils import TIMEZONE, interval_to_timedelta
+from stocktrace.utils import TIMEZONE, interval_to_timedelta, interval_to_resample_args, delta_to_seconds, datetime_to_ns
+
+OHLC_AGGREGATION = {'Open': 'first', 'High': 'max', 'Low': 'min', 'Close': 'last', 'Volume': 'sum'}
 
 class History(ABC):
-	def __init__(self, file_path: str, interval: str='1d', listeners=[]) -> None:
+	def __init__(self, file_path: str, interval: str='1d', listeners: Optional[list]=None, update: bool=True, store: Optional[Store]=None) -> None:
 		self.__file_path = file_path
 		self.__interval = interval
-		self.__listeners = listeners
-		self.__csv = TIME_CSV(file_path)
-		self.update_data()
+		self.__listeners = list(listeners) if listeners else []
+		self.__csv = TIME_CSV(file_path, store)
+		if update:
+			self.update_data()
 	
 	def save_data(self) -> None:
 		self.__csv.save()
 
+	def unload_data(self) -> None:
+		self.__csv.unload()
+
+	def memory_usage(self) -> int:
+		return self.__csv.memory_usage()
+
 	@abstractmethod
 	def update_data() -> None:
 		pass
@@ -36,7 +45,8 @@ class History(ABC):
 	
 	def call_listeners(self) -> None:
 		logger.info(f'Calling listeners in: {self}')
-		for f in self.listeners:
+		# Listeners may remove themselves while being called
+		for f in list(self.listeners):
 			logger.info(f'Listener: {f}')
 			f()
 	
@@ -56,6 +66,10 @@ class History(ABC):
 	def data(self) -> pd.DataFrame:
 		return self.__csv.data
 
+	@property
+	def version(self) -> str:
+		return self.__csv.version
+
 	@property
 	def listeners(self) -> list:
 		return self.__listeners
@@ -64,33 +78,51 @@ class History(ABC):
 		return f'History({self.file_path}, {self.interval})'
 	
 class AssetHistory(History):
-	def __init__(self, ticker_symbol: str, file_path: str, interval: str='1d', auto_save = False) -> None:
+	def __init__(self, ticker_symbol: str, file_path: str, interval: str='1d', auto_save = False, provider: Optional[Provider]=None, update: bool=True, store: Optional[Store]=None) -> None:
 		logger.debug(f'AssetHistory.__init__ Creating AssetHistory with ticker symbol {ticker_symbol}, file path {file_path}, interval {interval}')
 
 		self.__ticker_found = False
 		self.__ticker_symbol = ticker_symbol
-		self.__ticker = yf.Ticker(self.ticker_symbol)
+		self.__provider = provider if provider else YFinanceProvider()
 		self.__auto_save = auto_save
-		super().__init__(file_path, interval)
+		# interval -> (bars, bucket starts, number of base rows they were computed from)
+		self.__resampled: dict[str, tuple[pd.DataFrame, pd.DatetimeIndex, int]] = {}
+		super().__init__(file_path, interval, update=update, store=store)
 	
 	def update_data(self) -> bool:
-		result = True
 		logger.info(f'AssetHistory.update_data Retrieving recent data of {self.ticker_symbol}')
-		last_updated = self.latest_date()
 		current_date = dt.datetime.now(TIMEZONE)
-
-		logger.info(f'Date of most recent data row (min date if empty): {last_updated}')
-		start = last_updated+interval_to_timedelta(self.interval)
-		if (start >= current_date):
-			logger.info(f'Data is up to current date {current_date}, continuing...')
-			self.__ticker_found = True
+		if self.is_up_to_date(current_date):
 			return
-		if (last_updated == dt.datetime.min.replace(tzinfo=TIMEZONE)):
+		start = self.update_start()
+		if start is None:
 			logger.info(f'No cached data found, initializing data...')
-			data_to_add = self._ticker.history(interval=self.interval, period='max')
 		else:
 			logger.info(f'Downloading new data...')
-			data_to_add = self._ticker.history(interval=self.interval, start=start, end=current_date)
+		data_to_add = self.provider.history([self.ticker_symbol], self.interval, start, current_date).get(self.ticker_symbol, pd.DataFrame())
+		return self.ingest(data_to_add)
+
+	def update_start(self) -> Optional[dt.datetime]:
+		'''Start of the data missing from the CSV, None if the full history is needed'''
+		last_updated = self.latest_date()
+		logger.info(f'Date of most recent data row (min date if empty): {last_updated}')
+		if (last_updated == dt.datetime.min.replace(tzinfo=TIMEZONE)):
+			return None
+		return last_updated+interval_to_timedelta(self.interval)
+
+	def is_up_to_date(self, current_date: dt.datetime) -> bool:
+		start = self.update_start()
+		if start is not None and start >= current_date:
+			logger.info(f'Data is up to current date {current_date}, continuing...')
+			self.__ticker_found = True
+			return True
+		return False
+
+	def ingest(self, data_to_add: pd.DataFrame) -> bool:
+		'''Cleans freshly downloaded rows, appends them to the CSV and notifies listeners'''
+		result = True
+		if data_to_add.empty:
+			data_to_add = pd.DataFrame(columns=['Open','High','Low','Close'], index=pd.DatetimeIndex([], tz=TIMEZONE))
 		logger.info(f'Cleaning data...')
 		data_to_add = data_to_add[['Open','High','Low','Close']].replace(0,np.nan)
 		null_count = data_to_add[['Open','High','Low','Close']].isna().sum().max()
@@ -107,9 +139,7 @@ class AssetHistory(History):
 			logger.info(f'Raw data retrieved:\n {data_to_add}')
 			#data_to_add.drop(data_to_add.index[0],inplace=True)
 			#logger.info(f'Raw data after dropping first index:\n {data_to_add}')
-			data_to_add.index = data_to_add.index.tz_convert('America/New_York')
-			data_to_add.index = data_to_add.index.normalize() + pd.Timedelta(hours=16)
-			data_to_add.index = data_to_add.index.tz_convert(TIMEZONE)
+			data_to_add.index = normalize_dates(data_to_add.index)
 
 			logger.info(f'Data retrieved, concatenating to existing CSV: {self.data}')
 			logger.info(f'Data to concat:\n{data_to_add}')
@@ -119,11 +149,47 @@ class AssetHistory(History):
 		self.call_listeners()
 		return result
 	
+	def resample(self, interval: str) -> pd.DataFrame:
+		'''Bars of a coarser interval derived from this history, cached and only recomputed from the last bar as rows are appended'''
+		if interval == self.interval:
+			return self.data
+		if delta_to_seconds(interval_to_timedelta(interval)) < delta_to_seconds(interval_to_timedelta(self.interval)):
+			raise ValueError(f'Cannot resample {self} to finer interval {interval}')
+		rows = self.csv.row_count
+		cached = self.__resampled.get(interval)
+		if cached is not None and cached[2] == rows:
+			return cached[0]
+		if cached is None or cached[2] > rows or cached[0].empty:
+			logger.info(f'AssetHistory.resample() Resampling {self.ticker_symbol} from {self.interval} to {interval}')
+			bars, starts = resample_ohlc(self.data, interval)
+		else:
+			# Only the last bar can have changed, recompute it together with every bar after it
+			bars, starts, _ = cached
+			i = int(np.searchsorted(self.csv.index_ns, datetime_to_ns(starts[-1]), side='left'))
+			new_bars, new_starts = resample_ohlc(self.data.iloc[i:], interval)
+			bars = pd.concat([bars.iloc[:-1], new_bars])
+			starts = starts[:-1].append(new_starts)
+		self.__resampled[interval] = (bars, starts, rows)
+		return bars
+
+	def unload_data(self) -> None:
+		super().unload_data()
+		self.__resampled.clear()
+
 	def latest_cents(self, col: str = 'Close') -> Optional[int]:
 		return self.csv.latest_cents(col)
 	
 	def get_cents(self, time: dt.datetime, col: str = 'Close') -> Optional[int]:
 		return self.csv.get_cents(time, col)
+
+	def get_cents_at(self, i: int, col: str = 'Close') -> Optional[int]:
+		return self.csv.get_cents_at(i, col)
+
+	def get_cents_many(self, times, col: str = 'Close') -> np.ndarray:
+		return self.csv.get_cents_many(times, col)
+
+	def cents(self, col: str = 'Close') -> np.ndarray:
+		return self.csv.cents(col)
 	
 	def latest_date(self) -> dt.datetime:
 		return self.csv.latest_date()
@@ -134,6 +200,21 @@ class AssetHistory(History):
 	def prev_or_equal_date(self, time: dt.datetime) -> dt.datetime:
 		return self.csv.prev_or_equal_date(time)
 
+	def prev_dates(self, times) -> pd.DatetimeIndex:
+		return self.csv.prev_dates(times)
+
+	def prev_or_equal_dates(self, times) -> pd.DatetimeIndex:
+		return self.csv.prev_or_equal_dates(times)
+
+	def prev_index(self, time: dt.datetime) -> int:
+		return self.csv.prev_index(time)
+
+	def prev_or_equal_index(self, time: dt.datetime) -> int:
+		return self.csv.prev_or_equal_index(time)
+
+	def latest_index(self) -> int:
+		return self.csv.latest_index()
+
 	@property
 	def ticker_symbol(self) -> str:
 		return self.__ticker_symbol
@@ -143,5 +224,116 @@ class AssetHistory(History):
 		return self.__ticker_found
 
 	@property
-	def _ticker(self) -> yf.Ticker:
-		return self.__ticker
\ No newline at end of file
+	def provider(self) -> Provider:
+		return self.__provider
+
+class ResampledStore(Store):
+	'''Read-only Store of the bars resampled from a base history, nothing is written since they are derived on read'''
+	def __init__(self, base: AssetHistory, interval: str) -> None:
+		super().__init__(f'{base.file_path}@{interval}')
+		self.__base = base
+		self.__interval = interval
+
+	def exists(self) -> bool:
+		return not self.__base.data.empty
+
+	def read(self, parse_dates: bool=False) -> pd.DataFrame:
+		# A copy, the cached resample of the base is not changed along with this data
+		return self.__base.resample(self.__interval).copy()
+
+	def write(self, data: pd.DataFrame, append: bool=False) -> None:
+		pass
+
+class ResampledHistory(AssetHistory):
+	'''
+	History of a coarser interval derived from a base AssetHistory through its resample(), nothing is downloaded or stored.
+	Follows the rows appended to the base, the last bar is replaced while it is still forming
+	'''
+	def __init__(self, base: AssetHistory, interval: str) -> None:
+		logger.debug(f'ResampledHistory.__init__ Creating ResampledHistory of {base} at interval {interval}')
+		self.__base = base
+		store = ResampledStore(base, interval)
+		super().__init__(base.ticker_symbol, store.file_path, interval, provider=base.provider, update=False, store=store)
+		base.add_listener(self.__sync)
+
+	def update_data(self) -> bool:
+		result = self.__base.update_data()
+		self.__sync()
+		return result
+
+	def __sync(self) -> None:
+		bars = self.__base.resample(self.interval)
+		data = self.csv.data
+		rows = len(data.index)
+		if rows > len(bars):
+			keep = 0
+		elif rows and not (data.index[-1] == bars.index[rows-1] and data.iloc[-1].equals(bars.iloc[rows-1])):
+			keep = rows-1
+		else:
+			keep = rows
+		if keep == rows == len(bars):
+			return
+		logger.info(f'ResampledHistory.__sync() Replacing {rows-keep} of {rows} {self.interval} bars of {self.ticker_symbol} with {len(bars)-keep}')
+		if keep == 0:
+			self.csv.reload()
+		else:
+			self.csv.truncate(keep)
+			self.csv.append(bars.iloc[keep:].copy())
+		self.call_listeners()
+
+	@property
+	def base(self) -> AssetHistory:
+		return self.__base
+
+	@property
+	def ticker_found(self) -> bool:
+		return self.__base.ticker_found
+
+def normalize_dates(index: pd.DatetimeIndex) -> pd.DatetimeIndex:
+	'''Provider timestamps as the 16:00 New York close of their day, the dates rows are stored under'''
+	if index.tz is None:
+		index = index.tz_localize('America/New_York')
+	index = index.tz_convert('America/New_York')
+	return (index.normalize() + pd.Timedelta(hours=16)).tz_convert(TIMEZONE)
+
+def resample_ohlc(data: pd.DataFrame, interval: str) -> tuple[pd.DataFrame, pd.DatetimeIndex]:
+	'''
+	Vectorized OHLC resample of data into interval bars, returns the bars and the start of each bar's bucket.
+	Bars are labeled with the date of their last row so they are never visible before they close
+	'''
+	args = interval_to_resample_args(interval)
+	bars = data.resample(**args).agg({col: OHLC_AGGREGATION.get(col, 'last') for col in data.columns})
+	last_dates = data.index.to_series().resample(**args).last()
+	has_rows = last_dates.notna().to_numpy()
+	bars = bars[has_rows]
+	starts = bars.index
+	bars.index = pd.DatetimeIndex(last_dates[has_rows], name=data.index.name)
+	return bars, starts
+
+def update_many(histories: list[AssetHistory], provider: Optional[Provider]=None) -> dict[str, bool]:
+	'''
+	Updates many histories with one batched provider request per interval, histories with no cached data
+	are requested separately since they need the full history
+	'''
+	logger.info(f'update_many() Updating {len(histories)} histories')
+	current_date = dt.datetime.now(TIMEZONE)
+	result = {}
+	groups: dict[tuple[str, bool], list[tuple[AssetHistory, Optional[dt.datetime]]]] = {}
+	for history in histories:
+		if history.is_up_to_date(current_date):
+			result[history.ticker_symbol] = True
+			continue
+		start = history.update_start()
+		groups.setdefault((history.interval, start is None), []).append((history, start))
+
+	for (interval, full_history), members in groups.items():
+		start = None if full_history else min(own_start for _, own_start in members)
+		group_provider = provider if provider else members[0][0].provider
+		data = group_provider.history([history.ticker_symbol for history, _ in members], interval, start, current_date)
+		for history, own_start in members:
+			data_to_add = data.get(history.ticker_symbol, pd.DataFrame())
+			if own_start is not None and not data_to_add.empty:
+				# Raw provider rows are stamped at the start of their day, compared once stored under their close
+				data_to_add = data_to_add[normalize_dates(data_to_add.index) > history.latest_date()]
+			result[history.ticker_symbol] = history.ingest(data_to_add)
+	return result
\ No newline at end of file
@@ -1,70 +1,543 @@
 from abc import ABC, abstractmethod
+from collections import OrderedDict
 import datetime as dt
+import hashlib
+import os
+from os.path import isdir
+import shutil
+import threading
+import weakref
 from typing import Optional
 import numpy as np
 import pandas as pd
 
 from stocktrace.asset import Asset, AssetManager
-from stocktrace.utils import requires_explicit_init, requires_init
+from stocktrace.file import GrowableArray, NPYStore, NPY_EXTENSION
+from stocktrace.utils import index_to_ns, requires_explicit_init, requires_init
 from stocktrace.logger import Logger as logger
+from stocktrace.trading_calendar import TradingCalendar
+
+DEFAULT_CACHE_ENTRIES = 256
 
 class Indicator(ABC):
+    # Number of leading bars an indicator needs before its first value, these bars are skipped
+    warmup: int = 0
+
     def __init__(self, name: Optional[str]=None) -> None:
         self._initialized = False
         self.__name = name
         self.__ticker_symbol = 'Uninitialized'
         self.__data = pd.Series()
+        # Values and int64 dates of the data once bars have been appended to it, data is rebuilt from them on access
+        self.__values: Optional[GrowableArray] = None
+        self.__dates: Optional[GrowableArray] = None
+        self.__index_meta: tuple = (None, None)
+        # Rows of the asset history the data was computed from, its rewrite count and the cache key of that data
+        self.__rows = 0
+        self.__rewrites = 0
+        self.__key: Optional[tuple] = None
+        self.__listener = None
+        self.__listening_to: Optional[Asset] = None
+        self.__inputs: dict[str, 'Indicator'] = {}
+        self.__calendar: Optional[TradingCalendar] = None
+        self.__aligned: Optional[np.ndarray] = None
     
     @abstractmethod
     def compute(self, asset: Asset, time: dt.datetime) -> float:
         '''User defined function to compute indicator value given a certain time, from Asset OHLCV data'''
         pass
 
+    def compute_series(self, asset: Asset) -> Optional[pd.Series]:
+        '''Optional vectorized hook computing every value at once, aligned to asset.data.index. None falls back to compute'''
+        return None
+
+    def compute_range(self, asset: Asset, start: int) -> Optional[np.ndarray]:
+        '''
+        Optional vectorized hook computing the values of rows start onward for incremental updates,
+        it should only read rows from start-warmup. None falls back to compute
+        '''
+        return None
+
+    def dependencies(self) -> dict[str, tuple[str, dict]]:
+        '''Indicators this one is computed from, input name -> (registered indicator name, params), see input()'''
+        return {}
+
+    def input(self, name: str) -> pd.Series:
+        '''Data of the dependency declared as name, evaluated before this indicator is computed'''
+        return self.__inputs[name].data
+
+    def input_values(self, name: str, asset: Asset, start: int=0) -> np.ndarray:
+        '''input() aligned to the rows of asset from start onward, NaN where the dependency has no value'''
+        return self.input(name).reindex(asset.data.index[start:]).to_numpy(dtype=float)
+
+    def online(self) -> Optional['OnlineIndicator']:
+        '''Constant time per bar counterpart of this indicator for live operation, None if there is none'''
+        return None
+
+    @classmethod
+    def compute_batch(cls, asset: Asset, indicators: list['Indicator']) -> Optional[list[np.ndarray]]:
+        '''Optional hook computing the series of several instances of one family in a shared pass. None computes each separately'''
+        return None
+
     def update_data(self, new_ticker: Optional[str]=None) -> None:
+        '''Extends the data with bars appended since it was computed, or recomputes it for a new ticker'''
         assert self._initialized
         logger.info(f'Indicator.update_data() Updating indicator {self.name}, new ticker? = {new_ticker}')
-        if new_ticker:
-            self.__ticker_symbol = new_ticker
-        self._initialized = False
-        self.init(self.__ticker_symbol)
-        self._initialized = True
+        if new_ticker and new_ticker != self.__ticker_symbol:
+            self._initialized = False
+            self.init(new_ticker)
+            self._initialized = True
+            return
+        asset = AssetManager.get(self.__ticker_symbol)
+        rows = asset.csv.row_count
+        key = self.cache_key(asset)
+        if key == self.__key:
+            return
+        # Rows computed before were changed in place, only a full recompute is correct
+        if rows <= self.__rows or self.__rows == 0 or asset.csv.rewrites != self.__rewrites:
+            self.init(self.__ticker_symbol)
+            return
+        for dependency in self.__inputs.values():
+            dependency.update_data()
+        logger.info(f'Indicator.update_data() Computing {rows-self.__rows} new bars of {self.name}')
+        new = self.__compute(asset, self.__rows)
+        if self.__values is None:
+            data = self.data
+            self.__values = GrowableArray(data.to_numpy(dtype=float), dtype=np.float64)
+            self.__dates = GrowableArray(index_to_ns(data.index))
+            reference = data.index if len(data) else new.index
+            self.__index_meta = (getattr(reference, 'tz', None), reference.name)
+        self.__values.extend(new.to_numpy(dtype=float))
+        self.__dates.extend(index_to_ns(new.index))
+        self.__data = None
+        IndicatorCache.extend(self.__key, key, new)
+        self.__key = key
+        self.__rows = rows
+        self.__aligned = None
     
     def init(self, ticker_symbol: str) -> None:
+        self.__init(ticker_symbol)
+
+    def _init_with(self, ticker_symbol: str, series: pd.Series) -> None:
+        '''init() with the series already computed by a shared pass, it is cached but not looked up first'''
+        self.__init(ticker_symbol, series)
+
+    def __init(self, ticker_symbol: str, series: Optional[pd.Series]=None) -> None:
         self._initialized = True
         logger.info(f'Indicator.init() Initializing indicator {self.__name} for {ticker_symbol}...')
         self.__ticker_symbol = ticker_symbol
         asset = AssetManager.get(self.__ticker_symbol)
-        self.__data = pd.Series(np.nan, index=asset.data.index, name=self.__name)
+        dependencies = self.dependencies()
+        self.__inputs = dict(zip(dependencies, IndicatorManager.evaluate(ticker_symbol, list(dependencies.values())))) if dependencies else {}
+        key = self.cache_key(asset)
+        if series is None:
+            series = IndicatorCache.get(key)
+            if series is None:
+                series = self.__compute(asset)
+                IndicatorCache.put(key, series)
+        else:
+            IndicatorCache.put(key, series)
+        self.__data = series.rename(self.__name)
+        self.__values = None
+        self.__dates = None
+        self.__rows = asset.csv.row_count
+        self.__rewrites = asset.csv.rewrites
+        self.__key = key
+        self.__aligned = None
+        self.__subscribe(asset)
+        logger.info(f'Indicator.init() Initialized {self.__name} for {ticker_symbol} with {len(self.__data)} values')
+
+    def align(self, calendar) -> np.ndarray:
+        '''
+        Aligns the data to a TradingCalendar or DatetimeIndex, afterwards self[i] is the value at the last row of the asset
+        at or before bar i, NaN before its first row or where the indicator has no value at that row
+        '''
+        self.__calendar = calendar if isinstance(calendar, TradingCalendar) else TradingCalendar.from_index(calendar)
+        self.__aligned = None
+        return self.aligned
+
+    def cache_key(self, asset: Asset) -> tuple:
+        '''(indicator class, ticker, interval, parameters, history version) identifying the computed series'''
+        cls = type(self)
+        return (f'{cls.__module__}.{cls.__qualname__}', asset.ticker_symbol, asset.interval, tuple(sorted(self.params.items())), asset.history.version)
+
+    def __compute(self, asset: Asset, start: int=0) -> pd.Series:
+        series = self.compute_series(asset) if start == 0 else self.compute_range(asset, start)
+        if series is None:
+            series = self.__compute_loop(asset, start)
+        return self._finalize(asset, series, start)
 
-        for time in asset.data.index:
+    def _finalize(self, asset: Asset, series, start: int=0) -> pd.Series:
+        '''Values of rows start onward as a float Series without the warmup bars'''
+        index = series.index if isinstance(series, pd.Series) else asset.data.index[start:]
+        values = np.array(series, dtype=float)
+        values[:max(0, self.warmup-start)] = np.nan
+        valid = ~np.isnan(values)
+        # Usually only the warmup is missing, slicing it off avoids a masked copy of the index
+        first = int(valid.argmax()) if valid.any() else len(values)
+        if valid[first:].all():
+            return pd.Series(values[first:], index=index[first:])
+        return pd.Series(values[valid], index=index[valid])
+    
+    def __compute_loop(self, asset: Asset, start: int=0) -> pd.Series:
+        data = pd.Series(np.nan, index=asset.data.index[start:], name=self.__name)
+        for time in asset.data.index[max(start, self.warmup):]:
             try:
-                self.__data[time] = self.compute(asset, time)
+                data[time] = self.compute(asset, time)
             except:
                 logger.info(f'Indicator.init() Could not compute {self.__name} at {time}, likely due to warmup lag')
-        
-        self.__data.dropna(inplace=True)
-        logger.info(f'Initialized!:\n{self.__data}')
-    
+        return data
+
+    def __subscribe(self, asset: Asset) -> None:
+        '''Listens for appended bars, holding only a weak reference so the asset doesn't keep the indicator alive'''
+        if self.__listening_to is asset:
+            return
+        self.__unsubscribe()
+        method = weakref.WeakMethod(self._on_append)
+        def listener() -> None:
+            on_append = method()
+            if on_append is None:
+                asset.remove_listener(listener)
+            else:
+                on_append()
+        self.__listener = listener
+        self.__listening_to = asset
+        asset.add_listener(listener)
+
+    def __unsubscribe(self) -> None:
+        if self.__listening_to is not None:
+            self.__listening_to.remove_listener(self.__listener)
+        self.__listener = None
+        self.__listening_to = None
+
+    def __getstate__(self) -> dict:
+        # The listener closure can't be pickled and the aligned array is rebuilt from the data
+        state = self.__dict__.copy()
+        state['_Indicator__listener'] = None
+        state['_Indicator__listening_to'] = None
+        state['_Indicator__aligned'] = None
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        if self._initialized:
+            self.__subscribe(AssetManager.get(self.__ticker_symbol))
+
+    def _on_append(self) -> None:
+        if self._initialized:
+            self.update_data()
+
     @property
     @requires_explicit_init
     def data(self) -> pd.Series:
+        if self.__data is None:
+            tz, name = self.__index_meta
+            index = pd.DatetimeIndex(self.__dates.values.view('datetime64[ns]'), name=name)
+            index = index.tz_localize('UTC').tz_convert(tz) if tz is not None else index
+            self.__data = pd.Series(self.__values.values, index=index, name=self.__name, copy=False)
         return self.__data
 
+    @property
+    def aligned(self) -> np.ndarray:
+        '''Float array of the data at every date of the calendar given to align(), realigned after updates'''
+        if self.__calendar is None:
+            raise RuntimeError(f'Indicator {self.__name} is not aligned to a calendar')
+        if self.__aligned is None:
+            values = self.data.reindex(AssetManager.get(self.__ticker_symbol).data.index).to_numpy(dtype=float)
+            rows = self.__calendar.rows(self.__ticker_symbol)
+            self.__aligned = np.where(rows >= 0, values[np.maximum(rows, 0)], np.nan) if len(values) else np.full(len(rows), np.nan)
+        return self.__aligned
+
+    def __getitem__(self, i: int) -> float:
+        return self.aligned[i]
+
     @property
     def name(self) -> str:
         return self.__name
-    
+
+    @property
+    def ticker_symbol(self) -> str:
+        return self.__ticker_symbol
+
+    @property
+    def inputs(self) -> dict[str, 'Indicator']:
+        '''Evaluated dependencies by input name, see dependencies()'''
+        return self.__inputs
+
+    @property
+    def params(self) -> dict:
+        '''Constructor parameters that change the computed values, indicators taking parameters must return them'''
+        return {}
+
+class OnlineIndicator(ABC):
+    '''
+    Streaming counterpart of an Indicator, fed one bar at a time through push() in constant time
+    with running state instead of re-slicing the asset history
+    '''
+    warmup: int = 0
+
+    def __init__(self) -> None:
+        self.__count = 0
+        self.__value = np.nan
+
+    @abstractmethod
+    def update(self, bar) -> float:
+        '''Folds bar, a mapping of column to value, into the running state and returns the new raw value'''
+        pass
+
+    def push(self, bar) -> Optional[float]:
+        value = self.update(bar)
+        self.__count += 1
+        self.__value = value if self.__count > self.warmup else np.nan
+        return self.value
+
+    def reset(self) -> None:
+        self.__count = 0
+        self.__value = np.nan
+
+    @property
+    def value(self) -> Optional[float]:
+        '''Latest value, None during warmup'''
+        return None if np.isnan(self.__value) else float(self.__value)
+
+    @property
+    def count(self) -> int:
+        return self.__count
+
+def verify_online(indicator: Indicator, online: Optional[OnlineIndicator]=None) -> bool:
+    '''Replays the history of an initialized indicator through its online counterpart, True if every value matches exactly'''
+    online = online if online else indicator.online()
+    if online is None:
+        raise ValueError(f'verify_online() {indicator.name} has no online counterpart')
+    asset = AssetManager.get(indicator.ticker_symbol)
+    online.reset()
+    batch = indicator.data
+    j = 0
+    for time, bar in zip(asset.data.index, asset.data.to_dict('records')):
+        value = online.push(bar)
+        expected = batch.iloc[j] if j < len(batch) and batch.index[j] == time else None
+        if expected is not None:
+            j += 1
+        if value != expected:
+            logger.warning(f'verify_online() {indicator.name} of {indicator.ticker_symbol} differs at {time}: online {value}, batch {expected}')
+            return False
+    return j == len(batch)
+
+class IndicatorCache():
+    '''
+    LRU cache of computed indicator series keyed by Indicator.cache_key, optionally persisted under cache_path
+    so reruns and reopened charts skip recomputation while the underlying history is unchanged
+    '''
+    _initialized = False
+
+    @classmethod
+    def init(cls, max_entries: int=DEFAULT_CACHE_ENTRIES, cache_path: Optional[str]=None) -> None:
+        logger.info(f'IndicatorCache.init() Initializing Indicator Cache with {max_entries} entries, cache path {cache_path}')
+        cls._initialized = True
+        cls.__max_entries = max_entries
+        cls.__cache_path = cache_path
+        cls.__entries = OrderedDict()
+        cls.__lock = threading.Lock()
+        cls.__hits = 0
+        cls.__disk_hits = 0
+        cls.__misses = 0
+        if cache_path:
+            os.makedirs(cache_path, exist_ok=True)
+
+    @classmethod
+    @requires_init
+    def get(cls, key: tuple) -> Optional[pd.Series]:
+        with cls.__lock:
+            series = cls.__entries.get(key)
+            if series is not None:
+                cls.__entries.move_to_end(key)
+                cls.__hits += 1
+                return series
+        series = cls.__read(key)
+        with cls.__lock:
+            if series is None:
+                cls.__misses += 1
+                return None
+            cls.__disk_hits += 1
+            cls.__insert(key, series)
+        return series
+
+    @classmethod
+    @requires_init
+    def put(cls, key: tuple, series: pd.Series) -> None:
+        with cls.__lock:
+            cls.__insert(key, series)
+        cls.__write(key, series)
+
+    @classmethod
+    @requires_init
+    def extend(cls, previous_key: Optional[tuple], key: tuple, part: pd.Series) -> None:
+        '''
+        Moves the disk entry of previous_key to key and appends the rows of part to it as a new segment,
+        so appended bars don't rewrite the whole series. Nothing is written if previous_key has no disk entry
+        '''
+        if not cls.__cache_path or previous_key is None:
+            return
+        previous_path, path = cls.__paths(previous_key)[0], cls.__paths(key)[0]
+        if previous_path == path or not NPYStore(previous_path).exists():
+            return
+        if isdir(path):
+            shutil.rmtree(path)
+        os.rename(previous_path, path)
+        if len(part):
+            NPYStore(path).write(part.to_frame('Value'), append=True)
+
+    @classmethod
+    @requires_init
+    def clear(cls, disk: bool=False) -> None:
+        with cls.__lock:
+            cls.__entries.clear()
+        if disk and cls.__cache_path and isdir(cls.__cache_path):
+            shutil.rmtree(cls.__cache_path)
+            os.makedirs(cls.__cache_path)
+
+    @classmethod
+    @requires_init
+    def get_stats(cls) -> dict:
+        with cls.__lock:
+            return {'hits': cls.__hits, 'disk_hits': cls.__disk_hits, 'misses': cls.__misses, 'entries': len(cls.__entries)}
+
+    @classmethod
+    def __insert(cls, key: tuple, series: pd.Series) -> None:
+        cls.__entries[key] = series
+        cls.__entries.move_to_end(key)
+        while len(cls.__entries) > cls.__max_entries:
+            cls.__entries.popitem(last=False)
+
+    @classmethod
+    def __paths(cls, key: tuple) -> tuple[str, str]:
+        '''Store path of key and the prefix shared by every history version of it'''
+        prefix = hashlib.sha1(repr(key[:-1]).encode()).hexdigest()[:20]
+        return os.path.join(cls.__cache_path, f'{prefix}_{key[-1]}{NPY_EXTENSION}'), prefix + '_'
+
+    @classmethod
+    def __read(cls, key: tuple) -> Optional[pd.Series]:
+        if not cls.__cache_path:
+            return None
+        store = NPYStore(cls.__paths(key)[0])
+        if not store.exists():
+            return None
+        logger.info(f'IndicatorCache.__read() Reading {key} from {store.file_path}')
+        return store.read()['Value']
+
+    @classmethod
+    def __write(cls, key: tuple, series: pd.Series) -> None:
+        if not cls.__cache_path:
+            return
+        path, prefix = cls.__paths(key)
+        # Series computed from older versions of the same history are never read again
+        for entry in os.scandir(cls.__cache_path):
+            if entry.name.startswith(prefix) and entry.path != path:
+                shutil.rmtree(entry.path, ignore_errors=True)
+        NPYStore(path).write(series.to_frame('Value'))
+
 class IndicatorManager():
     _initialized = False
 
     @classmethod
     def init(cls) -> None:
         logger.info('IndicatorManager.init() Initializing Indicator Manager')
+        from stocktrace.technical import import_indicators as import_builtin_indicators
         from stocktrace.custom.custom_indicator import import_indicators
         cls._initialized = True
         cls.__indicators = {}
+        # Dependency nodes shared by every indicator that declares them, alive while a dependent holds them
+        cls.__nodes = weakref.WeakValueDictionary()
+        import_builtin_indicators()
         import_indicators()
+
+    @classmethod
+    @requires_init
+    def evaluate(cls, ticker_symbol: str, requests: list[tuple[str, dict]]) -> list[Indicator]:
+        '''
+        Builds the dependency DAG of the requested (name, params) indicators for ticker_symbol and initializes
+        each distinct node once in topological order. Nodes are shared with every other request while in use
+        '''
+        evaluated = {}
+        order, keys = cls.__topological_order(requests)
+        for indicator, key in order:
+            node = cls.__nodes.get((ticker_symbol, key))
+            if node is None:
+                logger.info(f'IndicatorManager.evaluate() Evaluating {indicator.name} {indicator.params} for {ticker_symbol}')
+                node = indicator
+                node.init(ticker_symbol)
+                cls.__nodes[(ticker_symbol, key)] = node
+            evaluated[key] = node
+        return [evaluated[key] for key in keys]
+
+    @classmethod
+    def __node_key(cls, indicator: Indicator) -> tuple:
+        '''Class and parameters of the indicator as in cache_key, so requests spelling out default parameters share a node'''
+        kind = type(indicator)
+        return (f'{kind.__module__}.{kind.__qualname__}', tuple(sorted(indicator.params.items())))
+
+    @classmethod
+    def __topological_order(cls, requests: list[tuple[str, dict]]) -> tuple[list[tuple[Indicator, tuple]], list[tuple]]:
+        '''Uninitialized nodes of the requests and their transitive dependencies, every dependency before its dependents, and the node key of each request'''
+        order = []
+        done = set()
+        visiting = set()
+        def visit(name: str, params: dict) -> tuple:
+            indicator = cls.get_indicator(name)
+            if indicator is None:
+                raise ValueError(f'IndicatorManager.evaluate() Unknown indicator {name}')
+            indicator = indicator(name=name, **params)
+            key = cls.__node_key(indicator)
+            if key in done:
+                return key
+            if key in visiting:
+                raise ValueError(f'IndicatorManager.evaluate() Dependency cycle through {name} {params}')
+            visiting.add(key)
+            for dependency_name, dependency_params in indicator.dependencies().values():
+                visit(dependency_name, dependency_params)
+            visiting.remove(key)
+            done.add(key)
+            order.append((indicator, key))
+            return key
+        keys = [visit(name, params) for name, params in requests]
+        return order, keys
+
+    @classmethod
+    @requires_init
+    def init_many(cls, name: str, ticker_symbol: str, params_list: list[dict]) -> list[Indicator]:
+        '''
+        Initializes one indicator of family name per parameter set for ticker_symbol,
+        the uncached ones are computed together through Indicator.compute_batch when the family supports it
+        '''
+        indicator = cls.get_indicator(name)
+        indicators = [indicator(name=name, **params) for params in params_list]
+        asset = AssetManager.get(ticker_symbol)
+        missing = [ind for ind in indicators if IndicatorCache.get(ind.cache_key(asset)) is None]
+        computed = {}
+        if len(missing) > 1:
+            batch = indicator.compute_batch(asset, missing)
+            if batch is not None:
+                logger.info(f'IndicatorManager.init_many() Computed {len(missing)} {name} indicators for {ticker_symbol} in one pass')
+                # Handed over directly, a batch larger than the LRU cache would evict its own results before their init
+                computed = {id(ind): ind._finalize(asset, values) for ind, values in zip(missing, batch)}
+        for ind in indicators:
+            series = computed.get(id(ind))
+            if series is None:
+                ind.init(ticker_symbol)
+            else:
+                ind._init_with(ticker_symbol, series)
+        return indicators
     
+    @classmethod
+    @requires_init
+    def compute_many(cls, requests: list[tuple], max_workers: Optional[int]=None, min_parallel: Optional[int]=None) -> list[Indicator]:
+        '''
+        Initializes one indicator per (name, ticker) or (name, ticker, params) request, returned in request order.
+        Uncached ones are computed in a process pool over shared price arrays, see stocktrace.parallel
+        '''
+        from stocktrace.parallel import compute_indicators, DEFAULT_MIN_PARALLEL
+        return compute_indicators(requests, max_workers, DEFAULT_MIN_PARALLEL if min_parallel is None else min_parallel)
+
     @classmethod
     @requires_init
     def add_indicator(cls, name: str, indicator) -> bool:
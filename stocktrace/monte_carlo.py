@@ -0,0 +1,74 @@
+from typing import Optional
+import numpy as np
+import pandas as pd
+
+from stocktrace.logger import Logger as logger
+from stocktrace.trade_system import Trade
+
+DEFAULT_PATHS = 10000
+DEFAULT_PERCENTILES = (5, 25, 50, 75, 95)
+
+def trade_pls(closed_trades: list[Trade]) -> np.ndarray:
+    '''Profit and loss in cents of every closed trade, fees included, in the order they were closed'''
+    trades = sorted(closed_trades, key=lambda trade: trade.exit_time)
+    return np.array([trade.pl() for trade in trades], dtype=np.float64)
+
+def trade_paths(closed_trades: list[Trade], start_cents: int, paths: int=DEFAULT_PATHS, replace: bool=True, seed: Optional[int]=None) -> np.ndarray:
+    '''
+    Equity in cents after each trade for paths resamplings of the closed trades, one row per path starting at start_cents.
+    replace=True draws the trades with replacement, False shuffles their order so only the path to the same final equity changes
+    '''
+    pls = trade_pls(closed_trades)
+    rng = np.random.default_rng(seed)
+    logger.info(f'trade_paths() {"Resampling" if replace else "Shuffling"} {len(pls)} trades into {paths} paths')
+    if replace:
+        sampled = pls[rng.integers(0, len(pls), size=(paths, len(pls)))] if len(pls) else np.empty((paths, 0))
+    else:
+        sampled = rng.permuted(np.broadcast_to(pls, (paths, len(pls))), axis=1)
+    result = np.empty((paths, len(pls)+1), dtype=np.float64)
+    result[:, 0] = start_cents
+    np.cumsum(sampled, axis=1, out=result[:, 1:])
+    result[:, 1:] += start_cents
+    return result
+
+def equity_returns(equity: pd.Series) -> np.ndarray:
+    '''Simple return of every bar of an equity curve'''
+    values = equity.to_numpy(dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = values[1:]/values[:-1]-1
+    return np.where(np.isfinite(returns), returns, 0.0)
+
+def bootstrap_equity(equity: pd.Series, paths: int=DEFAULT_PATHS, block: int=1, seed: Optional[int]=None) -> np.ndarray:
+    '''
+    Equity curves rebuilt from the bar returns of equity drawn with replacement, one row per path starting at its first value.
+    Returns are drawn in blocks of consecutive bars to keep their short range dependence, block=1 draws single bars
+    '''
+    returns = equity_returns(equity)
+    n = len(returns)
+    block = max(1, min(block, n)) if n else 1
+    rng = np.random.default_rng(seed)
+    logger.info(f'bootstrap_equity() Bootstrapping {n} returns into {paths} paths in blocks of {block}')
+    starts = rng.integers(0, n-block+1, size=(paths, -(-n//block))) if n else np.empty((paths, 0), dtype=np.int64)
+    indices = (starts[:, :, None] + np.arange(block)).reshape(paths, -1)[:, :n]
+    result = np.empty((paths, n+1), dtype=np.float64)
+    result[:, 0] = 1.0
+    np.cumprod(1.0+returns[indices], axis=1, out=result[:, 1:])
+    result *= float(equity.iloc[0])
+    return result
+
+def total_returns(paths: np.ndarray) -> np.ndarray:
+    '''Return of every path from its first to its last equity, as a fraction'''
+    return paths[:, -1]/paths[:, 0]-1
+
+def max_drawdowns(paths: np.ndarray) -> np.ndarray:
+    '''Deepest fall of every path below its running peak, as a negative fraction like generate_statistics()'''
+    peaks = np.maximum.accumulate(paths, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        drawdowns = np.where(peaks > 0, (paths-peaks)/peaks, 0.0)
+    return drawdowns.min(axis=1)
+
+def summarize(paths: np.ndarray, percentiles=DEFAULT_PERCENTILES) -> pd.DataFrame:
+    '''Percentiles of the return and max drawdown over every path, in percent as in generate_statistics()'''
+    metrics = {'Return %': total_returns(paths)*100, 'Max Drawdown %': max_drawdowns(paths)*100}
+    return pd.DataFrame({name: np.percentile(values, percentiles) for name, values in metrics.items()},
+                        index=pd.Index(percentiles, name='Percentile')).T
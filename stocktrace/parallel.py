@@ -0,0 +1,151 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing.shared_memory import SharedMemory
+import os
+import time
+from typing import Optional
+import numpy as np
+import pandas as pd
+
+from stocktrace.asset import Asset, AssetManager
+from stocktrace.file import MemoryStore
+from stocktrace.indicator import Indicator, IndicatorCache, IndicatorManager
+from stocktrace.logger import Logger as logger
+from stocktrace.utils import DATA_PATH, index_to_ns
+
+# Uncached indicators below this count are computed in-process, a pool costs more to start than it saves
+DEFAULT_MIN_PARALLEL = 16
+
+class SharedFrame:
+    '''
+    Numeric columns and datetime index of a DataFrame copied once into a shared memory block,
+    workers attach to it through spec and read the prices without copying or pickling them
+    '''
+    def __init__(self, data: pd.DataFrame) -> None:
+        data = data.select_dtypes('number')
+        rows, columns = len(data.index), [str(col) for col in data.columns]
+        self.__shm = SharedMemory(create=True, size=max(1, 8*rows*(len(columns)+1)))
+        np.ndarray((rows,), dtype=np.int64, buffer=self.__shm.buf)[:] = index_to_ns(data.index)
+        np.ndarray((len(columns), rows), dtype=np.float64, buffer=self.__shm.buf, offset=8*rows)[:] = data.to_numpy(dtype=np.float64).T
+        self.__spec = {'name': self.__shm.name, 'rows': rows, 'columns': columns, 'tz': data.index.tz, 'index_name': data.index.name}
+
+    @property
+    def spec(self) -> dict:
+        return self.__spec
+
+    def unlink(self) -> None:
+        self.__shm.close()
+        self.__shm.unlink()
+
+def attach_frame(spec: dict) -> tuple[SharedMemory, pd.DataFrame]:
+    '''DataFrame viewing the block described by a SharedFrame spec, the block must stay open while it is used'''
+    shm = SharedMemory(name=spec['name'])
+    rows, columns = spec['rows'], spec['columns']
+    index = pd.DatetimeIndex(np.ndarray((rows,), dtype='datetime64[ns]', buffer=shm.buf), name=spec['index_name'])
+    if spec['tz'] is not None:
+        index = index.tz_localize('UTC').tz_convert(spec['tz'])
+    values = np.ndarray((len(columns), rows), dtype=np.float64, buffer=shm.buf, offset=8*rows)
+    # A transposed view is stored by pandas as a single block without copying
+    return shm, pd.DataFrame(values.T, index=index, columns=columns, copy=False)
+
+# Worker side state, shared frames attached by this process with the assets built on them
+_attached: dict[str, tuple[SharedMemory, Asset]] = {}
+
+def init_worker() -> None:
+    '''Pool initializer, workers only hold the assets attached to them'''
+    AssetManager.init(auto_save=False, lazy=True)
+    # Only the main process writes the disk cache
+    IndicatorCache.init()
+    _attached.clear()
+
+def attach_asset(spec: dict, ticker_symbol: str, interval: str) -> Asset:
+    '''Registers an Asset over the shared frame of spec in this process, attached once per process'''
+    attached = _attached.get(spec['name'])
+    if attached is None:
+        shm, data = attach_frame(spec)
+        file_path = DATA_PATH + ticker_symbol + interval
+        asset = Asset(ticker_symbol, interval, update=False, store=MemoryStore(file_path, data))
+        AssetManager.register(asset)
+        attached = _attached[spec['name']] = (shm, asset)
+    return attached[1]
+
+def _compute_ticker(spec: dict, ticker_symbol: str, interval: str, requests: list[tuple[str, dict]]) -> list[tuple[tuple, np.ndarray]]:
+    '''Initializes the requests for one ticker, returns (cache key, values aligned to the rows) of every node evaluated'''
+    asset = attach_asset(spec, ticker_symbol, interval)
+    index = asset.data.index
+    results = {}
+    def collect(indicator: Indicator) -> None:
+        key = indicator.cache_key(asset)
+        if key in results:
+            return
+        for dependency in indicator.inputs.values():
+            collect(dependency)
+        results[key] = indicator.data.reindex(index).to_numpy(dtype=float)
+    for name, params in requests:
+        indicator = IndicatorManager.get_indicator(name)(name=name, **params)
+        indicator.init(ticker_symbol)
+        collect(indicator)
+    return list(results.items())
+
+def _aligned_series(values: np.ndarray, index: pd.Index) -> pd.Series:
+    valid = ~np.isnan(values)
+    return pd.Series(values[valid], index=index[valid])
+
+def compute_indicators(requests: list[tuple], max_workers: Optional[int]=None, min_parallel: int=DEFAULT_MIN_PARALLEL) -> list[Indicator]:
+    '''
+    Initializes one indicator per (name, ticker) or (name, ticker, params) request and returns them in request order.
+    Uncached indicators are grouped by ticker and computed on a pool of max_workers processes (default one per core)
+    reading the prices from shared memory, the results are handed to each indicator and stored in IndicatorCache.
+    Batches smaller than min_parallel or a single worker are computed in-process
+    '''
+    requests = [(request[0], request[1], dict(request[2]) if len(request) > 2 and request[2] else {}) for request in requests]
+    indicators = []
+    for name, ticker_symbol, params in requests:
+        indicator = IndicatorManager.get_indicator(name)
+        if indicator is None:
+            raise ValueError(f'compute_indicators() Unknown indicator {name}')
+        indicators.append(indicator(name=name, **params))
+    assets = {ticker_symbol: AssetManager.get(ticker_symbol) for ticker_symbol in dict.fromkeys(request[1] for request in requests)}
+    missing = [ticker_symbol for ticker_symbol, asset in assets.items() if asset is None]
+    if missing:
+        raise ValueError(f'compute_indicators() Unknown tickers {missing}')
+    pending: dict[str, list[int]] = {}
+    for i, (indicator, (name, ticker_symbol, params)) in enumerate(zip(indicators, requests)):
+        if IndicatorCache.get(indicator.cache_key(assets[ticker_symbol])) is None:
+            pending.setdefault(ticker_symbol, []).append(i)
+    count = sum(len(positions) for positions in pending.values())
+    max_workers = min(max_workers or os.cpu_count() or 1, len(pending))
+    initialized = set()
+    start = time.perf_counter()
+    if count >= min_parallel and max_workers > 1:
+        logger.info(f'compute_indicators() Computing {count} indicators for {len(pending)} tickers on {max_workers} processes')
+        with AssetManager.pinning():
+            frames = {ticker_symbol: SharedFrame(AssetManager.get(ticker_symbol).data) for ticker_symbol in pending}
+            try:
+                with ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker) as pool:
+                    futures = {}
+                    for ticker_symbol, positions in pending.items():
+                        asset = assets[ticker_symbol]
+                        tasks = [(requests[i][0], requests[i][2]) for i in positions]
+                        futures[pool.submit(_compute_ticker, frames[ticker_symbol].spec, ticker_symbol, asset.interval, tasks)] = ticker_symbol
+                    for future in as_completed(futures):
+                        ticker_symbol = futures[future]
+                        asset = assets[ticker_symbol]
+                        computed = {key: _aligned_series(values, asset.data.index) for key, values in future.result()}
+                        # Handed over directly, results larger than the LRU cache would evict each other before their init
+                        for i in pending[ticker_symbol]:
+                            series = computed.get(indicators[i].cache_key(asset))
+                            if series is None:
+                                indicators[i].init(ticker_symbol)
+                            else:
+                                indicators[i]._init_with(ticker_symbol, series)
+                            initialized.add(i)
+            finally:
+                for frame in frames.values():
+                    frame.unlink()
+    elif count:
+        logger.info(f'compute_indicators() Computing {count} indicators in-process')
+    for i, (indicator, (name, ticker_symbol, params)) in enumerate(zip(indicators, requests)):
+        if i not in initialized:
+            indicator.init(ticker_symbol)
+    logger.info(f'compute_indicators() Initialized {len(indicators)} indicators in {time.perf_counter() - start:.2f}s')
+    return indicators
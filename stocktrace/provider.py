@@ -0,0 +1,103 @@
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+import datetime as dt
+import os
+import time
+from typing import Optional
+import pandas as pd
+import yfinance as yf
+
+from stocktrace.file import make_store
+from stocktrace.logger import Logger as logger
+from stocktrace.utils import DATA_FORMAT
+
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_MAX_WORKERS = 4
+
+class Provider(ABC):
+    '''
+    A Provider downloads raw OHLC history for many tickers in as few requests as possible,
+    splitting them into batches that are fetched on a bounded thread pool
+    '''
+    def __init__(self, batch_size: int=DEFAULT_BATCH_SIZE, max_workers: int=DEFAULT_MAX_WORKERS) -> None:
+        self.__batch_size = batch_size
+        self.__max_workers = max_workers
+
+    @abstractmethod
+    def fetch(self, tickers: list[str], interval: str, start: Optional[dt.datetime], end: Optional[dt.datetime]) -> dict[str, pd.DataFrame]:
+        '''Fetches a single batch, start=None requests the full history'''
+        pass
+
+    def history(self,
+                tickers: list[str],
+                interval: str='1d',
+                start: Optional[dt.datetime]=None,
+                end: Optional[dt.datetime]=None) -> dict[str, pd.DataFrame]:
+        tickers = list(dict.fromkeys(tickers))
+        batches = [tickers[i:i+self.batch_size] for i in range(0, len(tickers), self.batch_size)]
+        logger.info(f'Provider.history() fetching {len(tickers)} tickers in {len(batches)} batches with {self}')
+        if len(batches) <= 1:
+            return self.fetch(tickers, interval, start, end) if batches else {}
+        result = {}
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches))) as pool:
+            for batch_result in pool.map(lambda batch: self.fetch(batch, interval, start, end), batches):
+                result.update(batch_result)
+        return result
+
+    @property
+    def batch_size(self) -> int:
+        return self.__batch_size
+
+    @property
+    def max_workers(self) -> int:
+        return self.__max_workers
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}(batch_size={self.batch_size}, max_workers={self.max_workers})'
+
+class YFinanceProvider(Provider):
+    def fetch(self, tickers: list[str], interval: str, start: Optional[dt.datetime], end: Optional[dt.datetime]) -> dict[str, pd.DataFrame]:
+        period = {'period': 'max'} if start is None else {'start': start, 'end': end}
+        if len(tickers) == 1:
+            return {tickers[0]: yf.Ticker(tickers[0]).history(interval=interval, **period)}
+        data = yf.download(tickers, interval=interval, group_by='ticker', auto_adjust=True, actions=False,
+                           ignore_tz=False, threads=False, progress=False, **period)
+        result = {}
+        for ticker in tickers:
+            if isinstance(data.columns, pd.MultiIndex):
+                if ticker not in data.columns.get_level_values(0):
+                    continue
+                frame = data[ticker]
+            else:
+                frame = data
+            # yf.download aligns every ticker to the same dates, drop the ones a ticker didn't trade on
+            result[ticker] = frame.dropna(how='all')
+        return result
+
+class FileProvider(Provider):
+    '''
+    Offline stand-in that serves history from files in data_path, named like the asset files,
+    latency seconds are slept per batch to simulate a network round trip when benchmarking
+    '''
+    def __init__(self, data_path: str, latency: float=0.0, data_format: str=DATA_FORMAT, batch_size: int=DEFAULT_BATCH_SIZE, max_workers: int=DEFAULT_MAX_WORKERS) -> None:
+        super().__init__(batch_size, max_workers)
+        self.__data_path = data_path
+        self.__latency = latency
+        self.__data_format = data_format
+
+    def fetch(self, tickers: list[str], interval: str, start: Optional[dt.datetime], end: Optional[dt.datetime]) -> dict[str, pd.DataFrame]:
+        if self.__latency:
+            time.sleep(self.__latency)
+        result = {}
+        for ticker in tickers:
+            store = make_store(os.path.join(self.__data_path, ticker + interval + '.' + self.__data_format))
+            if not store.exists():
+                logger.warning(f'FileProvider.fetch() no file for {ticker} in {self.__data_path}')
+                continue
+            data = store.read(parse_dates=True)
+            if start is not None:
+                data = data[data.index >= start]
+            if end is not None:
+                data = data[data.index <= end]
+            result[ticker] = data
+        return result
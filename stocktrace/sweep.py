@@ -0,0 +1,131 @@
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+import datetime as dt
+import itertools
+import os
+import time
+from typing import Optional
+import pandas as pd
+
+from stocktrace.asset import AssetManager
+from stocktrace.backtest import Backtest
+from stocktrace.logger import Logger as logger
+from stocktrace.parallel import SharedFrame, attach_asset, init_worker
+from stocktrace.statistics import generate_statistics
+from stocktrace.trade_system import Broker
+from stocktrace.trading_calendar import TradingCalendar
+from stocktrace.utils import TIMEZONE
+
+# Parameter sets below this count run in-process, a pool costs more to start than it saves
+DEFAULT_MIN_PARALLEL = 4
+
+def _init_sweep_worker(frames: dict[str, tuple[dict, str]]) -> None:
+    init_worker()
+    for ticker_symbol, (spec, interval) in frames.items():
+        attach_asset(spec, ticker_symbol, interval)
+
+@contextmanager
+def shared_asset_pool(tickers: list[str], max_workers: int):
+    '''ProcessPoolExecutor whose workers attach the assets of tickers from shared memory instead of loading them'''
+    with AssetManager.pinning():
+        assets = {ticker_symbol: AssetManager.get(ticker_symbol) for ticker_symbol in tickers}
+        frames = {ticker_symbol: SharedFrame(asset.data) for ticker_symbol, asset in assets.items()}
+        try:
+            specs = {ticker_symbol: (frames[ticker_symbol].spec, assets[ticker_symbol].interval) for ticker_symbol in tickers}
+            logger.info(f'shared_asset_pool() Sharing {len(specs)} assets with {max_workers} processes')
+            with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_sweep_worker, initargs=(specs,)) as pool:
+                yield pool
+        finally:
+            for frame in frames.values():
+                frame.unlink()
+
+def _run_backtest(algorithm, params: dict, broker_settings: dict, start_date: dt.datetime, end_date: Optional[dt.datetime], alpha_ticker: str,
+                  calendar: Optional[TradingCalendar]=None, benchmark: str='^GSPC') -> pd.Series:
+    '''Runs one parameter set and returns its statistics'''
+    backtest = Backtest(algorithm, Broker(**broker_settings), start_date, end_date, params, calendar, benchmark)
+    backtest.run()
+    stats = generate_statistics(backtest.broker.closed_trades, backtest.equity, backtest.algorithm, backtest.start_date, backtest.end_date, alpha_ticker)
+    # The Algorithm instance holds its indicators, only its name is sent back
+    stats.loc['Algorithm'] = repr(backtest.algorithm)
+    return stats
+
+class Sweep:
+    '''
+    Runs a Backtest of algorithm for every combination of the parameter grid, on a pool of max_workers processes.
+    The first combination runs in-process to load the assets it uses, their prices are then shared with the
+    workers through shared memory so no worker reads them from disk. results holds the generate_statistics()
+    output of every parameter set, one row each. Every backtest steps through calendar, or the bars of benchmark
+    '''
+    def __init__(self,
+                 algorithm,
+                 grid: dict[str, list],
+                 broker_settings: dict,
+                 start_date: Optional[dt.datetime]=dt.datetime.min.replace(tzinfo=TIMEZONE),
+                 end_date: Optional[dt.datetime]=None,
+                 alpha_ticker: Optional[str]=None,
+                 tickers: Optional[list[str]]=None,
+                 max_workers: Optional[int]=None,
+                 min_parallel: int=DEFAULT_MIN_PARALLEL,
+                 calendar: Optional[TradingCalendar]=None,
+                 benchmark: str='^GSPC') -> None:
+        '''tickers shared with the workers, default every asset loaded after the first run. alpha_ticker defaults to benchmark'''
+        logger.debug(f'Sweep.__init__ Creating Sweep of {algorithm.__name__} over {grid}')
+        if not grid:
+            raise ValueError('Sweep() grid needs at least one parameter, run a single Backtest for the default parameters')
+        self.__algorithm = algorithm
+        self.__grid = grid
+        self.__broker_settings = broker_settings
+        self.__start_date = start_date
+        self.__end_date = end_date
+        self.__alpha_ticker = alpha_ticker if alpha_ticker else benchmark
+        self.__calendar = calendar
+        self.__benchmark = benchmark
+        self.__tickers = tickers
+        self.__max_workers = max_workers if max_workers else os.cpu_count() or 1
+        self.__min_parallel = min_parallel
+        self.__completed = False
+        self.__results = pd.DataFrame()
+        self.__elapsed = 0.0
+
+    def run(self) -> None:
+        combinations = [dict(zip(self.__grid, values)) for values in itertools.product(*self.__grid.values())]
+        logger.info(f'Sweep.run() Running {len(combinations)} backtests of {self.__algorithm.__name__}')
+        start = time.perf_counter()
+        args = (self.__broker_settings, self.__start_date, self.__end_date, self.__alpha_ticker, self.__calendar, self.__benchmark)
+        results = [_run_backtest(self.__algorithm, combinations[0], *args)] if combinations else []
+        rest = combinations[1:]
+        if len(rest) >= self.__min_parallel and self.__max_workers > 1:
+            tickers = self.__tickers if self.__tickers else list(AssetManager.get_assets())
+            with shared_asset_pool(tickers, self.__max_workers) as pool:
+                futures = [pool.submit(_run_backtest, self.__algorithm, params, *args) for params in rest]
+                results.extend(future.result() for future in futures)
+        else:
+            results.extend(_run_backtest(self.__algorithm, params, *args) for params in rest)
+        self.__elapsed = time.perf_counter() - start
+        index = pd.MultiIndex.from_tuples([tuple(params.values()) for params in combinations], names=list(self.__grid))
+        self.__results = pd.DataFrame(results, index=index)
+        self.__completed = True
+        logger.info(f'Sweep.run() Ran {len(combinations)} backtests in {self.__elapsed:.2f}s, {self.throughput:.2f} backtests per second')
+
+    @property
+    def results(self) -> pd.DataFrame:
+        if not self.__completed:
+            raise RuntimeError('Sweep has not been completed yet')
+        return self.__results
+
+    @property
+    def elapsed(self) -> float:
+        '''Wall time of run() in seconds'''
+        return self.__elapsed
+
+    @property
+    def throughput(self) -> float:
+        '''Backtests per second of the last run()'''
+        return len(self.__results.index)/self.__elapsed if self.__elapsed else 0.0
+
+    @property
+    def completed(self) -> bool:
+        return self.__completed
+
+    def __repr__(self) -> str:
+        return f'Sweep({self.__algorithm.__name__}, {self.__grid})'
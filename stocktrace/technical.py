@@ -0,0 +1,395 @@
+from abc import abstractmethod
+import datetime as dt
+from typing import Optional
+import numpy as np
+import pandas as pd
+
+from stocktrace.asset import Asset
+from stocktrace.file import GrowableArray
+from stocktrace.indicator import Indicator, IndicatorManager, OnlineIndicator
+from stocktrace.logger import Logger as logger
+
+def moving_average(prefix: np.ndarray, window: int, start: int=0) -> np.ndarray:
+    '''
+    Mean of the window rows ending at each row from start onward, from the running prefix sums of the values.
+    NaN before the first full window
+    '''
+    n = len(prefix)
+    result = np.full(max(0, n-start), np.nan)
+    first = max(start, window-1)
+    if first >= n:
+        return result
+    upper = prefix[first:]
+    lower = prefix[first-window:n-window] if first >= window else np.concatenate(([0.0], prefix[:n-window]))
+    result[first-start:] = (upper-lower)/window
+    return result
+
+def crossings(difference: np.ndarray) -> np.ndarray:
+    '''1 where difference turns positive, -1 where it turns negative, 0 otherwise, NaN without a previous value'''
+    previous = np.concatenate(([np.nan], difference[:-1]))
+    result = np.where((difference > 0) & (previous <= 0), 1.0, np.where((difference < 0) & (previous >= 0), -1.0, 0.0))
+    result[np.isnan(difference) | np.isnan(previous)] = np.nan
+    return result
+
+class SMA(Indicator):
+    '''
+    Simple moving average of col over window bars. Every SMA is a difference of running prefix sums,
+    so a batch of windows shares one cumulative sum and appended bars only extend it.
+    The values equal the mean of each window slice within floating-point error, not bit for bit
+    '''
+    def __init__(self, name: Optional[str]=None, window: int=20, col: str='Close') -> None:
+        super().__init__(name)
+        self.__window = window
+        self.__col = col
+        self.warmup = window-1
+        self.__prefix = GrowableArray(dtype=np.float64)
+        self.__prefix_asset: Optional[Asset] = None
+        self.__prefix_rewrites = 0
+
+    @classmethod
+    def compute_batch(cls, asset: Asset, indicators: list['SMA']) -> list[np.ndarray]:
+        prefixes = {}
+        result = []
+        for sma in indicators:
+            if sma.col not in prefixes:
+                prefixes[sma.col] = np.cumsum(asset.data[sma.col].to_numpy(dtype=np.float64))
+            result.append(moving_average(prefixes[sma.col], sma.window))
+        return result
+
+    def online(self) -> 'OnlineSMA':
+        return OnlineSMA(self.__window, self.__col)
+
+    def compute(self, asset: Asset, time: dt.datetime) -> float:
+        i = asset.prev_or_equal_index(time)
+        if i < self.warmup:
+            return np.nan
+        return moving_average(self.__prefix_sums(asset)[:i+1], self.__window, i)[0]
+
+    def compute_series(self, asset: Asset) -> np.ndarray:
+        return moving_average(self.__prefix_sums(asset), self.__window)
+
+    def compute_range(self, asset: Asset, start: int) -> np.ndarray:
+        return moving_average(self.__prefix_sums(asset), self.__window, start)
+
+    def __prefix_sums(self, asset: Asset) -> np.ndarray:
+        '''Running sums of col, only the rows appended since the last call are added'''
+        values = asset.data[self.__col].to_numpy(dtype=np.float64)
+        if asset is not self.__prefix_asset or len(self.__prefix) > len(values) or asset.csv.rewrites != self.__prefix_rewrites:
+            self.__prefix = GrowableArray(dtype=np.float64)
+            self.__prefix_asset = asset
+            self.__prefix_rewrites = asset.csv.rewrites
+        n = len(self.__prefix)
+        if n < len(values):
+            # cumsum adds strictly left to right, so continuing from the last sum matches a full cumsum exactly
+            last = self.__prefix.values[-1] if n else 0.0
+            self.__prefix.extend(np.cumsum(np.concatenate(([last], values[n:])))[1:])
+        return self.__prefix.values
+
+    @property
+    def window(self) -> int:
+        return self.__window
+
+    @property
+    def col(self) -> str:
+        return self.__col
+
+    @property
+    def params(self) -> dict:
+        return {'window': self.__window, 'col': self.__col}
+
+class OnlineSMA(OnlineIndicator):
+    '''
+    SMA updated in constant time per bar from a ring buffer of the last window+1 running sums,
+    the same arithmetic as the batch SMA so both give identical values
+    '''
+    def __init__(self, window: int=20, col: str='Close') -> None:
+        super().__init__()
+        self.__window = window
+        self.__col = col
+        self.warmup = window-1
+        self.reset()
+
+    def update(self, bar) -> float:
+        self.__total += float(bar[self.__col])
+        self.__prefix[self.__count % (self.__window+1)] = self.__total
+        lower = self.__prefix[(self.__count-self.__window) % (self.__window+1)] if self.__count >= self.__window else 0.0
+        self.__count += 1
+        return (self.__total-lower)/self.__window
+
+    def reset(self) -> None:
+        super().reset()
+        self.__prefix = np.zeros(self.__window+1)
+        self.__total = 0.0
+        self.__count = 0
+
+class CROSSOVER(Indicator):
+    '''
+    1 on the bar the fast SMA crosses above the slow SMA, -1 on the bar it crosses below, 0 otherwise.
+    Computed from the shared SMA nodes it depends on
+    '''
+    def __init__(self, name: Optional[str]=None, fast: int=10, slow: int=20) -> None:
+        super().__init__(name)
+        self.__fast = fast
+        self.__slow = slow
+        self.warmup = max(fast, slow)
+
+    def dependencies(self) -> dict[str, tuple[str, dict]]:
+        return {'fast': ('SMA', {'window': self.__fast}), 'slow': ('SMA', {'window': self.__slow})}
+
+    def compute(self, asset: Asset, time: dt.datetime) -> float:
+        i = asset.prev_or_equal_index(time)
+        if i < 1:
+            return np.nan
+        dates = asset.data.index[i-1:i+1]
+        return crossings((self.input('fast').reindex(dates) - self.input('slow').reindex(dates)).to_numpy())[-1]
+
+    def compute_series(self, asset: Asset) -> np.ndarray:
+        return self.compute_range(asset, 0)
+
+    def compute_range(self, asset: Asset, start: int) -> np.ndarray:
+        offset = min(start, 1)
+        return crossings(self.input_values('fast', asset, start-offset) - self.input_values('slow', asset, start-offset))[offset:]
+
+    @property
+    def params(self) -> dict:
+        return {'fast': self.__fast, 'slow': self.__slow}
+
+def ema(values: np.ndarray, alpha: float) -> np.ndarray:
+    '''Exponential moving average seeded with the first non-NaN value, NaN before it'''
+    return pd.Series(values, dtype=float).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+
+def sliding(values: np.ndarray, window: int, reduce) -> np.ndarray:
+    '''reduce(windows) over every window of rows ending at each row, NaN before the first full window'''
+    result = np.full(len(values), np.nan)
+    if len(values) >= window:
+        result[window-1:] = reduce(np.lib.stride_tricks.sliding_window_view(values, window))
+    return result
+
+class VectorIndicator(Indicator):
+    '''
+    Base of the vectorized built-ins, compute_values computes every row of a frame of bars in one pass.
+    lookback is how many earlier rows a value depends on, None for recursive filters that depend on the whole history
+    '''
+    lookback: Optional[int] = 0
+
+    def __init__(self, name: Optional[str]=None, window: int=20, col: str='Close') -> None:
+        super().__init__(name)
+        self.__window = window
+        self.__col = col
+        self.warmup = window-1
+
+    @abstractmethod
+    def compute_values(self, data: pd.DataFrame) -> np.ndarray:
+        pass
+
+    def compute(self, asset: Asset, time: dt.datetime) -> float:
+        i = asset.prev_or_equal_index(time)
+        if i < self.warmup:
+            return np.nan
+        first = 0 if self.lookback is None else max(0, i-self.lookback)
+        return self.compute_values(asset.data.iloc[first:i+1])[-1]
+
+    def compute_series(self, asset: Asset) -> np.ndarray:
+        return self.compute_values(asset.data)
+
+    def compute_range(self, asset: Asset, start: int) -> np.ndarray:
+        offset = start if self.lookback is None else min(start, self.lookback)
+        return self.compute_values(asset.data.iloc[start-offset:])[offset:]
+
+    @property
+    def window(self) -> int:
+        return self.__window
+
+    @property
+    def col(self) -> str:
+        return self.__col
+
+    @property
+    def params(self) -> dict:
+        return {'window': self.__window, 'col': self.__col}
+
+class EMA(VectorIndicator):
+    '''Exponential moving average with span window'''
+    lookback = None
+
+    def compute_values(self, data: pd.DataFrame) -> np.ndarray:
+        return ema(data[self.col].to_numpy(dtype=float), 2/(self.window+1))
+
+class WMA(VectorIndicator):
+    '''Linearly weighted moving average, the latest bar weighted window and the oldest 1'''
+    def __init__(self, name: Optional[str]=None, window: int=20, col: str='Close') -> None:
+        super().__init__(name, window, col)
+        self.lookback = window-1
+        self.__weights = np.arange(1, window+1, dtype=float)/(window*(window+1)/2)
+
+    def compute_values(self, data: pd.DataFrame) -> np.ndarray:
+        return sliding(data[self.col].to_numpy(dtype=float), self.window, lambda windows: windows @ self.__weights)
+
+class STDEV(VectorIndicator):
+    '''Rolling standard deviation over window bars, population (ddof=0) by default'''
+    def __init__(self, name: Optional[str]=None, window: int=20, col: str='Close', ddof: int=0) -> None:
+        super().__init__(name, window, col)
+        self.lookback = window-1
+        self.__ddof = ddof
+
+    def compute_values(self, data: pd.DataFrame) -> np.ndarray:
+        return sliding(data[self.col].to_numpy(dtype=float), self.window, lambda windows: windows.std(axis=1, ddof=self.__ddof))
+
+    @property
+    def params(self) -> dict:
+        return {**super().params, 'ddof': self.__ddof}
+
+class ROLLING_MIN(VectorIndicator):
+    def __init__(self, name: Optional[str]=None, window: int=20, col: str='Low') -> None:
+        super().__init__(name, window, col)
+        self.lookback = window-1
+
+    def compute_values(self, data: pd.DataFrame) -> np.ndarray:
+        return sliding(data[self.col].to_numpy(dtype=float), self.window, lambda windows: windows.min(axis=1))
+
+class ROLLING_MAX(VectorIndicator):
+    def __init__(self, name: Optional[str]=None, window: int=20, col: str='High') -> None:
+        super().__init__(name, window, col)
+        self.lookback = window-1
+
+    def compute_values(self, data: pd.DataFrame) -> np.ndarray:
+        return sliding(data[self.col].to_numpy(dtype=float), self.window, lambda windows: windows.max(axis=1))
+
+class RSI(VectorIndicator):
+    '''Wilder's relative strength index of col over window bars, between 0 and 100'''
+    lookback = None
+
+    def __init__(self, name: Optional[str]=None, window: int=14, col: str='Close') -> None:
+        super().__init__(name, window, col)
+        self.warmup = window
+
+    def compute_values(self, data: pd.DataFrame) -> np.ndarray:
+        change = np.diff(data[self.col].to_numpy(dtype=float), prepend=np.nan)
+        gain = ema(np.where(np.isnan(change), np.nan, np.maximum(change, 0)), 1/self.window)
+        loss = ema(np.where(np.isnan(change), np.nan, np.maximum(-change, 0)), 1/self.window)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(loss == 0, 100.0, 100-100/(1+gain/loss))
+
+class ATR(VectorIndicator):
+    '''Average true range over window bars with Wilder smoothing'''
+    lookback = None
+
+    def __init__(self, name: Optional[str]=None, window: int=14) -> None:
+        super().__init__(name, window, 'Close')
+
+    def compute_values(self, data: pd.DataFrame) -> np.ndarray:
+        high = data['High'].to_numpy(dtype=float)
+        low = data['Low'].to_numpy(dtype=float)
+        prev_close = np.concatenate(([np.nan], data['Close'].to_numpy(dtype=float)[:-1]))
+        true_range = np.fmax(high-low, np.fmax(np.abs(high-prev_close), np.abs(low-prev_close)))
+        return ema(true_range, 1/self.window)
+
+    @property
+    def params(self) -> dict:
+        return {'window': self.window}
+
+class VWAP(VectorIndicator):
+    '''Volume weighted average of the typical price (High+Low+Close)/3 over window bars, needs a Volume column'''
+    def __init__(self, name: Optional[str]=None, window: int=20) -> None:
+        super().__init__(name, window, 'Close')
+        self.lookback = window-1
+
+    def compute_values(self, data: pd.DataFrame) -> np.ndarray:
+        if 'Volume' not in data.columns:
+            logger.warning(f'VWAP.compute_values() {self.name} needs a Volume column, which this history does not have')
+            return np.full(len(data.index), np.nan)
+        typical = (data['High'].to_numpy(dtype=float)+data['Low'].to_numpy(dtype=float)+data['Close'].to_numpy(dtype=float))/3
+        volume = data['Volume'].to_numpy(dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return sliding(typical*volume, self.window, lambda windows: windows.sum(axis=1))/sliding(volume, self.window, lambda windows: windows.sum(axis=1))
+
+    @property
+    def params(self) -> dict:
+        return {'window': self.window}
+
+class MACD(Indicator):
+    '''
+    line='macd' is EMA(fast)-EMA(slow), 'signal' the EMA(signal) of it and 'histogram' their difference,
+    each line is a node of the dependency graph so they share their EMAs
+    '''
+    def __init__(self, name: Optional[str]=None, fast: int=12, slow: int=26, signal: int=9, line: str='macd') -> None:
+        super().__init__(name)
+        if line not in ('macd', 'signal', 'histogram'):
+            raise ValueError(f'MACD line must be macd, signal or histogram, got {line}')
+        self.__fast = fast
+        self.__slow = slow
+        self.__signal = signal
+        self.__line = line
+        self.warmup = max(fast, slow)-1 + (0 if line == 'macd' else signal-1)
+
+    def dependencies(self) -> dict[str, tuple[str, dict]]:
+        if self.__line == 'macd':
+            return {'fast': ('EMA', {'window': self.__fast}), 'slow': ('EMA', {'window': self.__slow})}
+        macd = {'fast': self.__fast, 'slow': self.__slow, 'signal': self.__signal}
+        if self.__line == 'signal':
+            return {'macd': ('MACD', {**macd, 'line': 'macd'})}
+        return {'macd': ('MACD', {**macd, 'line': 'macd'}), 'signal': ('MACD', {**macd, 'line': 'signal'})}
+
+    def compute(self, asset: Asset, time: dt.datetime) -> float:
+        i = asset.prev_or_equal_index(time)
+        return self.compute_range(asset, i)[0] if i >= 0 else np.nan
+
+    def compute_series(self, asset: Asset) -> np.ndarray:
+        return self.compute_range(asset, 0)
+
+    def compute_range(self, asset: Asset, start: int) -> np.ndarray:
+        if self.__line == 'macd':
+            return self.input_values('fast', asset, start) - self.input_values('slow', asset, start)
+        if self.__line == 'signal':
+            # Recursive, the whole macd line is filtered again
+            return ema(self.input_values('macd', asset), 2/(self.__signal+1))[start:]
+        return self.input_values('macd', asset, start) - self.input_values('signal', asset, start)
+
+    @property
+    def params(self) -> dict:
+        return {'fast': self.__fast, 'slow': self.__slow, 'signal': self.__signal, 'line': self.__line}
+
+class BOLLINGER(Indicator):
+    '''band='upper' or 'lower' is SMA(window) plus or minus k STDEV(window), 'middle' the SMA itself'''
+    def __init__(self, name: Optional[str]=None, window: int=20, k: float=2.0, band: str='upper') -> None:
+        super().__init__(name)
+        if band not in ('upper', 'middle', 'lower'):
+            raise ValueError(f'BOLLINGER band must be upper, middle or lower, got {band}')
+        self.__window = window
+        self.__k = k
+        self.__band = band
+        self.warmup = window-1
+
+    def dependencies(self) -> dict[str, tuple[str, dict]]:
+        return {'middle': ('SMA', {'window': self.__window}), 'deviation': ('STDEV', {'window': self.__window})}
+
+    def compute(self, asset: Asset, time: dt.datetime) -> float:
+        i = asset.prev_or_equal_index(time)
+        return self.compute_range(asset, i)[0] if i >= 0 else np.nan
+
+    def compute_series(self, asset: Asset) -> np.ndarray:
+        return self.compute_range(asset, 0)
+
+    def compute_range(self, asset: Asset, start: int) -> np.ndarray:
+        middle = self.input_values('middle', asset, start)
+        sign = {'upper': 1, 'middle': 0, 'lower': -1}[self.__band]
+        return middle + sign*self.__k*self.input_values('deviation', asset, start)
+
+    @property
+    def params(self) -> dict:
+        return {'window': self.__window, 'k': self.__k, 'band': self.__band}
+
+def import_indicators() -> None:
+    logger.info('technical.import_indicators() Importing built-in indicators...')
+    IndicatorManager.add_indicator('SMA', SMA)
+    IndicatorManager.add_indicator('CROSSOVER', CROSSOVER)
+    IndicatorManager.add_indicator('EMA', EMA)
+    IndicatorManager.add_indicator('WMA', WMA)
+    IndicatorManager.add_indicator('STDEV', STDEV)
+    IndicatorManager.add_indicator('ROLLING_MIN', ROLLING_MIN)
+    IndicatorManager.add_indicator('ROLLING_MAX', ROLLING_MAX)
+    IndicatorManager.add_indicator('RSI', RSI)
+    IndicatorManager.add_indicator('ATR', ATR)
+    IndicatorManager.add_indicator('VWAP', VWAP)
+    IndicatorManager.add_indicator('MACD', MACD)
+    IndicatorManager.add_indicator('BOLLINGER', BOLLINGER)
@@ -2,11 +2,16 @@ import datetime as dt
 from math import ceil, copysign, floor
 import sys
 from typing import Optional
+import numpy as np
 
 from stocktrace.asset import AssetManager
 from stocktrace.logger import Logger as logger
+from stocktrace.trading_calendar import TradingCalendar
 from stocktrace.utils import TIMEZONE
 
+SEC_FEE = 0.0000278
+FINRA_FEE = 0.000166
+
 class ORDER_TYPE:
     MARKET = 0
     LIMIT = 1
@@ -103,6 +108,7 @@ class Broker:
         self.__cash = start_cash_cents
         self.__trade_on_close = trade_on_close
         self.__spread = spread
+        self.__calendar: Optional[TradingCalendar] = None
     
     def place_order(self, order: Order) -> None:
         if order.shares == 0:
@@ -114,10 +120,14 @@ class Broker:
     def cancel_order(self, order: Order) -> None:
         order.cancel()
     
-    def process_orders(self, time: Optional[dt.datetime]=None) -> None:
+    def process_orders(self, time: Optional[dt.datetime]=None, bar: Optional[int]=None) -> None:
+        '''With a bar of calendar, orders for assets without a row of their own at that bar stay pending until one'''
         logger.info(f'Broker.process_orders() Processing {len(self.__orders)} orders at {time=}')
         for i,order in enumerate(list(self.__orders)):
             assert order.time_placed <= time, 'Order cannot be processed before it was placed'
+            if bar is not None and not self.__calendar.has_row(order.ticker_symbol, bar):
+                logger.info(f'Broker.process_orders() No {order.ticker_symbol} bar at {time}, order #{i} stays pending')
+                continue
             logger.info(f'Broker.process_orders() Propagating order #{i}...')
             position = self.__positions.get(order.ticker_symbol)
             if position is None:
@@ -127,10 +137,12 @@ class Broker:
     
     def get_fee(self, shares: int, total_cents: int) -> int:
         logger.info(f'Broker.get_fee() Getting fee for {shares=} shares and {total_cents=} total cents ...')
-        SEC = 0.0000278
-        FINRA = 0.000166
-        logger.info(f'... fee is {ceil(SEC*abs(total_cents)) + ceil(FINRA*abs(shares))}')
-        return ceil(SEC*abs(total_cents)) + ceil(FINRA*abs(shares))
+        logger.info(f'... fee is {ceil(SEC_FEE*abs(total_cents)) + ceil(FINRA_FEE*abs(shares))}')
+        return ceil(SEC_FEE*abs(total_cents)) + ceil(FINRA_FEE*abs(shares))
+
+    def get_fees(self, shares: int, total_cents: np.ndarray) -> np.ndarray:
+        '''get_fee() of a fixed number of shares for an array of totals, subclasses overriding get_fee() must match it'''
+        return np.ceil(SEC_FEE*np.abs(total_cents)).astype(np.int64) + ceil(FINRA_FEE*abs(shares))
 
     def adjusted_price(self, shares: int, cents: int, high_cents: Optional[int]=sys.maxsize, low_cents: Optional[int]=0) -> int:
         logger.info(f'Broker.adjusted_price() Adjusting price for {shares=} shares and {cents=} cents ...')
@@ -139,6 +151,12 @@ class Broker:
         logger.info(f'... adjusted price is {ceil(raw) if shares > 0 else floor(raw)}')
         return ceil(raw) if shares > 0 else floor(raw)
 
+    def adjusted_prices(self, shares: int, cents: np.ndarray, high_cents: np.ndarray, low_cents: np.ndarray) -> np.ndarray:
+        '''adjusted_price() of a fixed number of shares for arrays of prices, subclasses overriding adjusted_price() must match it'''
+        raw = cents*(1+copysign(self.__spread, shares))
+        adjusted = np.ceil(np.minimum(raw, high_cents)) if shares > 0 else np.floor(np.maximum(raw, low_cents))
+        return adjusted.astype(np.int64)
+
     def total_pl(self, current_time: Optional[dt.datetime]=None) -> int:
         return sum(position.total_pl(current_time) for position in self.__positions.values())
     
@@ -160,6 +178,11 @@ class Broker:
 
     def equity(self, time: Optional[dt.datetime]=None) -> int:
         return self.__cash + self.unrealized_pl(time)
+
+    def equity_at(self, bar: int) -> int:
+        '''equity() at a bar of calendar, each asset's row is read from the calendar instead of searched by date'''
+        return self.__cash + sum(position.unrealized_pl_at(self.__calendar.row(ticker_symbol, bar))
+                                 for ticker_symbol, position in self.__positions.items() if position.trades)
     
     @property
     def closed_trades(self) -> list['Trade']:
@@ -180,6 +203,15 @@ class Broker:
     @property
     def trade_on_close(self) -> bool:
         return self.__trade_on_close
+
+    @property
+    def calendar(self) -> Optional[TradingCalendar]:
+        '''Calendar of the run equity_at() reads bars from, set by Backtest'''
+        return self.__calendar
+
+    @calendar.setter
+    def calendar(self, calendar: TradingCalendar) -> None:
+        self.__calendar = calendar
     
     def __repr__(self) -> str:
         return f'Broker({self.__cash}, unrealized_pl={self.unrealized_pl()}, realized_pl={self.realized_pl()})'
@@ -202,16 +234,24 @@ class Trade:
         self.__exit_time = exit_time
 
     def pl(self, time: Optional[dt.datetime]=None) -> int:
+        i = None
+        if not self.is_closed():
+            asset = AssetManager.get(self.__ticker_symbol)
+            i = asset.prev_or_equal_index(time) if time else asset.latest_index()
+        return self.pl_at(i)
+
+    def pl_at(self, i: Optional[int]=None) -> int:
+        '''pl() at row i of the asset history instead of a time, the latest row if None'''
         logger.info(f'Trade.pl() calculating pl for {self.__shares} shares of {self.__ticker_symbol} ...')
         logger.info(f'... Trade closed?: {self.is_closed()}')
-        asset = AssetManager.get(self.__ticker_symbol)
-        if not time:
-            time = asset.latest_date()
+        if self.is_closed():
+            current_cents = self.__exit_cents
         else:
-            time = asset.prev_or_equal_date(time)
-        high = asset.get_cents(time, 'High')
-        low = asset.get_cents(time, 'Low')
-        current_cents = self.__exit_cents if self.is_closed() else self.broker.adjusted_price(self.__shares,asset.get_cents(time), high, low)
+            asset = AssetManager.get(self.__ticker_symbol)
+            i = asset.latest_index() if i is None else i
+            high = asset.get_cents_at(i, 'High')
+            low = asset.get_cents_at(i, 'Low')
+            current_cents = self.broker.adjusted_price(self.__shares, asset.get_cents_at(i), high, low)
         raw = self.shares * current_cents
         fee = self.__broker.get_fee(self.__shares, raw)
         logger.info(f'... Entry at {self.__entry_cents}, Exit at {current_cents}, Fee is {fee}, Shares is {self.__shares}')
@@ -306,15 +346,19 @@ class Position:
     
     def unrealized_pl(self, current_time: Optional[dt.datetime]=None) -> int:
         return sum(trade.pl(current_time) for trade in self.__trades)
+
+    def unrealized_pl_at(self, i: int) -> int:
+        return sum(trade.pl_at(i) for trade in self.__trades)
     
     def process_order(self, order: Order, time: Optional[dt.datetime]=None) -> None:
         logger.info(f'Position.process_order() Processing order for {order.shares} shares of {order.ticker_symbol}')
         logger.info(f'... {order.type=}, {order.limit_cents=}, {order.stop_cents=}')
         asset = AssetManager.get(order.ticker_symbol)
         time = asset.prev_or_equal_date(time) if time else asset.latest_date()
-        open_cents = asset.get_cents(time,'Open')
-        high_cents = asset.get_cents(time,'High')
-        low_cents = asset.get_cents(time,'Low')
+        i = asset.prev_or_equal_index(time)
+        open_cents = asset.get_cents_at(i,'Open')
+        high_cents = asset.get_cents_at(i,'High')
+        low_cents = asset.get_cents_at(i,'Low')
         stop_cents = order.stop_cents
         limit_cents = order.limit_cents
         is_stop = order.is_stop()
@@ -344,7 +388,7 @@ class Position:
         else:
             logger.info(f'... order is market')
             prev_time = asset.prev_date(time)
-            prev_close = asset.get_cents(prev_time, 'Close')
+            prev_close = asset.get_cents_at(i-1, 'Close')
             exec_price = prev_close if self.__broker.trade_on_close else open_cents
             if stop_cents:
                 exec_price = max(exec_price, stop_cents) if order.is_long() else min(exec_price, stop_cents)
@@ -0,0 +1,106 @@
+import datetime as dt
+from typing import Optional
+import numpy as np
+import pandas as pd
+
+from stocktrace.asset import AssetManager
+from stocktrace.logger import Logger as logger
+from stocktrace.utils import TIMEZONE, index_to_ns
+
+CALENDAR_MODES = ('union', 'intersection')
+
+class TradingCalendar:
+    '''
+    Master clock of a run, the union or intersection of the timestamps of tickers, built once.
+    Bars are positions in index. The row of every asset at or before each bar is computed once per asset,
+    so the price at a bar and the previous bar of an asset are array reads instead of date searches
+    '''
+    def __init__(self, tickers: list[str], how: str='union') -> None:
+        if how not in CALENDAR_MODES:
+            raise ValueError(f'TradingCalendar() how must be one of {CALENDAR_MODES}, not {how}')
+        if not tickers:
+            raise ValueError('TradingCalendar() needs at least one ticker')
+        logger.debug(f'TradingCalendar.__init__ Creating TradingCalendar of the {how} of {tickers}')
+        indices = []
+        for ticker_symbol in tickers:
+            asset = AssetManager.get(ticker_symbol)
+            if asset is None:
+                raise ValueError(f'TradingCalendar() Unknown ticker {ticker_symbol}')
+            indices.append(asset.data.index)
+        index = indices[0]
+        for other in indices[1:]:
+            index = index.union(other) if how == 'union' else index.intersection(other)
+        self.__index: pd.DatetimeIndex = index.rename(None)
+        self.__tickers = list(tickers)
+        self.__how = how
+        self.__rows: dict[str, np.ndarray] = {}
+        self.__own: dict[str, np.ndarray] = {}
+        logger.info(f'TradingCalendar.__init__ Built {len(self.__index)} bars from {len(tickers)} tickers')
+
+    @classmethod
+    def from_index(cls, index: pd.DatetimeIndex) -> 'TradingCalendar':
+        '''Calendar over the bars of index as given, built from no ticker'''
+        calendar = cls.__new__(cls)
+        calendar.__index = index.rename(None)
+        calendar.__tickers = []
+        calendar.__how = 'union'
+        calendar.__rows = {}
+        calendar.__own = {}
+        return calendar
+
+    def rows(self, ticker_symbol: str) -> np.ndarray:
+        '''Row of the asset history at or before every bar, -1 before its first row'''
+        rows = self.__rows.get(ticker_symbol)
+        if rows is None:
+            rows = AssetManager.get(ticker_symbol).csv.prev_or_equal_indices(self.__index)
+            self.__rows[ticker_symbol] = rows
+        return rows
+
+    def row(self, ticker_symbol: str, bar: int) -> int:
+        return int(self.rows(ticker_symbol)[bar])
+
+    def own_bars(self, ticker_symbol: str) -> np.ndarray:
+        '''True at the bars where the asset has a row of its own, False where rows() carries an earlier row forward'''
+        own = self.__own.get(ticker_symbol)
+        if own is None:
+            rows = self.rows(ticker_symbol)
+            index_ns = AssetManager.get(ticker_symbol).csv.index_ns
+            own = (rows >= 0) & (index_ns[np.maximum(rows, 0)] == index_to_ns(self.__index)) if len(index_ns) else np.zeros(len(rows), dtype=bool)
+            self.__own[ticker_symbol] = own
+        return own
+
+    def has_row(self, ticker_symbol: str, bar: int) -> bool:
+        return bool(self.own_bars(ticker_symbol)[bar])
+
+    def cents_at(self, ticker_symbol: str, bar: int, col: str='Close') -> Optional[int]:
+        '''Latest price of the asset at bar, None before its first row'''
+        return AssetManager.get(ticker_symbol).get_cents_at(self.row(ticker_symbol, bar), col)
+
+    def bar(self, time: dt.datetime) -> int:
+        '''Position of the last bar at or before time, -1 if there is none'''
+        return int(self.__index.searchsorted(time, side='right'))-1
+
+    def prev_or_equal_date(self, time: dt.datetime) -> dt.datetime:
+        i = self.bar(time)
+        if i < 0:
+            logger.warning(f'TradingCalendar.prev_or_equal_date() could not find previous or equal date to {time}')
+            return dt.datetime.min.replace(tzinfo=TIMEZONE)
+        return self.__index[i]
+
+    @property
+    def index(self) -> pd.DatetimeIndex:
+        return self.__index
+
+    @property
+    def tickers(self) -> list[str]:
+        return self.__tickers
+
+    @property
+    def how(self) -> str:
+        return self.__how
+
+    def __len__(self) -> int:
+        return len(self.__index)
+
+    def __repr__(self) -> str:
+        return f'TradingCalendar({self.__tickers}, {self.__how}, {len(self.__index)} bars)'
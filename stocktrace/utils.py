@@ -1,5 +1,6 @@
 import datetime as dt
 from dateutil.relativedelta import relativedelta
+import numpy as np
 import pandas as pd
 from pyqtgraph.Qt.QtGui import QColor
 
@@ -7,6 +8,9 @@ import stocktrace.logger as logger
 
 DATA_PATH = 'data/'
 
+# TODO: Get data format from settings, 'csv' or 'npy'
+DATA_FORMAT = 'csv'
+
 DEFAULT_FONT = 'Helvetica'
 
 # TODO: Get timezone from settings
@@ -63,6 +67,13 @@ def interval_to_timedelta(interval):
     else:
         return pd.Timedelta(interval)
 
+def interval_to_resample_args(interval: str) -> dict:
+    '''Keyword arguments for DataFrame.resample() that bucket rows into bars of interval'''
+    rules = {'1wk': 'W-MON', '1mo': 'MS', '3mo': 'QS', '6mo': '6MS', '1y': 'YS', '2y': '2YS', '5y': '5YS', '10y': '10YS'}
+    if interval in rules:
+        return {'rule': rules[interval], 'closed': 'left', 'label': 'left'}
+    return {'rule': pd.Timedelta(interval), 'closed': 'left', 'label': 'left', 'origin': 'epoch'}
+
 def delta_to_seconds(delta) -> int:
     if isinstance(delta, pd.Timedelta):
         return delta.total_seconds()
@@ -71,4 +82,18 @@ def delta_to_seconds(delta) -> int:
         seconds = days * 86400 + delta.hours * 3600 + delta.minutes * 60 + delta.seconds
         return seconds
     else:
-        raise ValueError(f'Delta must be pd.Timedelta or relativedelta, got {type(delta)}')
\ No newline at end of file
+        raise ValueError(f'Delta must be pd.Timedelta or relativedelta, got {type(delta)}')
+
+def datetime_to_ns(time) -> int:
+    try:
+        return pd.Timestamp(time).value
+    except (pd.errors.OutOfBoundsDatetime, OverflowError):
+        # dt.datetime.min/max are used as open bounds throughout
+        return np.iinfo(np.int64).min if time.year < 1970 else np.iinfo(np.int64).max
+
+def index_to_ns(index: pd.Index) -> np.ndarray:
+    if len(index) == 0:
+        return np.empty(0, dtype=np.int64)
+    if not isinstance(index, pd.DatetimeIndex):
+        index = pd.DatetimeIndex(index)
+    return index.as_unit('ns').asi8
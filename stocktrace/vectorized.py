@@ -0,0 +1,225 @@
+import datetime as dt
+from math import floor
+import numpy as np
+import pandas as pd
+from typing import Optional
+
+from stocktrace.asset import Asset, AssetManager
+from stocktrace.logger import Logger as logger
+from stocktrace.trade_system import Broker, Trade
+from stocktrace.trading_calendar import TradingCalendar
+from stocktrace.utils import TIMEZONE
+
+class VectorizedBacktest:
+    '''
+    Backtest of a pure signal strategy computed with numpy instead of bar by bar through the Broker.
+    Inputs are arrays or Series per ticker aligned to the calendar, NaN meaning no change:
+    targets hold the number of shares wanted, signals the fraction of cash to hold, sized to
+    signal*cash//close cents the bar it changes. Every change at bar i is one market order placed at bar i
+    and filled at the next bar where its asset has a row of its own, exactly as Position.process_order() fills it,
+    including fees and spread.
+    equity and closed_trades match what Backtest produces for an Algorithm placing the same orders.
+    The calendar defaults to the bars of benchmark as in Backtest
+    '''
+    def __init__(self,
+                 broker: Broker,
+                 targets: Optional[dict[str, np.ndarray]]=None,
+                 signals: Optional[dict[str, np.ndarray]]=None,
+                 start_date: Optional[dt.datetime]=dt.datetime.min.replace(tzinfo=TIMEZONE),
+                 end_date: Optional[dt.datetime]=None,
+                 name: Optional[str]=None,
+                 calendar: Optional[TradingCalendar]=None,
+                 benchmark: str='^GSPC') -> None:
+        logger.debug(f'VectorizedBacktest.__init__ Creating VectorizedBacktest {name}, start date {start_date}, end date {end_date}')
+        targets = targets if targets else {}
+        signals = signals if signals else {}
+        if set(targets) & set(signals):
+            raise ValueError(f'VectorizedBacktest() tickers {set(targets) & set(signals)} have both targets and signals')
+        self.__broker = broker
+        self.__targets = targets
+        self.__signals = signals
+        self.__start_date = start_date
+        self.__end_date = end_date
+        self.__name = name
+        self.__calendar = calendar
+        self.__benchmark = benchmark
+        self.__completed = False
+        self.__equity = pd.Series(dtype=float)
+        self.__closed_trades: list[Trade] = []
+
+    def run(self) -> None:
+        logger.info(f'VectorizedBacktest.run() Running backtest {self}')
+        with AssetManager.pinning():
+            self.__run()
+
+    def __run(self) -> None:
+        if self.__calendar is None:
+            self.__calendar = TradingCalendar([self.__benchmark])
+        calendar = self.__calendar.index
+        self.__start_date = self.__calendar.prev_or_equal_date(self.__start_date)
+        self.__end_date = self.__calendar.prev_or_equal_date(self.__end_date if self.__end_date else dt.datetime.now(tz=TIMEZONE))
+        first = int(calendar.searchsorted(self.__start_date, side='left'))
+        times = calendar[first:int(calendar.searchsorted(self.__end_date, side='right'))]
+
+        tickers = [*self.__targets, *self.__signals]
+        assets = {ticker: AssetManager.get(ticker) for ticker in tickers}
+        # Row of each asset at or before every bar, -1 before its first row
+        rows = {ticker: self.__calendar.rows(ticker)[first:first+len(times)] for ticker in tickers}
+        values = {ticker: self.__align(inputs[ticker], calendar)[first:first+len(times)]
+                  for inputs in (self.__targets, self.__signals) for ticker in inputs}
+        changes = {ticker: self.__changes(values[ticker]) for ticker in tickers}
+
+        cash = self.__broker.cash
+        open_trades: dict[str, list[Trade]] = {ticker: [] for ticker in tickers}
+        closed_trades: dict[str, list[Trade]] = {}
+        # (bar, cash, (ticker, shares, entry cents) of every open trade) from each bar trades or cash changed
+        segments = [(0, cash, [])]
+        # Orders fill at the first bar after they are placed where their asset has a row of its own
+        own = {ticker: self.__calendar.own_bars(ticker)[first:first+len(times)] for ticker in tickers}
+        events = {}
+        fills = set()
+        for ticker in tickers:
+            own_bars = np.flatnonzero(own[ticker])
+            for i in changes[ticker]:
+                events.setdefault(int(i), []).append(ticker)
+                j = int(np.searchsorted(own_bars, i+1))
+                if j < len(own_bars):
+                    fills.add(int(own_bars[j]))
+        pending: list[tuple[str, int]] = []
+        for i in sorted(set(events) | fills):
+            filled = [(ticker, shares) for ticker, shares in pending if own[ticker][i]]
+            if filled:
+                for ticker, shares in filled:
+                    cash += self.__fill(assets[ticker], rows[ticker][i], shares, open_trades[ticker], closed_trades.setdefault(ticker, []))
+                segments.append((i, cash, [(ticker, trade.shares, trade.entry_cents) for ticker in tickers for trade in open_trades[ticker]]))
+                pending = [(ticker, shares) for ticker, shares in pending if not own[ticker][i]]
+            # Orders placed on the last bar are never filled
+            if i >= len(times)-1:
+                continue
+            for ticker in events.get(i, []):
+                held = sum(trade.shares for trade in open_trades[ticker])
+                target = self.__target(ticker, assets[ticker], rows[ticker][i], values[ticker][i], cash)
+                if target is not None and target != held:
+                    pending.append((ticker, target-held))
+
+        equity = np.empty(len(times), dtype=np.int64)
+        for (start, cash, trades), (stop, _, _) in zip(segments, segments[1:] + [(len(times), None, None)]):
+            equity[start:stop] = cash
+            for ticker, shares, entry_cents in trades:
+                equity[start:stop] += self.__open_pl(assets[ticker], rows[ticker][start:stop], shares, entry_cents)
+        self.__equity = pd.Series(equity.astype(np.float64), index=times.rename(None))
+        self.__closed_trades = sum(closed_trades.values(), [])
+        logger.info(f'VectorizedBacktest.run() Completed {len(times)} bars with {len(self.__closed_trades)} closed trades')
+        self.__completed = True
+
+    def __align(self, values, calendar: pd.DatetimeIndex) -> np.ndarray:
+        if isinstance(values, pd.Series):
+            return values.reindex(calendar).to_numpy(dtype=float)
+        values = np.asarray(values, dtype=float)
+        if len(values) != len(calendar):
+            raise ValueError(f'VectorizedBacktest() {len(values)} values do not match the {len(calendar)} bars of the calendar')
+        return values
+
+    def __changes(self, values: np.ndarray) -> np.ndarray:
+        '''Bars where the last given value changes, the value before the first one being 0'''
+        given = ~np.isnan(values)
+        held = np.where(given, values, 0.0)
+        # Carries each given value forward over the NaNs after it
+        held = held[np.maximum.accumulate(np.where(given, np.arange(len(values)), 0))] if len(values) else held
+        return np.flatnonzero(np.diff(held, prepend=0.0))
+
+    def __target(self, ticker: str, asset: Asset, row: int, value: float, cash: int) -> Optional[int]:
+        if ticker in self.__targets:
+            return int(value)
+        if value == 0:
+            return 0
+        close_cents = asset.get_cents_at(int(row))
+        if close_cents is None:
+            logger.warning(f'VectorizedBacktest.__target() no price to size {ticker} at row {row}, ignoring signal')
+            return None
+        return int(value)*cash//close_cents if value == int(value) else floor(value*cash/close_cents)
+
+    def __fill(self, asset: Asset, row: int, shares: int, open_trades: list[Trade], closed_trades: list[Trade]) -> int:
+        '''Fills a market order at row like Position.process_order(), returns the change in cash'''
+        if row < 0:
+            logger.warning(f'VectorizedBacktest.__fill() no data for {asset.ticker_symbol} yet, dropping order for {shares} shares')
+            return 0
+        row = int(row)
+        high_cents = asset.get_cents_at(row, 'High')
+        low_cents = asset.get_cents_at(row, 'Low')
+        if self.__broker.trade_on_close:
+            exec_cents = self.__broker.adjusted_price(shares, asset.get_cents_at(row-1, 'Close'), high_cents, low_cents)
+            time = asset.data.index[row-1]
+        else:
+            exec_cents = self.__broker.adjusted_price(shares, asset.get_cents_at(row, 'Open'), high_cents, low_cents)
+            time = asset.data.index[row]
+        cash = 0
+        need_shares = shares
+        for trade in list(open_trades):
+            if trade.is_long() == (need_shares > 0):
+                continue
+            if abs(trade.shares) > abs(need_shares):
+                closed_trade = Trade(self.__broker, asset.ticker_symbol, -need_shares, trade.entry_cents, trade.entry_time, exec_cents, time)
+                trade.shares += need_shares
+                need_shares = 0
+            else:
+                closed_trade = trade
+                closed_trade.exit_cents = exec_cents
+                closed_trade.exit_time = time
+                open_trades.remove(trade)
+                need_shares += trade.shares
+            closed_trades.append(closed_trade)
+            cash += closed_trade.pl()
+            if need_shares == 0:
+                break
+        if need_shares != 0:
+            open_trades.append(Trade(self.__broker, asset.ticker_symbol, need_shares, exec_cents, time))
+        return cash
+
+    def __open_pl(self, asset: Asset, rows: np.ndarray, shares: int, entry_cents: int) -> np.ndarray:
+        '''Trade.pl() of an open trade at every row'''
+        current_cents = self.__broker.adjusted_prices(shares, asset.csv.cents('Close')[rows], asset.csv.cents('High')[rows], asset.csv.cents('Low')[rows])
+        return shares*(current_cents-entry_cents) - self.__broker.get_fees(shares, shares*current_cents)
+
+    @property
+    def start_date(self) -> dt.datetime:
+        if not self.__completed:
+            raise RuntimeError('Backtest has not been completed yet')
+        return self.__start_date
+
+    @property
+    def end_date(self) -> dt.datetime:
+        if not self.__completed:
+            raise RuntimeError('Backtest has not been completed yet')
+        return self.__end_date
+
+    @property
+    def calendar(self) -> Optional[TradingCalendar]:
+        return self.__calendar
+
+    @property
+    def name(self) -> Optional[str]:
+        return self.__name
+
+    @property
+    def broker(self) -> Broker:
+        return self.__broker
+
+    @property
+    def completed(self) -> bool:
+        return self.__completed
+
+    @property
+    def equity(self) -> pd.Series:
+        if not self.__completed:
+            raise RuntimeError('Backtest has not been completed yet')
+        return self.__equity
+
+    @property
+    def closed_trades(self) -> list[Trade]:
+        if not self.__completed:
+            raise RuntimeError('Backtest has not been completed yet')
+        return self.__closed_trades
+
+    def __repr__(self) -> str:
+        return f'VectorizedBacktest({self.__name}, {self.__start_date}, {self.__end_date})'
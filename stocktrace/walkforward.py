@@ -0,0 +1,173 @@
+import datetime as dt
+import itertools
+import os
+import time
+from typing import Optional
+import numpy as np
+import pandas as pd
+
+from stocktrace.asset import AssetManager
+from stocktrace.backtest import Backtest
+from stocktrace.logger import Logger as logger
+from stocktrace.statistics import generate_statistics
+from stocktrace.sweep import shared_asset_pool
+from stocktrace.trade_system import Broker
+from stocktrace.trading_calendar import TradingCalendar
+from stocktrace.utils import TIMEZONE
+
+def _run_window(algorithm, params: dict, broker_settings: dict, start_date: dt.datetime, end_date: dt.datetime,
+                alpha_ticker: str, objective: str, with_equity: bool=False, calendar: Optional[TradingCalendar]=None,
+                benchmark: str='^GSPC') -> tuple[float, Optional[pd.Series]]:
+    '''Runs one parameter set over one window, returns its objective, NaN if it has no statistics, and its equity if asked'''
+    backtest = Backtest(algorithm, Broker(**broker_settings), start_date, end_date, params, calendar, benchmark)
+    backtest.run()
+    try:
+        stats = generate_statistics(backtest.broker.closed_trades, backtest.equity, backtest.algorithm, backtest.start_date, backtest.end_date, alpha_ticker)
+        value = float(stats[objective])
+    except (ValueError, ZeroDivisionError, IndexError) as e:
+        # Windows without trades or drawdowns have no statistics
+        logger.warning(f'_run_window() No {objective} for {params} from {start_date} to {end_date}: {e!r}')
+        value = np.nan
+    return value, backtest.equity if with_equity else None
+
+class WalkForward:
+    '''
+    Walk-forward optimization of algorithm over the bars of calendar, or of benchmark, from start_date to end_date. Each window picks the
+    grid parameters with the best objective column of generate_statistics() over in_sample bars and trades them over
+    the next out_of_sample bars, windows roll forward by out_of_sample bars. The backtests of every window run on one
+    shared pool whose workers attach the prices from shared memory and keep the indicators they computed for the
+    windows after, so every parameter set computes its indicators once per worker over the full history
+    '''
+    def __init__(self,
+                 algorithm,
+                 grid: dict[str, list],
+                 broker_settings: dict,
+                 in_sample: int,
+                 out_of_sample: int,
+                 start_date: Optional[dt.datetime]=dt.datetime.min.replace(tzinfo=TIMEZONE),
+                 end_date: Optional[dt.datetime]=None,
+                 objective: str='Return %',
+                 maximize: bool=True,
+                 alpha_ticker: Optional[str]=None,
+                 tickers: Optional[list[str]]=None,
+                 max_workers: Optional[int]=None,
+                 calendar: Optional[TradingCalendar]=None,
+                 benchmark: str='^GSPC') -> None:
+        '''alpha_ticker defaults to benchmark'''
+        logger.debug(f'WalkForward.__init__ Creating WalkForward of {algorithm.__name__} over {grid}, {in_sample}/{out_of_sample} bars')
+        if in_sample <= 0 or out_of_sample <= 0:
+            raise ValueError(f'WalkForward() in_sample {in_sample} and out_of_sample {out_of_sample} must be positive')
+        self.__algorithm = algorithm
+        self.__grid = grid
+        self.__broker_settings = broker_settings
+        self.__in_sample = in_sample
+        self.__out_of_sample = out_of_sample
+        self.__start_date = start_date
+        self.__end_date = end_date
+        self.__objective = objective
+        self.__maximize = maximize
+        self.__alpha_ticker = alpha_ticker if alpha_ticker else benchmark
+        self.__calendar = calendar
+        self.__benchmark = benchmark
+        self.__tickers = tickers
+        self.__max_workers = max_workers if max_workers else os.cpu_count() or 1
+        self.__completed = False
+        self.__windows = pd.DataFrame()
+        self.__equity = pd.Series(dtype=float)
+        self.__elapsed = 0.0
+
+    def split(self) -> list[tuple[pd.Timestamp, pd.Timestamp, pd.Timestamp, pd.Timestamp]]:
+        '''(in-sample start, in-sample end, out-of-sample start, out-of-sample end) dates of every window, ends inclusive'''
+        if self.__calendar is None:
+            self.__calendar = TradingCalendar([self.__benchmark])
+        calendar = self.__calendar.index
+        first = int(calendar.searchsorted(self.__start_date, side='left'))
+        stop = int(calendar.searchsorted(self.__end_date if self.__end_date else dt.datetime.now(tz=TIMEZONE), side='right'))
+        windows = []
+        for start in range(first, stop-self.__in_sample, self.__out_of_sample):
+            split = start+self.__in_sample
+            end = min(split+self.__out_of_sample, stop)
+            windows.append((calendar[start], calendar[split-1], calendar[split], calendar[end-1]))
+        return windows
+
+    def run(self) -> None:
+        windows = self.split()
+        combinations = [dict(zip(self.__grid, values)) for values in itertools.product(*self.__grid.values())]
+        logger.info(f'WalkForward.run() Optimizing {len(combinations)} parameter sets over {len(windows)} windows')
+        start = time.perf_counter()
+        tasks = [(window, params) for window in windows for params in combinations]
+        if not tasks:
+            raise ValueError(f'WalkForward.run() No windows of {self.__in_sample}+{self.__out_of_sample} bars between {self.__start_date} and {self.__end_date}')
+        # The first task runs in-process to load every asset the algorithm touches
+        first = _run_window(*self.__task(*tasks[0]))[0]
+        if self.__max_workers > 1 and len(tasks) > 1:
+            tickers = self.__tickers if self.__tickers else list(AssetManager.get_assets())
+            with shared_asset_pool(tickers, self.__max_workers) as pool:
+                futures = [pool.submit(_run_window, *self.__task(*task)) for task in tasks[1:]]
+                best = self.__select(windows, combinations, [first] + [future.result()[0] for future in futures])
+                out_of_sample = [pool.submit(_run_window, *self.__task(window, params, True)) for window, params in best]
+                results = [future.result() for future in out_of_sample]
+        else:
+            in_sample = [first] + [_run_window(*self.__task(*task))[0] for task in tasks[1:]]
+            best = self.__select(windows, combinations, in_sample)
+            results = [_run_window(*self.__task(window, params, True)) for window, params in best]
+
+        rows = []
+        segments = []
+        capital = float(self.__broker_settings.get('start_cash_cents', 0))
+        for (window, params), (value, equity) in zip(best, results):
+            # Each window starts from the start cash, its returns are compounded onto the stitched curve
+            segment = equity*(capital/equity.iloc[0]) if len(equity.index) and equity.iloc[0] else equity.astype(float)
+            if len(segment.index):
+                capital = float(segment.iloc[-1])
+            segments.append(segment)
+            rows.append({'In Sample Start': window[0], 'In Sample End': window[1], 'Out Of Sample Start': window[2],
+                         'Out Of Sample End': window[3], **params, f'Out Of Sample {self.__objective}': value})
+        self.__windows = pd.DataFrame(rows)
+        self.__equity = pd.concat(segments) if segments else pd.Series(dtype=float)
+        self.__elapsed = time.perf_counter() - start
+        self.__completed = True
+        logger.info(f'WalkForward.run() Ran {len(tasks)+len(best)} backtests over {len(windows)} windows in {self.__elapsed:.2f}s')
+
+    def __task(self, window: tuple, params: dict, out_of_sample: bool=False) -> tuple:
+        start_date, end_date = (window[2], window[3]) if out_of_sample else (window[0], window[1])
+        return (self.__algorithm, params, self.__broker_settings, start_date, end_date, self.__alpha_ticker, self.__objective, out_of_sample,
+                self.__calendar, self.__benchmark)
+
+    def __select(self, windows: list[tuple], combinations: list[dict], values: list[float]) -> list[tuple[tuple, dict]]:
+        '''Best parameters of every window by in-sample objective, windows where nothing has one are skipped'''
+        best = []
+        for i, window in enumerate(windows):
+            scores = np.array(values[i*len(combinations):(i+1)*len(combinations)], dtype=float)
+            if np.isnan(scores).all():
+                logger.warning(f'WalkForward.__select() No {self.__objective} in the in-sample window {window[0]} to {window[1]}, skipping it')
+                continue
+            j = int(np.nanargmax(scores) if self.__maximize else np.nanargmin(scores))
+            logger.info(f'WalkForward.__select() Window {window[0]} to {window[1]} picked {combinations[j]} with {self.__objective} {scores[j]}')
+            best.append((window, combinations[j]))
+        return best
+
+    @property
+    def windows(self) -> pd.DataFrame:
+        '''Dates, chosen parameters and out-of-sample objective of every window'''
+        if not self.__completed:
+            raise RuntimeError('WalkForward has not been completed yet')
+        return self.__windows
+
+    @property
+    def equity(self) -> pd.Series:
+        '''Out-of-sample equity of every window stitched together, in cents'''
+        if not self.__completed:
+            raise RuntimeError('WalkForward has not been completed yet')
+        return self.__equity
+
+    @property
+    def elapsed(self) -> float:
+        return self.__elapsed
+
+    @property
+    def completed(self) -> bool:
+        return self.__completed
+
+    def __repr__(self) -> str:
+        return f'WalkForward({self.__algorithm.__name__}, {self.__grid}, {self.__in_sample}/{self.__out_of_sample})'
@@ -0,0 +1,30 @@
+import time
+
+from stocktrace import IndicatorManager, IndicatorCache, AssetManager
+
+# Vectorized compute_series against the per-bar compute loop Indicator.init falls back to
+TICKER = 'AAPL'
+SPECS = [('SMA', {'window': 20}), ('EMA', {'window': 20}), ('WMA', {'window': 20}), ('STDEV', {'window': 20}),
+         ('ROLLING_MIN', {'window': 20}), ('ROLLING_MAX', {'window': 20}), ('RSI', {'window': 14}), ('ATR', {'window': 14}),
+         ('MACD', {'line': 'macd'}), ('BOLLINGER', {'band': 'upper'})]
+
+AssetManager.get(TICKER).cents()
+print(f'{"indicator":<12}{"per-bar s":>12}{"vectorized s":>14}{"speedup":>10}{"equal":>8}')
+for name, params in SPECS:
+    indicator = IndicatorManager.get_indicator(name)
+    class PerBar(indicator):
+        def compute_series(self, asset):
+            return None
+    IndicatorCache.clear()
+    vectorized = indicator(name, **params)
+    start = time.perf_counter()
+    vectorized.init(TICKER)
+    vectorized_time = time.perf_counter()-start
+
+    per_bar = PerBar(name, **params)
+    start = time.perf_counter()
+    per_bar.init(TICKER)
+    per_bar_time = time.perf_counter()-start
+
+    equal = per_bar.data.index.equals(vectorized.data.index) and ((per_bar.data-vectorized.data).abs() <= 1e-9*vectorized.data.abs().max()).all()
+    print(f'{name:<12}{per_bar_time:>12.3f}{vectorized_time:>14.4f}{per_bar_time/vectorized_time:>9.0f}x{str(equal):>8}')
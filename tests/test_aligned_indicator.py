@@ -0,0 +1,12 @@
+from stocktrace import AssetManager, IndicatorManager
+
+sma = IndicatorManager.get_indicator('SMA')('SMA', window=20)
+sma.init('GOOG')
+calendar = AssetManager.get('^GSPC').data.index
+sma.align(calendar)
+
+i = calendar.get_loc(sma.data.index[100])
+print(sma[i] == sma.data.iloc[100], sma[i-1] == sma.data.iloc[99])
+# True True
+print(len(sma.aligned) == len(calendar))
+# True
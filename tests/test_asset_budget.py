@@ -0,0 +1,45 @@
+import threading
+from stocktrace import Asset, AssetManager, MemoryStore
+from stocktrace.file import TIME_CSV
+
+apple = TIME_CSV('data/AAPL1d.csv').data
+AssetManager.init(auto_save=False, lazy=True)
+AssetManager.register(Asset('FIRST', update=False, store=MemoryStore('FIRST', apple.iloc[:len(apple)//2])))
+AssetManager.register(Asset('SECOND', update=False, store=MemoryStore('SECOND', apple.iloc[:len(apple)//2])))
+resident = AssetManager.get_stats()['resident_bytes']
+AssetManager.set_memory_budget(resident + 1000)
+
+# Rows appended to a resident asset are counted, going over budget evicts the other asset
+first = AssetManager.get('FIRST')
+first.history.ingest(apple.iloc[len(apple)//2:])
+stats = AssetManager.get_stats()
+print(stats['resident_bytes'] == first.memory_usage(), stats['evictions'])
+# True 1
+
+# Pins taken inside pinning() in one thread do not leak into gets of another thread
+AssetManager.set_memory_budget(None)
+entered, release = threading.Event(), threading.Event()
+def worker():
+    with AssetManager.pinning():
+        AssetManager.get('FIRST')
+        entered.set()
+        release.wait()
+thread = threading.Thread(target=worker)
+thread.start()
+entered.wait()
+AssetManager.get('SECOND')
+print(AssetManager.get_stats()['pinned'])
+# 1
+release.set()
+thread.join()
+print(AssetManager.get_stats()['pinned'])
+# 0
+
+# A nested scope holding the same tickers as the outer one exits cleanly and releases every pin
+with AssetManager.pinning():
+    AssetManager.get('FIRST')
+    with AssetManager.pinning():
+        AssetManager.get('FIRST')
+    AssetManager.get('SECOND')
+print(AssetManager.get_stats()['pinned'])
+# 0
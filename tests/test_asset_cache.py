@@ -0,0 +1,19 @@
+from stocktrace import AssetManager
+
+# Budget that fits roughly two daily histories
+AssetManager.init(lazy=True, memory_budget=1_000_000)
+for ticker in ['AAPL', 'MSFT', 'GOOG']:
+    print(ticker, AssetManager.get(ticker).memory_usage())
+print(AssetManager.get_stats())
+# {'hits': 0, 'misses': 3, 'evictions': 1, ...}
+
+# AAPL was evicted and reloads transparently
+print(AssetManager.get('AAPL').latest_cents())
+
+# Pinned assets stay resident even over budget
+with AssetManager.pinning():
+    for ticker in ['AAPL', 'MSFT', 'GOOG']:
+        AssetManager.get(ticker)
+    print(AssetManager.get_stats()['pinned'])
+    # 3
+print(AssetManager.get_stats())
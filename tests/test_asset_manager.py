@@ -13,4 +13,12 @@ print(f'{curr_date=}, {prev_date=}')
 
 curr_cents = AssetManager.get('AAPL').latest_cents()
 prev_cents = AssetManager.get('AAPL').get_cents(prev_date)
-print(f'{curr_cents=}, {prev_cents=}')
\ No newline at end of file
+print(f'{curr_cents=}, {prev_cents=}')
+
+AssetManager.init(lazy=True)
+print(AssetManager.get_assets(), AssetManager.get_tickers())
+# {} ['AAPL', 'MSFT', ...]
+
+timings = AssetManager.warm_up()
+print(AssetManager.get_assets().keys() == set(timings))
+# True
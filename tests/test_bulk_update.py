@@ -0,0 +1,36 @@
+import os
+import shutil
+import time
+
+from stocktrace import AssetHistory, FileProvider, update_many
+from stocktrace.file import NPYStore, TIME_CSV
+
+# Serve 100 copies of AAPL from local files with 0.2s of simulated latency per request
+os.makedirs('tests/remote/', exist_ok=True)
+os.makedirs('tests/local/', exist_ok=True)
+apple = TIME_CSV('data/AAPL1d.csv').data
+for i in range(100):
+    NPYStore(f'tests/remote/T{i}1d.npy').write(apple)
+provider = FileProvider('tests/remote/', latency=0.2, data_format='npy', batch_size=25, max_workers=4)
+
+def stale_histories(update: bool) -> list[AssetHistory]:
+    for i in range(100):
+        NPYStore(f'tests/local/T{i}1d.npy').write(apple.iloc[:-20])
+    return [AssetHistory(f'T{i}', f'tests/local/T{i}1d.npy', provider=provider, update=update) for i in range(100)]
+
+start = time.time()
+stale_histories(update=True)
+print('serial', time.time()-start)
+# serial ~20s
+
+start = time.time()
+histories = stale_histories(update=False)
+update_many(histories)
+print('bulk', time.time()-start)
+# bulk ~1s
+
+print(len(histories[0].data) == len(apple))
+# True
+
+shutil.rmtree('tests/remote/')
+shutil.rmtree('tests/local/')
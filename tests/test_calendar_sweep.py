@@ -0,0 +1,31 @@
+import datetime as dt
+import pandas as pd
+from stocktrace import *
+
+if __name__ == '__main__':
+    # Sweeps and walk-forwards step through the given calendar or benchmark, the workers get every asset it is built from
+    AssetManager.init(auto_save=False)
+    goog = AssetManager.get('GOOG')
+    days = pd.date_range(goog.data.index[0], goog.data.index[-1], freq='D')
+    AssetManager.register(Asset('GOOG-7D', update=False, store=MemoryStore('GOOG-7D', goog.data.reindex(days, method='ffill'))))
+    union = TradingCalendar(['GOOG', 'GOOG-7D'])
+    start = dt.datetime(2004, 8, 19, tzinfo=TIMEZONE)
+    end = dt.datetime(2024, 3, 1, 23, tzinfo=TIMEZONE)
+
+    sweep = Sweep(AlgorithmManager.get_algorithm('SMACrossOver'), {'fast': [5, 10], 'slow': [20, 30, 50]},
+                  {'start_cash_cents': 1000000, 'spread': 0.01}, start, end, max_workers=2, min_parallel=1,
+                  tickers=['GOOG', 'GOOG-7D'], calendar=union, benchmark='GOOG')
+    sweep.run()
+    backtest = Backtest(AlgorithmManager.get_algorithm('SMACrossOver'), Broker(start_cash_cents=1000000, spread=0.01), start, end,
+                        {'fast': 10, 'slow': 50}, calendar=union)
+    backtest.run()
+    print(sweep.results.loc[(10, 50), 'Equity Final $'] == backtest.equity.iloc[-1]/100)
+    # True
+
+    walk_forward = WalkForward(AlgorithmManager.get_algorithm('SMACrossOver'), {'fast': [5, 10], 'slow': [20, 50]},
+                               {'start_cash_cents': 1000000, 'spread': 0.01}, 1000, 250, start, end, max_workers=1, benchmark='GOOG')
+    print(all(date in goog.data.index for window in walk_forward.split() for date in window))
+    # True
+    walk_forward.run()
+    print(walk_forward.equity.index.isin(goog.data.index).all())
+    # True
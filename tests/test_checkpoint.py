@@ -0,0 +1,35 @@
+import datetime as dt
+import os
+import tempfile
+from stocktrace import *
+
+class InterruptedBroker(Broker):
+    '''Broker whose run is interrupted once, like a killed process'''
+    bars = 0
+
+    def process_orders(self, time=None, bar=None):
+        InterruptedBroker.bars += 1
+        if InterruptedBroker.bars == 2500:
+            raise KeyboardInterrupt
+        super().process_orders(time, bar)
+
+start = dt.datetime(2004, 8, 19, tzinfo=TIMEZONE)
+end = dt.datetime(2024, 3, 1, 23, tzinfo=TIMEZONE)
+backtest = Backtest(AlgorithmManager.get_algorithm('SMACrossOver'), Broker(start_cash_cents=1000000, spread=0.01), start_date=start, end_date=end)
+backtest.run()
+
+path = os.path.join(tempfile.mkdtemp(), 'backtest.ckpt')
+interrupted = Backtest(AlgorithmManager.get_algorithm('SMACrossOver'), InterruptedBroker(start_cash_cents=1000000, spread=0.01), start_date=start, end_date=end)
+try:
+    interrupted.run(checkpoint_path=path, checkpoint_interval=0.0)
+except KeyboardInterrupt:
+    print(interrupted.completed)
+    # False
+
+resumed = Backtest.resume(path)
+print(resumed.equity.equals(backtest.equity))
+# True
+print([repr(trade) for trade in resumed.broker.closed_trades] == [repr(trade) for trade in backtest.broker.closed_trades])
+# True
+print(resumed.start_date == backtest.start_date, resumed.end_date == backtest.end_date)
+# True True
@@ -0,0 +1,32 @@
+import os
+import shutil
+from stocktrace import *
+from stocktrace.file import NPYStore
+
+# Appended bars extend the indicator and its disk cache entry instead of recomputing and rewriting them
+IndicatorCache.init(cache_path='tests/incremental_cache/')
+AssetManager.init(auto_save=False)
+goog = AssetManager.get('GOOG').data
+AssetManager.register(Asset('GOOG-LIVE', update=False, store=MemoryStore('GOOG-LIVE', goog.iloc[:-10])))
+live = AssetManager.get('GOOG-LIVE')
+
+sma = IndicatorManager.get_indicator('SMA')('SMA', window=20)
+sma.init('GOOG-LIVE')
+for i in range(10, 0, -1):
+    live.history.ingest(goog.iloc[len(goog)-i:len(goog)-i+1])
+print(len(sma.data) == len(goog)-19)
+# True
+
+# One disk entry holding the first series and one segment per appended bar
+entries = os.listdir('tests/incremental_cache/')
+print(len(entries), len(os.listdir(os.path.join('tests/incremental_cache/', entries[0]))) > 2)
+# 1 True
+print(NPYStore(os.path.join('tests/incremental_cache/', entries[0])).read()['Value'].to_numpy().tolist() == sma.data.to_numpy().tolist())
+# True
+
+batch = IndicatorManager.get_indicator('SMA')('SMA', window=20)
+batch.init('GOOG')
+print((sma.data.to_numpy() == batch.data.to_numpy()).all(), sma.data.index.equals(live.data.index[19:]))
+# True True
+
+shutil.rmtree('tests/incremental_cache/')
@@ -0,0 +1,16 @@
+from stocktrace import IndicatorManager, IndicatorCache
+
+IndicatorCache.init(cache_path='tests/indicator_cache/')
+sma = IndicatorManager.get_indicator('SMA_TWENTY')('SMA_TWENTY')
+sma.init('AAPL')
+again = IndicatorManager.get_indicator('SMA_TWENTY')('SMA_TWENTY')
+again.init('AAPL')
+print(IndicatorCache.get_stats())
+# {'hits': 1, 'disk_hits': 0, 'misses': 1, 'entries': 1}
+
+# Dropping the memory cache still skips recomputation, the series is read back from disk
+IndicatorCache.clear()
+again.init('AAPL')
+print(IndicatorCache.get_stats(), again.data.equals(sma.data))
+# {'hits': 1, 'disk_hits': 1, 'misses': 1, 'entries': 1} True
+IndicatorCache.clear(disk=True)
@@ -0,0 +1,19 @@
+from stocktrace import IndicatorManager
+
+# Both crossovers depend on SMA(window=10), it is evaluated once and shared
+fast_slow, fast_slower = IndicatorManager.evaluate('AAPL', [('CROSSOVER', {'fast': 10, 'slow': 20}),
+                                                            ('CROSSOVER', {'fast': 10, 'slow': 50})])
+print(fast_slow.data.value_counts())
+# 0.0 ...
+# 1.0 ...
+# -1.0 ...
+
+crossover = IndicatorManager.get_indicator('CROSSOVER')('CROSSOVER', fast=10, slow=20)
+crossover.init('AAPL')
+print((crossover.data.values == fast_slow.data.values).all())
+# True
+
+# Nodes are keyed by indicator class and parameters, so spelling out a default parameter shares the node
+short, spelled = IndicatorManager.evaluate('AAPL', [('SMA', {'window': 10}), ('SMA', {'window': 10, 'col': 'Close'})])
+print(short is spelled, short is fast_slow.inputs['fast'])
+# True True
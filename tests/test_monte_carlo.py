@@ -0,0 +1,20 @@
+import datetime as dt
+from stocktrace import *
+from stocktrace import monte_carlo
+
+backtest = Backtest(AlgorithmManager.get_algorithm('SMACrossOver'), Broker(start_cash_cents=1000000, spread=0.01),
+                    start_date=dt.datetime(2004, 8, 19, tzinfo=TIMEZONE), end_date=dt.datetime(2024, 3, 1, 23, tzinfo=TIMEZONE))
+backtest.run()
+
+trades = monte_carlo.trade_paths(backtest.broker.closed_trades, 1000000, seed=0)
+print(trades.shape)
+# (10000, number of trades + 1)
+print(monte_carlo.summarize(trades))
+
+# Shuffling keeps the final equity of every path
+shuffled = monte_carlo.trade_paths(backtest.broker.closed_trades, 1000000, replace=False, seed=0)
+print((shuffled[:, -1] == shuffled[0, -1]).all())
+# True
+
+equity = monte_carlo.bootstrap_equity(backtest.equity, block=20, seed=0)
+print(monte_carlo.summarize(equity))
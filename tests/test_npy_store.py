@@ -0,0 +1,20 @@
+import time
+
+from stocktrace import AssetManager, TIME_CSV, migrate_csv
+
+AssetManager.get('AAPL').save_data()
+print(migrate_csv())
+# ['data/AAPL1d.npy', 'data/loaded_tickers.npy', ...]
+
+start = time.time()
+csv = TIME_CSV('data/AAPL1d.csv')
+csv.data
+print('csv read', time.time()-start)
+
+start = time.time()
+npy = TIME_CSV('data/AAPL1d.npy')
+npy.data
+print('npy read', time.time()-start)
+
+print(csv.data.equals(npy.data))
+# True
@@ -0,0 +1,14 @@
+from stocktrace import IndicatorManager, AssetManager, verify_online
+
+for name in ['SMA_TEN', 'SMA_TWENTY']:
+    sma = IndicatorManager.get_indicator(name)(name)
+    sma.init('AAPL')
+    print(name, verify_online(sma))
+    # SMA_TEN True
+    # SMA_TWENTY True
+
+# Live use, one bar at a time
+online = IndicatorManager.get_indicator('SMA')('SMA', window=5).online()
+for bar in AssetManager.get('AAPL').data.tail(6).to_dict('records'):
+    print(online.push(bar))
+# None x4, then two averages
@@ -0,0 +1,21 @@
+from stocktrace import IndicatorManager, IndicatorCache
+
+if __name__ == '__main__':
+    requests = [(name, ticker, params) for ticker in ['AAPL', 'GOOG', '^GSPC']
+                for name, params in [('SMA', {'window': 10}), ('SMA', {'window': 50}), ('RSI', {}), ('MACD', {'line': 'histogram'})]]
+    parallel = IndicatorManager.compute_many(requests, max_workers=3, min_parallel=1)
+    print([(ind.name, ind.ticker_symbol) for ind in parallel[:4]])
+    # [('SMA', 'AAPL'), ('SMA', 'AAPL'), ('RSI', 'AAPL'), ('MACD', 'AAPL')]
+
+    # Below min_parallel everything is computed in-process
+    IndicatorCache.clear()
+    serial = IndicatorManager.compute_many(requests)
+    print(all(a.data.equals(b.data) for a, b in zip(parallel, serial)))
+    # True
+
+    # Results are handed to their indicators, a cache smaller than the batch doesn't make each init recompute
+    IndicatorCache.init(max_entries=2)
+    misses = IndicatorCache.get_stats()['misses']
+    small = IndicatorManager.compute_many(requests, max_workers=3, min_parallel=1)
+    print(IndicatorCache.get_stats()['misses']-misses, all(a.data.equals(b.data) for a, b in zip(small, serial)))
+    # 12 True
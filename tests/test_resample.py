@@ -0,0 +1,24 @@
+from stocktrace import Asset, AssetManager, MemoryStore
+
+asset = AssetManager.get('AAPL')
+print(asset.resample('1wk').tail())
+# Weekly OHLC bars, each labeled with the date of its last daily bar
+print(asset.resample('1mo').tail())
+
+# Cached until the daily history grows
+print(asset.resample('1wk') is asset.resample('1wk'))
+# True
+
+# Coarser intervals from AssetManager are resampled from the daily asset instead of downloaded
+weekly = AssetManager.get('AAPL', '1wk')
+print(weekly.interval, weekly is AssetManager.get('AAPL', '1wk'), weekly.data.equals(asset.resample('1wk')))
+# 1wk True True
+
+# and follow the daily bars appended to it, the forming last bar is replaced
+AssetManager.init(auto_save=False, lazy=True)
+AssetManager.register(Asset('DAILY', update=False, store=MemoryStore('DAILY', asset.data.iloc[:-10].copy())))
+daily = AssetManager.get('DAILY')
+weekly = AssetManager.get('DAILY', '1wk')
+daily.history.ingest(asset.data.iloc[-10:])
+print(len(weekly.data) == len(daily.resample('1wk')), weekly.data.equals(daily.resample('1wk')), weekly.latest_cents() == daily.latest_cents())
+# True True True
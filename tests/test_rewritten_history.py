@@ -0,0 +1,38 @@
+import tempfile
+import numpy as np
+import pandas as pd
+from stocktrace import Asset, AssetManager, IndicatorCache, IndicatorManager, MemoryStore
+from stocktrace.file import TIME_CSV
+
+apple = TIME_CSV('data/AAPL1d.csv').data
+AssetManager.init(auto_save=False, lazy=True)
+IndicatorCache.init(cache_path=tempfile.mkdtemp())
+AssetManager.register(Asset('REWRITE', update=False, store=MemoryStore('REWRITE', apple.copy())))
+asset = AssetManager.get('REWRITE')
+sma = IndicatorManager.get_indicator('SMA')('SMA', window=5)
+sma.init('REWRITE')
+version = asset.history.version
+
+# Dropping tail rows in place and ingesting as many rows at other prices changes the version and the indicator
+asset.data.drop(asset.data.tail(3).index, inplace=True)
+asset.history.ingest(apple.tail(3)*2)
+print(len(asset.data) == len(apple), asset.history.version != version, asset.csv.rewrites)
+# True True 1
+IndicatorCache.clear()
+fresh = IndicatorManager.get_indicator('SMA')('SMA', window=5)
+fresh.init('REWRITE')
+print(sma.data.equals(fresh.data), np.isclose(sma.data.iloc[-1], asset.data['Close'].iloc[-5:].mean()))
+# True True
+
+# A history of the same length and last date but other prices has another version, so its cached series isn't reused
+adjusted = Asset('REWRITE', update=False, store=MemoryStore('REWRITE', apple*0.5))
+print(adjusted.history.version != Asset('REWRITE', update=False, store=MemoryStore('REWRITE', apple.copy())).history.version)
+# True
+
+# Appends extend the version in place, it matches the version of the same rows loaded at once
+later = apple.tail(1).copy()
+later.index = later.index + pd.Timedelta(days=7)
+asset.history.ingest(later)
+whole = Asset('WHOLE', update=False, store=MemoryStore('WHOLE', asset.data.copy()))
+print(whole.history.version == asset.history.version)
+# True
@@ -0,0 +1,28 @@
+import time
+import numpy as np
+
+from stocktrace import IndicatorManager, IndicatorCache, AssetManager
+
+AssetManager.get('AAPL')
+windows = [{'window': w} for w in range(2, 202, 2)]
+
+start = time.time()
+smas = IndicatorManager.init_many('SMA', 'AAPL', windows)
+print('100 windows', time.time()-start)
+
+single = IndicatorManager.get_indicator('SMA_TWENTY')('SMA_TWENTY')
+single.init('AAPL')
+print(smas[9].params, (smas[9].data.values == single.data.values).all())
+# {'window': 20, 'col': 'Close'} True
+
+# Prefix sums round differently from the mean of each window slice
+close = AssetManager.get('AAPL').data['Close'].to_numpy()
+sliced = [close[i-19:i+1].mean() for i in range(19, len(close))]
+print(np.allclose(single.data.values, sliced, rtol=0, atol=1e-9))
+# True
+
+# More windows than the LRU cache holds are each computed once, in the shared pass
+misses = IndicatorCache.get_stats()['misses']
+many = IndicatorManager.init_many('SMA', 'AAPL', [{'window': w} for w in range(203, 509)])
+print(IndicatorCache.get_stats()['misses']-misses, many[-1].data.equals(IndicatorManager.init_many('SMA', 'AAPL', [{'window': 508}])[0].data))
+# 306 True
@@ -0,0 +1,20 @@
+import datetime as dt
+from stocktrace import *
+
+if __name__ == '__main__':
+    sweep = Sweep(AlgorithmManager.get_algorithm('SMACrossOver'),
+                  {'fast': [5, 10, 15], 'slow': [20, 30, 50]},
+                  {'start_cash_cents': 1000000, 'spread': 0.01},
+                  dt.datetime(2004, 8, 19, tzinfo=TIMEZONE), dt.datetime(2024, 3, 1, 23, tzinfo=TIMEZONE),
+                  alpha_ticker='GOOG')
+    sweep.run()
+    print(sweep.results[['Return %', 'Equity Final $']])
+    # Return %  Equity Final $ per (fast, slow)
+    print(f'{sweep.throughput:.2f} backtests per second')
+
+    # An empty grid is rejected up front rather than failing after running the default parameters
+    try:
+        Sweep(AlgorithmManager.get_algorithm('SMACrossOver'), {}, {'start_cash_cents': 1000000})
+    except ValueError as e:
+        print(e)
+        # Sweep() grid needs at least one parameter, run a single Backtest for the default parameters
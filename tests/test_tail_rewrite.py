@@ -0,0 +1,15 @@
+from stocktrace import Asset, MemoryStore
+from stocktrace.file import TIME_CSV, to_cents
+
+# Dropping tail rows in place and ingesting the same number of rows again, as test_listeners does
+apple = TIME_CSV('data/AAPL1d.csv').data
+asset = Asset('AAPL', update=False, store=MemoryStore('AAPL', apple.copy()))
+print(asset.latest_cents() == asset.get_cents_at(len(apple)-1))
+# True
+tail = apple.tail(3)*2
+asset.data.drop(asset.data.tail(3).index, inplace=True)
+asset.history.ingest(tail)
+print(asset.get_cents_at(asset.latest_index()) == to_cents(tail['Close'].to_numpy())[-1])
+# True
+print(asset.csv.index_ns[-1] == asset.data.index[-1].value, len(asset.cents()) == len(asset.data))
+# True True
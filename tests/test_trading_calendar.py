@@ -0,0 +1,31 @@
+import datetime as dt
+from stocktrace import *
+
+goog = AssetManager.get('GOOG')
+aapl = AssetManager.get('AAPL')
+union = TradingCalendar(['GOOG', 'AAPL'])
+intersection = TradingCalendar(['GOOG', 'AAPL'], how='intersection')
+print(union.index.equals(goog.data.index.union(aapl.data.index)), intersection.index.equals(goog.data.index.intersection(aapl.data.index)))
+# True True
+
+bar = len(union)//2
+print(union.row('GOOG', bar) == goog.prev_or_equal_index(union.index[bar]))
+# True
+print(union.cents_at('AAPL', bar) == aapl.get_cents(union.index[bar]), union.cents_at('AAPL', bar-1, 'Open') == aapl.get_cents(union.index[bar-1], 'Open'))
+# True True
+
+# The default clock is the bars of the benchmark
+start = dt.datetime(2004, 8, 19, tzinfo=TIMEZONE)
+end = dt.datetime(2024, 3, 1, 23, tzinfo=TIMEZONE)
+default = Backtest(AlgorithmManager.get_algorithm('SMACrossOver'), Broker(start_cash_cents=1000000, spread=0.01), start_date=start, end_date=end)
+default.run()
+calendar = TradingCalendar(['^GSPC'])
+explicit = Backtest(AlgorithmManager.get_algorithm('SMACrossOver'), Broker(start_cash_cents=1000000, spread=0.01), start_date=start, end_date=end, calendar=calendar)
+explicit.run()
+print(explicit.equity.equals(default.equity))
+# True
+
+own = Backtest(AlgorithmManager.get_algorithm('SMACrossOver'), Broker(start_cash_cents=1000000, spread=0.01), start_date=start, end_date=end, benchmark='GOOG')
+own.run()
+print(own.equity.index.isin(goog.data.index).all(), own.calendar.tickers)
+# True ['GOOG']
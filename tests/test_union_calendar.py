@@ -0,0 +1,52 @@
+import datetime as dt
+import numpy as np
+import pandas as pd
+from stocktrace import *
+
+# A synthetic asset trading every day, GOOG prices carried over the weekends
+AssetManager.init(auto_save=False)
+goog = AssetManager.get('GOOG')
+days = pd.date_range(goog.data.index[0], goog.data.index[-1], freq='D')
+AssetManager.register(Asset('GOOG-7D', update=False, store=MemoryStore('GOOG-7D', goog.data.reindex(days, method='ffill'))))
+
+start = dt.datetime(2004, 8, 19, tzinfo=TIMEZONE)
+end = dt.datetime(2024, 3, 1, 23, tzinfo=TIMEZONE)
+union = TradingCalendar(['GOOG', 'GOOG-7D'])
+friday = next(i for i in range(100, len(goog.data.index)) if goog.data.index[i].dayofweek == 4)
+saturday = union.bar(goog.data.index[friday])+1
+print(len(union) > len(goog.data.index), union.has_row('GOOG', saturday-1), union.has_row('GOOG', saturday))
+# True True False
+
+# Weekend bars carry the indicators and hold the GOOG orders until Monday, so GOOG trades as on its own calendar
+default = Backtest(AlgorithmManager.get_algorithm('SMACrossOver'), Broker(start_cash_cents=1000000, spread=0.01), start_date=start, end_date=end)
+default.run()
+backtest = Backtest(AlgorithmManager.get_algorithm('SMACrossOver'), Broker(start_cash_cents=1000000, spread=0.01), start_date=start, end_date=end, calendar=union)
+backtest.run()
+print([repr(trade) for trade in backtest.broker.closed_trades] == [repr(trade) for trade in default.broker.closed_trades])
+# True
+print(all(trade.entry_time in goog.data.index and trade.exit_time in goog.data.index for trade in backtest.broker.closed_trades))
+# True
+print(backtest.equity.reindex(default.equity.index).equals(default.equity))
+# True
+
+sma = IndicatorManager.get_indicator('SMA')('SMA', window=20)
+sma.init('GOOG')
+sma.align(union)
+print(sma[saturday] == sma.data[goog.data.index[friday]] == sma[saturday-1])
+# True
+
+# The vectorized engine holds orders over the weekends the same way
+fast = IndicatorManager.get_indicator('SMA')('SMA', window=10)
+fast.init('GOOG')
+fast_values, slow_values = fast.align(union), sma.align(union)
+up = np.zeros(len(union), dtype=bool)
+down = np.zeros(len(union), dtype=bool)
+up[1:] = (fast_values[1:] > slow_values[1:]) & (fast_values[:-1] <= slow_values[:-1])
+down[1:] = (fast_values[1:] < slow_values[1:]) & (fast_values[:-1] >= slow_values[:-1])
+signal = np.where(up, 1.0, np.where(down, -1.0, np.nan))
+signal[:union.index.searchsorted(sma.data.index[1])+1] = np.nan
+vectorized = VectorizedBacktest(Broker(start_cash_cents=1000000, spread=0.01), signals={'GOOG': signal},
+                                start_date=max(start, sma.data.index[0]), end_date=end, calendar=union)
+vectorized.run()
+print(vectorized.equity.equals(backtest.equity), [repr(trade) for trade in vectorized.closed_trades] == [repr(trade) for trade in backtest.broker.closed_trades])
+# True True
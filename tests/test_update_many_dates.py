@@ -0,0 +1,29 @@
+import datetime as dt
+import pandas as pd
+
+from stocktrace import AssetHistory, MemoryStore, Provider, update_many
+from stocktrace.file import TIME_CSV
+
+class MidnightProvider(Provider):
+    '''Serves rows stamped at midnight New York time like yfinance does'''
+    def __init__(self, data: pd.DataFrame) -> None:
+        super().__init__()
+        self.__data = data
+
+    def fetch(self, tickers, interval, start, end) -> dict[str, pd.DataFrame]:
+        data = self.__data[self.__data.index >= pd.Timestamp(start).tz_convert('America/New_York').normalize()] if start else self.__data
+        return {ticker: data for ticker in tickers}
+
+apple = TIME_CSV('data/AAPL1d.csv').data
+raw = apple.copy()
+raw.index = raw.index.tz_convert('America/New_York').normalize()
+provider = MidnightProvider(raw)
+
+serial = AssetHistory('AAPL', 'serial', provider=provider, update=False, store=MemoryStore('serial', apple.iloc[:-4]))
+serial.update_data()
+bulk = AssetHistory('AAPL', 'bulk', provider=provider, update=False, store=MemoryStore('bulk', apple.iloc[:-4]))
+update_many([bulk])
+print(len(serial.data) == len(apple), len(bulk.data) == len(apple))
+# True True
+print(bulk.data.index.equals(serial.data.index))
+# True
@@ -0,0 +1,30 @@
+import datetime as dt
+import numpy as np
+from stocktrace import *
+
+# Cross-validates the vectorized engine against the event-driven run of SMACrossOver
+start = dt.datetime(2004, 8, 19, tzinfo=TIMEZONE)
+end = dt.datetime(2024, 3, 1, 23, tzinfo=TIMEZONE)
+backtest = Backtest(AlgorithmManager.get_algorithm('SMACrossOver'), Broker(start_cash_cents=1000000, spread=0.01), start_date=start, end_date=end)
+backtest.run()
+
+calendar = AssetManager.get('^GSPC').data.index
+fast, slow = [IndicatorManager.get_indicator('SMA')('SMA', window=window) for window in (10, 20)]
+fast.init('GOOG')
+slow.init('GOOG')
+fast_values, slow_values = fast.align(calendar), slow.align(calendar)
+up = np.zeros(len(calendar), dtype=bool)
+down = np.zeros(len(calendar), dtype=bool)
+up[1:] = (fast_values[1:] > slow_values[1:]) & (fast_values[:-1] <= slow_values[:-1])
+down[1:] = (fast_values[1:] < slow_values[1:]) & (fast_values[:-1] >= slow_values[:-1])
+signal = np.where(up, 1.0, np.where(down, -1.0, np.nan))
+signal[:calendar.searchsorted(slow.data.index[1])+1] = np.nan
+
+vectorized = VectorizedBacktest(Broker(start_cash_cents=1000000, spread=0.01), signals={'GOOG': signal},
+                                start_date=max(start, slow.data.index[0]), end_date=end, name='SMACrossOver')
+vectorized.run()
+print(vectorized.equity.equals(backtest.equity), backtest.equity.dtype)
+# True float64
+print([repr(trade) for trade in vectorized.closed_trades] == [repr(trade) for trade in backtest.broker.closed_trades])
+# True
+print(generate_statistics(vectorized.closed_trades, vectorized.equity, vectorized.name, vectorized.start_date, vectorized.end_date, 'GOOG'))
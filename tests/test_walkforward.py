@@ -0,0 +1,16 @@
+import datetime as dt
+from stocktrace import *
+
+if __name__ == '__main__':
+    # Optimizes over 1000 bars, trades the best parameters over the next 250, rolling forward by 250
+    walk_forward = WalkForward(AlgorithmManager.get_algorithm('SMACrossOver'),
+                               {'fast': [5, 10], 'slow': [20, 50]},
+                               {'start_cash_cents': 1000000, 'spread': 0.01},
+                               1000, 250,
+                               dt.datetime(2005, 1, 1, tzinfo=TIMEZONE), dt.datetime(2024, 3, 1, 23, tzinfo=TIMEZONE),
+                               alpha_ticker='GOOG')
+    walk_forward.run()
+    print(walk_forward.windows[['Out Of Sample Start', 'fast', 'slow', 'Out Of Sample Return %']])
+    # One row per window
+    print(walk_forward.equity.index.is_unique, walk_forward.equity.iloc[0])
+    # True 1000000.0
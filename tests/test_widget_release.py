@@ -0,0 +1,21 @@
+import pyqtgraph as pg
+
+from stocktrace import AssetManager, AssetWidget
+
+app = pg.mkQApp()
+AssetManager.init(auto_save=False, lazy=True)
+
+# A chart pins its asset only while it is open
+closed = AssetWidget(AssetManager.get('AAPL'))
+print(AssetManager.get_stats()['pinned'])
+# 1
+closed.close()
+print(AssetManager.get_stats()['pinned'], closed.asset.history.listeners.count(closed._update_callback))
+# 0 0
+
+# Widgets destroyed without being closed release it too
+destroyed = AssetWidget(AssetManager.get('GOOG'))
+destroyed.deleteLater()
+app.sendPostedEvents(None, pg.QtCore.QEvent.Type.DeferredDelete.value)
+print(AssetManager.get_stats()['pinned'])
+# 0
@@ -0,0 +1,18 @@
+import datetime as dt
+import numpy as np
+
+from stocktrace import AssetManager
+from stocktrace.utils import TIMEZONE
+
+asset = AssetManager.get('AAPL')
+start = dt.datetime(2020, 1, 1, tzinfo=TIMEZONE)
+end = dt.datetime(2021, 1, 1, tzinfo=TIMEZONE)
+window = asset.window(start, end)
+print(window, len(window))
+# AssetWindow(Asset(AAPL, 1d), ...) 253
+
+masked = asset.data.loc[(asset.data.index >= start) & (asset.data.index <= end)]
+print(window.index.equals(masked.index), (window.close == masked['Close'].to_numpy()).all())
+# True True
+print(np.shares_memory(window.close, asset.data['Close'].to_numpy()))
+# True